@@ -0,0 +1,1008 @@
+"""
+Headless command line interface for Repo save files.
+
+Run with: python -m app.cli <command> [options]
+
+Commands:
+    decrypt     Write the JSON payload of a save to a file or stdout
+    encrypt     Write a JSON file into a save, keeping the save's format
+    inspect     Show the team, run stats and players of a save
+    set-field   Change values in a save by dotted path
+    diff        List the differences between two saves
+    decrypt-many    Decode many saves in parallel, e.g. to audit a folder
+    encrypt-many    Encode many JSON files into saves in parallel
+    edit        Apply a JSON or YAML edit spec to many saves, as a dry run unless --commit
+    fsck        Check saves and their backups for corruption, with an NDJSON report
+    identify    Find which of the candidate passwords (--try-password) opens each save
+    export      Stream save, player and item rows of many saves to NDJSON or CSV
+    import      Create a save folder for every record of an NDJSON file, resumable
+    new         Create new game saves, each in its own REPO_SAVE_ folder
+    list        List the saves in a folder with their team, level, currency and players
+    discover    Find the game's save folders in Proton and Wine prefixes
+    query       Find saves by Steam ID, player or team name, or dictionary values, from an index
+    stats       Percentiles, histograms and per-team figures of run stats, upgrades and items
+
+Only the save codec and data models are imported, never Qt or the Steam API,
+so the tool starts quickly enough to be run in loops from scripts.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+from .core.save_manager import SaveManager
+from .core.data_models import GameSave
+from .core import es3_codec
+from .core import json_engine
+
+
+class CommandError(Exception):
+    """A command failed, the message is shown to the user"""
+
+
+class _LibraryOutput:
+    """
+    Keeps the save manager's diagnostic prints off stdout, which carries
+    command output. With --verbose they go to stderr, otherwise they are kept
+    and only shown if the command fails.
+    """
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.buffer = io.StringIO()
+
+    def capture(self):
+        """Context manager redirecting prints made inside it"""
+        return contextlib.redirect_stdout(sys.stderr if self.verbose else self.buffer)
+
+    def dump(self):
+        """Show the captured output on stderr"""
+        captured = self.buffer.getvalue()
+        if captured:
+            sys.stderr.write(captured)
+
+
+def _default_save_path(save_manager, output):
+    """The game's save folder, looked up with the library's diagnostics captured"""
+    with output.capture():
+        return save_manager.default_save_path
+
+
+def _write_output(data, output_path=None):
+    """Write bytes to a file, or to stdout if no path is given"""
+    if output_path and output_path != "-":
+        with open(output_path, 'wb') as file_out:
+            file_out.write(data)
+    else:
+        sys.stdout.buffer.write(data)
+        sys.stdout.flush()
+
+
+def _read_input(input_path):
+    """Read bytes from a file, or from stdin for "-" """
+    if input_path == "-":
+        return sys.stdin.buffer.read()
+    with open(input_path, 'rb') as file_in:
+        return file_in.read()
+
+
+def _load_document(save_manager, path, password=None):
+    """
+    Load a save (or plain JSON file) as a modifiable document
+
+    Raises:
+        CommandError: If the file does not exist or cannot be decoded
+    """
+    if not os.path.isfile(path):
+        raise CommandError(f"No such file: {path}")
+    data = save_manager.load_json_from_es3(path, password)
+    if data is None:
+        raise CommandError(f"Could not decode {path}, wrong password or not a save file")
+    return data
+
+
+def parse_value(text):
+    """
+    Parse a command line value as JSON, falling back to a plain string
+
+    Args:
+        text (str): Value such as 5, 2.5, true, null, "quoted" or plain text
+
+    Returns:
+        The parsed value
+    """
+    try:
+        return json_engine.loads(text)
+    except ValueError:
+        return text
+
+
+def split_path(path):
+    """
+    Split a dotted field path into keys
+
+    Args:
+        path (str): Path like dictionaryOfDictionaries.value.runStats.level
+
+    Returns:
+        list: Path segments
+    """
+    keys = [key for key in path.split(".") if key]
+    if not keys:
+        raise CommandError(f"Empty field path: {path!r}")
+    return keys
+
+
+def set_field(data, path, value):
+    """
+    Set a value inside a save document by dotted path
+
+    If the path ends at an ES3 wrapper ({"__type": ..., "value": ...}) and the
+    new value is not itself a dictionary, the wrapper's value is set, so
+    "teamName" behaves like "teamName.value".
+
+    Args:
+        data (dict): Save document, modified in place
+        path (str): Dotted path, list indices are given as numbers
+        value: New value
+
+    Returns:
+        tuple: (full path that was set, previous value or None)
+
+    Raises:
+        CommandError: If an intermediate key does not exist
+    """
+    keys = split_path(path)
+    parent = data
+    for index, key in enumerate(keys[:-1]):
+        parent = _child(parent, key, ".".join(keys[:index + 1]))
+
+    last = keys[-1]
+    current = _child(parent, last, path, missing_ok=True)
+    if isinstance(current, dict) and "__type" in current and "value" in current and not isinstance(value, dict):
+        parent, last = current, "value"
+        keys.append("value")
+        current = parent["value"]
+
+    if isinstance(parent, list):
+        parent[_list_index(parent, last, path)] = value
+    else:
+        parent[last] = value
+    return ".".join(keys), current
+
+
+def _list_index(container, key, path):
+    """Convert a path segment to a valid index into a list"""
+    try:
+        index = int(key)
+        container[index]
+        return index
+    except (ValueError, IndexError):
+        raise CommandError(f"Invalid list index {key!r} in {path}")
+
+
+def _child(container, key, path, missing_ok=False):
+    """Step into a dict or list by path segment"""
+    if isinstance(container, list):
+        return container[_list_index(container, key, path)]
+    if isinstance(container, dict):
+        if key in container:
+            return container[key]
+        if missing_ok:
+            return None
+        raise CommandError(f"Field not found: {path}")
+    raise CommandError(f"Cannot look up {key!r} in a {type(container).__name__} at {path}")
+
+
+def _format_value(value):
+    """Short JSON rendering of a value for display"""
+    text = json.dumps(value, ensure_ascii=False)
+    return text if len(text) <= 120 else text[:117] + "..."
+
+
+def expand_paths(paths, extension):
+    """
+    Expand directories into the files they contain with the given extension
+
+    Args:
+        paths (list): Files and directories
+        extension (str): Extension to look for in directories, compared case-insensitively
+
+    Yields:
+        str: File paths, lazily, so huge directory trees start processing immediately
+    """
+    extension = extension.lower()
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for directory, subdirectories, files in os.walk(path):
+            subdirectories.sort()
+            for name in sorted(files):
+                if name.lower().endswith(extension):
+                    yield os.path.join(directory, name)
+
+
+def _report_batch(results, describe):
+    """
+    Print one line per batch result and a summary
+
+    Args:
+        results (iterable): BatchResult objects
+        describe (callable): Function turning a successful result into its report line
+
+    Returns:
+        int: 0 if every file succeeded, 1 otherwise
+    """
+    start = time.perf_counter()
+    succeeded = failed = 0
+    for result in results:
+        if result.ok:
+            succeeded += 1
+            print(describe(result))
+        else:
+            failed += 1
+            print(f"error {result.path}: {result.error}")
+    elapsed = time.perf_counter() - start
+    print(f"{succeeded} succeeded, {failed} failed in {elapsed:.2f} s", file=sys.stderr)
+    return 1 if failed else 0
+
+
+# Commands
+
+def command_decrypt(args, save_manager, output):
+    """Write the decoded JSON payload of a save"""
+    if not os.path.isfile(args.save):
+        raise CommandError(f"No such file: {args.save}")
+    with output.capture():
+        try:
+            payload = save_manager.decrypt_es3(args.save, args.password)
+        except Exception as e:
+            raise CommandError(f"Could not decode {args.save}: {str(e)}")
+
+    if args.pretty:
+        payload = json.dumps(json_engine.loads(payload), indent=4, ensure_ascii=False).encode('utf-8') + b"\n"
+    _write_output(payload, args.output)
+    return 0
+
+
+def command_encrypt(args, save_manager, output):
+    """Write a JSON payload into a save file"""
+    payload = _read_input(args.input)
+    try:
+        json_engine.loads(payload)
+    except ValueError as e:
+        raise CommandError(f"Input is not valid JSON: {str(e)}")
+
+    with output.capture():
+        if args.format:
+            container = args.format
+        elif os.path.isfile(args.save):
+            # Keep the format of the file being replaced
+            with open(args.save, 'rb') as file_in:
+                head = file_in.read(es3_codec.SNIFF_SIZE)
+            container = save_manager.resolve_container(args.save, head, args.password, args.gzip)
+        else:
+            container = es3_codec.container_for(True, bool(args.gzip))
+
+        if not save_manager.encrypt_es3_file(payload, args.save, args.password, container=container):
+            raise CommandError(f"Could not write {args.save}")
+
+    print(f"Wrote {args.save} ({container}, {os.path.getsize(args.save):,} bytes)")
+    return 0
+
+
+def describe_save(save_manager, path, data):
+    """
+    Summarise a save for the inspect command
+
+    Args:
+        save_manager (SaveManager): Save manager that loaded the file
+        path (str): Path to the save
+        data (dict): Save document
+
+    Returns:
+        dict: File, format, team, run stats and players
+    """
+    game_save = GameSave(data)
+    players = []
+    for player_id, player in sorted(game_save.players.items()):
+        players.append({
+            "id": player_id,
+            "name": player.name,
+            "health": player.health,
+            "upgrades": {name: level for name, level in player.upgrades.items() if level},
+        })
+    return {
+        "file": path,
+        "size": os.path.getsize(path),
+        "format": save_manager.get_container_format(path),
+        "team_name": game_save.team_name,
+        "run_stats": dict(game_save.run_stats),
+        "players": players,
+    }
+
+
+def command_inspect(args, save_manager, output):
+    """Show a summary of a save"""
+    with output.capture():
+        data = _load_document(save_manager, args.save, args.password)
+        info = describe_save(save_manager, args.save, data)
+
+    if args.json:
+        print(json.dumps(info, indent=2, ensure_ascii=False))
+        return 0
+
+    print(f"File:    {info['file']} ({info['size']:,} bytes, {info['format']})")
+    print(f"Team:    {info['team_name']}")
+    for name, value in info["run_stats"].items():
+        print(f"  {name:<22}{value}")
+    print(f"Players: {len(info['players'])}")
+    for player in info["players"]:
+        upgrades = ", ".join(f"{name} {level}" for name, level in player["upgrades"].items()) or "no upgrades"
+        print(f"  {player['id']}  {player['name']}  health {player['health']}  ({upgrades})")
+    return 0
+
+
+def command_set_field(args, save_manager, output):
+    """Change one or more fields of a save"""
+    assignments = []
+    for assignment in args.assignments:
+        path, separator, value = assignment.partition("=")
+        if not separator:
+            raise CommandError(f"Expected PATH=VALUE, got {assignment!r}")
+        assignments.append((path, parse_value(value)))
+
+    with output.capture():
+        data = _load_document(save_manager, args.save, args.password)
+
+    changes = []
+    for path, value in assignments:
+        full_path, previous = set_field(data, path, value)
+        changes.append((full_path, previous, value))
+
+    for full_path, previous, value in changes:
+        print(f"{full_path}: {_format_value(previous)} -> {_format_value(value)}")
+
+    if args.dry_run:
+        print("Dry run, nothing written")
+        return 0
+
+    with output.capture():
+        success = save_manager.save_es3_from_json(data, args.save, args.password,
+                                                  create_backup=not args.no_backup,
+                                                  debug_compare=True, debug_player_stats=False)
+    if not success:
+        raise CommandError(f"Could not save {args.save}")
+    print(f"Saved {args.save}")
+    return 0
+
+
+def command_diff(args, save_manager, output):
+    """List the differences between two saves"""
+    with output.capture():
+        first = _load_document(save_manager, args.first, args.password)
+        second = _load_document(save_manager, args.second, args.password)
+        differences = sorted(save_manager._find_dict_differences(first, second), key=lambda item: item[0])
+
+    if args.json:
+        print(json.dumps([{"path": path, "first": a, "second": b} for path, a, b in differences],
+                         indent=2, ensure_ascii=False))
+    else:
+        for path, a, b in differences:
+            print(f"{path}: {_format_value(a)} -> {_format_value(b)}")
+        if not differences:
+            print("No differences")
+
+    # Like diff(1): 0 when identical, 1 when different
+    return 1 if differences else 0
+
+
+def command_decrypt_many(args, save_manager, output):
+    """Decode many saves in parallel"""
+    paths = expand_paths(args.paths, ".es3")
+    results = save_manager.decrypt_many(paths, jobs=args.jobs, output_dir=args.output_dir, ordered=args.ordered,
+                                        password=args.password, check_only=not args.output_dir)
+
+    def describe(result):
+        if args.output_dir:
+            return f"ok {result.path} ({result.container}) -> {result.value}"
+        return f"ok {result.path} ({result.container}, {result.value:,} bytes)"
+
+    return _report_batch(results, describe)
+
+
+def command_encrypt_many(args, save_manager, output):
+    """Encode many JSON files into saves in parallel"""
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    def items():
+        for path in expand_paths(args.paths, ".json"):
+            base_name = os.path.splitext(os.path.basename(path))[0]
+            with open(path, 'rb') as file_in:
+                yield os.path.join(args.output_dir, base_name + ".Es3"), file_in.read(), args.format
+
+    results = save_manager.encrypt_many(items(), jobs=args.jobs, ordered=args.ordered, password=args.password)
+    return _report_batch(results, lambda result: f"ok {result.path} ({result.container}, {result.value:,} bytes)")
+
+
+def _captured(results, output):
+    """Iterate over batch results with the library's prints captured while each is produced"""
+    iterator = iter(results)
+    while True:
+        with output.capture():
+            result = next(iterator, None)
+        if result is None:
+            return
+        yield result
+
+
+def command_edit(args, save_manager, output):
+    """Apply an edit spec to many saves"""
+    from .core import bulk_edit
+
+    try:
+        plan = bulk_edit.load_spec(args.spec)
+    except (OSError, bulk_edit.SpecError) as e:
+        raise CommandError(f"Invalid spec {args.spec}: {str(e)}")
+
+    paths = expand_paths(args.paths, ".es3")
+    results = save_manager.apply_edits(plan, paths, commit=args.commit, create_backup=not args.no_backup,
+                                       jobs=args.jobs, ordered=args.ordered, password=args.password)
+
+    def describe(result):
+        if args.json:
+            changes = [{"path": path, "old": old, "new": new} for path, old, new in result.value]
+            return json.dumps({"save": result.path, "changes": changes}, ensure_ascii=False)
+        if not result.value:
+            return f"{result.path}: no changes"
+        lines = [f"{result.path}: {len(result.value)} change(s){'' if args.commit else ' (dry run)'}"]
+        lines.extend(f"  {path}: {_format_value(old)} -> {_format_value(new)}" for path, old, new in result.value)
+        return "\n".join(lines)
+
+    status = _report_batch(_captured(results, output), describe)
+    if args.commit:
+        transaction = save_manager.last_transaction
+        if transaction and transaction["committed"]:
+            print(f"Wrote {transaction['saves']} saves", file=sys.stderr)
+        else:
+            print("Not every save could be edited, nothing was written", file=sys.stderr)
+            status = 1
+    return status
+
+
+def command_fsck(args, save_manager, output):
+    """Check saves and their backups for corruption"""
+    from .core import fsck
+
+    if args.paths:
+        paths = expand_paths(args.paths, ".es3")
+    else:
+        with output.capture():
+            paths = [save_file for _, _, save_file in save_manager.list_save_files()]
+
+    results = save_manager.check_saves(paths, jobs=args.jobs, ordered=args.ordered, password=args.password,
+                                       check_backups=not args.no_backups)
+
+    report = None
+    if args.report == "-":
+        report = sys.stdout
+    elif args.report:
+        report = open(args.report, 'w', encoding='utf-8')
+
+    start = time.perf_counter()
+    counts = dict.fromkeys(fsck.STATUSES, 0)
+    try:
+        for result in results:
+            record = result.value if result.ok else {"path": result.path, "status": fsck.STATUS_UNREADABLE,
+                                                     "detail": result.error, "container": None, "size": None}
+            counts[record["status"]] += 1
+            if report is not None:
+                report.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if report is not sys.stdout and (record["status"] != fsck.STATUS_OK or args.all):
+                detail = f": {record['detail']}" if record["detail"] else ""
+                print(f"{record['status']} {record['path']}{detail}")
+    finally:
+        if report is not None and report is not sys.stdout:
+            report.close()
+
+    elapsed = time.perf_counter() - start
+    summary = ", ".join(f"{count} {status}" for status, count in counts.items() if count)
+    print(f"Checked {sum(counts.values())} files in {elapsed:.2f} s: {summary or 'nothing found'}", file=sys.stderr)
+    return 0 if counts[fsck.STATUS_OK] == sum(counts.values()) else 1
+
+
+def command_identify(args, save_manager, output):
+    """Find the password that opens each save"""
+    candidates = [save_manager.password] + [pwd for pwd in save_manager.candidate_passwords
+                                            if pwd != save_manager.password]
+    failed = 0
+    for path in expand_paths(args.paths, ".es3"):
+        with output.capture():
+            password = save_manager.identify_password(path, candidates)
+        if password is None:
+            failed += 1
+            print(f"{path}: no candidate matches")
+        elif password == save_manager.password:
+            print(f"{path}: default password")
+        else:
+            print(f"{path}: candidate {candidates.index(password)} ({password})")
+    return 1 if failed else 0
+
+
+def command_export(args, save_manager, output):
+    """Export many saves as flat rows"""
+    from .core import exporter as exporters
+
+    if args.format == exporters.FORMAT_CSV:
+        if not args.output:
+            raise CommandError("CSV export needs an output folder (-o)")
+        exporter = exporters.CsvExporter(args.output)
+    elif args.output and args.output != "-":
+        exporter = exporters.NdjsonExporter(open(args.output, 'wb'), close_file=True)
+    else:
+        exporter = exporters.NdjsonExporter(sys.stdout.buffer)
+
+    paths = expand_paths(args.paths, ".es3")
+    results = save_manager.export_saves(paths, exporter, jobs=args.jobs, ordered=args.ordered, password=args.password)
+    start = time.perf_counter()
+    exported = failed = 0
+    try:
+        for result in _captured(results, output):
+            if result.ok:
+                exported += 1
+            else:
+                failed += 1
+                print(f"error {result.path}: {result.error}", file=sys.stderr)
+    finally:
+        exporter.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Exported {exporter.rows} rows from {exported} saves, {failed} failed, in {elapsed:.2f} s", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def command_import(args, save_manager, output):
+    """Create saves from NDJSON records"""
+    if args.input == "-":
+        lines, progress = sys.stdin.buffer, args.progress
+    else:
+        if not os.path.isfile(args.input):
+            raise CommandError(f"No such file: {args.input}")
+        lines = open(args.input, 'rb')
+        progress = args.progress or (None if args.no_progress else args.input + ".progress")
+
+    output_dir = args.output or _default_save_path(save_manager, output)
+    if not output_dir:
+        raise CommandError("No default save folder on this platform, pass an output folder (-o)")
+
+    results = save_manager.import_saves(lines, output_dir, template=args.template, progress=progress,
+                                        jobs=args.jobs, ordered=args.ordered, password=args.password)
+    try:
+        status = _report_batch(_captured(results, output),
+                               lambda result: f"ok {result.path} ({result.container}, {result.value:,} bytes)")
+    finally:
+        if lines is not sys.stdin.buffer:
+            lines.close()
+
+    if status and progress:
+        print(f"Run the same import again to retry the failed records, {progress} records the others",
+              file=sys.stderr)
+    return status
+
+
+def command_new(args, save_manager, output):
+    """Create new game saves"""
+    if args.count < 1:
+        raise CommandError("--count must be at least 1")
+
+    players = {}
+    for player in args.player:
+        steam_id, separator, name = player.partition("=")
+        if not separator or not steam_id:
+            raise CommandError(f"Invalid player {player!r}, expected STEAMID=NAME")
+        players[steam_id] = name
+
+    output_dir = args.output or _default_save_path(save_manager, output)
+    if not output_dir:
+        raise CommandError("No default save folder on this platform, pass an output folder (-o)")
+
+    team_names = (args.team_name.replace("{n}", str(number)) for number in range(1, args.count + 1))
+    try:
+        results = save_manager.create_new_game_saves(team_names, output_dir, players=players, date=args.date,
+                                                     jobs=args.jobs, ordered=args.ordered, password=args.password)
+        return _report_batch(results, lambda result: f"ok {result.path} ({result.value:,} bytes)")
+    except ValueError as e:
+        raise CommandError(str(e))
+
+
+def command_list(args, save_manager, output):
+    """List the saves in a folder with their summaries"""
+    folder = args.folder or _default_save_path(save_manager, output)
+    if not folder or not os.path.isdir(folder):
+        raise CommandError(f"No such folder: {folder}")
+
+    with output.capture():
+        save_files = save_manager.list_save_files(folder)
+        paths = [full_path for _, _, full_path in save_files]
+        if args.rebuild:
+            save_manager.get_save_index().clear()
+        failed = {result.path: result.error for result in save_manager.refresh_save_index(paths, jobs=args.jobs)
+                  if not result.ok}
+
+    save_index = save_manager.get_save_index()
+    for display_name, _, full_path in save_files:
+        summary = save_index.lookup(full_path)
+        if args.json:
+            print(json.dumps({"save": full_path, "summary": summary, "error": failed.get(full_path)},
+                             ensure_ascii=False))
+        elif summary is None:
+            print(f"{display_name}  unreadable: {failed.get(full_path)}")
+        else:
+            players = ", ".join(summary["players"]) or "no players"
+            print(f"{display_name}  {summary['team_name']}  level {summary['level']}  "
+                  f"currency {summary['currency']}  {_format_value(summary['time_played'])} s  {players}")
+    return 1 if failed else 0
+
+
+def command_discover(args, save_manager, output):
+    """Find the game's save folders in Proton and Wine prefixes"""
+    from .core.save_discovery import discover_save_folders
+
+    with output.capture():
+        folders = discover_save_folders(refresh=args.refresh)
+    if not folders:
+        raise CommandError("No save folders found")
+    for folder in folders:
+        print(folder)
+    return 0
+
+
+def _default_save_folders(save_manager, output):
+    """The game's save folders: every one found in Proton and Wine prefixes outside Windows"""
+    if sys.platform != "win32":
+        from .core.save_discovery import discover_save_folders
+
+        with output.capture():
+            return discover_save_folders()
+    folder = _default_save_path(save_manager, output)
+    return [folder] if folder else []
+
+
+def command_query(args, save_manager, output):
+    """Find saves by Steam ID, player or team name, or dictionary values, from an index"""
+    from .core.save_query import parse_condition
+
+    try:
+        conditions = [parse_condition(text) for text in args.where]
+    except ValueError as e:
+        raise CommandError(str(e))
+    if not (args.player or args.player_name or args.team or conditions):
+        raise CommandError("Give at least one of --player, --player-name, --team or --where")
+
+    folders = args.folders or _default_save_folders(save_manager, output)
+    for folder in folders:
+        if not os.path.isdir(folder):
+            raise CommandError(f"No such folder: {folder}")
+    if not folders:
+        raise CommandError("No save folders found, name one")
+
+    with output.capture():
+        paths = [full_path for folder in folders for _, _, full_path in save_manager.list_save_files(folder)]
+        term_index = save_manager.get_term_index()
+        if args.rebuild:
+            term_index.clear()
+        failed = [result for result in save_manager.refresh_term_index(paths, jobs=args.jobs) if not result.ok]
+
+    for result in failed:
+        print(f"warning: {result.path}: {result.error}", file=sys.stderr)
+    matches = term_index.query(args.player, args.player_name, args.team, conditions, scope=paths)
+    for key in matches:
+        if args.json:
+            entry = term_index.entries[key]
+            print(json.dumps({"save": key, "team_name": entry["team_name"], "players": entry["players"]},
+                             ensure_ascii=False))
+        else:
+            print(key)
+    return 0 if matches else 1
+
+
+def _format_number(value):
+    """Format a statistic compactly"""
+    if value is None:
+        return "-"
+    return f"{value:.0f}" if float(value).is_integer() else f"{value:.2f}"
+
+
+def command_stats(args, save_manager, output):
+    """Percentiles, histograms and per-team figures of run stats, upgrades and items"""
+    from .core.save_analytics import GROUP_REDUCTIONS, PLAYER_COLUMNS, SAVE_COLUMNS, SaveCorpus
+
+    try:
+        percents = [float(text) for text in args.percentiles.split(",") if text.strip()]
+    except ValueError:
+        raise CommandError(f"Percentiles must be numbers separated by commas: {args.percentiles}")
+    if any(percent < 0 or percent > 100 for percent in percents):
+        raise CommandError("Percentiles must be between 0 and 100")
+    if args.bins < 1:
+        raise CommandError("--bins must be at least 1")
+    for name in filter(None, (args.histogram, args.by_team)):
+        if name not in SAVE_COLUMNS + PLAYER_COLUMNS:
+            raise CommandError(f"No column {name!r}, expected one of {', '.join(SAVE_COLUMNS + PLAYER_COLUMNS)}")
+
+    folders = args.folders or _default_save_folders(save_manager, output)
+    for folder in folders:
+        if not os.path.isdir(folder):
+            raise CommandError(f"No such folder: {folder}")
+    if not folders:
+        raise CommandError("No save folders found, name one")
+
+    with output.capture():
+        paths = [full_path for folder in folders for _, _, full_path in save_manager.list_save_files(folder)]
+        stats_index = save_manager.get_stats_index()
+        if args.rebuild:
+            stats_index.clear()
+        failed = [result for result in save_manager.refresh_stats_index(paths, jobs=args.jobs) if not result.ok]
+    for result in failed:
+        print(f"warning: {result.path}: {result.error}", file=sys.stderr)
+
+    started = time.perf_counter()
+    corpus = SaveCorpus.from_index(stats_index, paths)
+    report = corpus.report(percents, args.bins)
+    if args.by_team:
+        report["by_team"] = {how: corpus.group_by_team(args.by_team, how) for how in GROUP_REDUCTIONS}
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+        return 0
+
+    print(f"{report['saves']} saves, {report['players']} players, {report['teams']} teams "
+          f"({report['backend']} columns, {elapsed * 1000:.0f} ms)")
+    labels = [f"p{percent:g}" for percent in percents]
+    header = f"{'column':<24}{'mean':>10}{'min':>10}" + "".join(f"{label:>10}" for label in labels) + f"{'max':>10}"
+    for title, columns in (("Per save", report["save_columns"]), ("Per player", report["player_columns"])):
+        print()
+        print(title)
+        print(header)
+        for name, summary in columns.items():
+            print(f"{name:<24}{_format_number(summary['mean']):>10}{_format_number(summary['min']):>10}"
+                  + "".join(f"{_format_number(summary['percentiles'][label]):>10}" for label in labels)
+                  + f"{_format_number(summary['max']):>10}")
+
+    print()
+    print("Items owned")
+    for name, ownership in sorted(report["items"].items(), key=lambda item: -item[1]["saves"]):
+        print(f"{name:<40}{ownership['saves']:>8} saves {ownership['share'] * 100:>6.1f}%"
+              f"{_format_number(ownership['quantity']):>10} total")
+
+    if args.histogram:
+        section = "save_columns" if args.histogram in SAVE_COLUMNS else "player_columns"
+        histogram = report[section][args.histogram]["histogram"]
+        print()
+        print(f"Histogram of {args.histogram}")
+        largest = max(histogram["counts"], default=0) or 1
+        for low, high, count in zip(histogram["edges"], histogram["edges"][1:], histogram["counts"]):
+            print(f"{_format_number(low):>10} - {_format_number(high):<10}{count:>8}  {'#' * round(40 * count / largest)}")
+
+    if args.by_team:
+        print()
+        print(f"{args.by_team} by team")
+        print(f"{'team':<32}" + "".join(f"{how:>10}" for how in GROUP_REDUCTIONS))
+        for team in sorted(corpus.team_names, key=str.casefold):
+            print(f"{team:<32}" + "".join(f"{_format_number(report['by_team'][how][team]):>10}"
+                                          for how in GROUP_REDUCTIONS))
+    return 0
+
+
+def build_parser():
+    """
+    Build the argument parser
+
+    Returns:
+        argparse.ArgumentParser: The parser with all subcommands
+    """
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Work with Repo save files without the GUI")
+    parser.add_argument("--password", help="save password (default: the game's password)")
+    parser.add_argument("--try-password", action="append", default=[], metavar="PASSWORD",
+                        help="another password saves may use, tried after the game's password (repeatable)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show diagnostic output on stderr")
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+    subparsers.required = True
+
+    decrypt = subparsers.add_parser("decrypt", help="write the JSON payload of a save")
+    decrypt.add_argument("save", help="save file")
+    decrypt.add_argument("-o", "--output", help="output file (default: stdout)")
+    decrypt.add_argument("--pretty", action="store_true", help="indent the JSON")
+    decrypt.set_defaults(handler=command_decrypt)
+
+    encrypt = subparsers.add_parser("encrypt", help="write a JSON file into a save")
+    encrypt.add_argument("input", help="JSON file, or - for stdin")
+    encrypt.add_argument("save", help="save file to write")
+    encrypt.add_argument("--format", choices=es3_codec.CONTAINER_FORMATS,
+                         help="container format (default: keep the existing file's format, else encrypted)")
+    encrypt.add_argument("--gzip", action="store_true", default=None, help="compress the payload")
+    encrypt.add_argument("--no-gzip", dest="gzip", action="store_false", help="do not compress the payload")
+    encrypt.set_defaults(handler=command_encrypt)
+
+    inspect = subparsers.add_parser("inspect", help="show the team, run stats and players of a save")
+    inspect.add_argument("save", help="save file")
+    inspect.add_argument("--json", action="store_true", help="print the summary as JSON")
+    inspect.set_defaults(handler=command_inspect)
+
+    set_field_parser = subparsers.add_parser(
+        "set-field", help="change values by dotted path",
+        description="Change values by dotted path, e.g. dictionaryOfDictionaries.value.runStats.currency=50. "
+                    "Values are parsed as JSON, anything else is taken as a string.")
+    set_field_parser.add_argument("save", help="save file")
+    set_field_parser.add_argument("assignments", nargs="+", metavar="PATH=VALUE", help="field to set")
+    set_field_parser.add_argument("--no-backup", action="store_true", help="do not back up the original")
+    set_field_parser.add_argument("--dry-run", action="store_true", help="show the changes without saving")
+    set_field_parser.set_defaults(handler=command_set_field)
+
+    diff = subparsers.add_parser("diff", help="list the differences between two saves")
+    diff.add_argument("first", help="first save or JSON file")
+    diff.add_argument("second", help="second save or JSON file")
+    diff.add_argument("--json", action="store_true", help="print the differences as JSON")
+    diff.set_defaults(handler=command_diff)
+
+    decrypt_many = subparsers.add_parser("decrypt-many", help="decode many saves in parallel")
+    decrypt_many.add_argument("paths", nargs="+", help="save files, or folders to search for .es3 files")
+    decrypt_many.add_argument("-o", "--output-dir", help="write each payload to <dir>/<name>.json "
+                                                          "(default: only check that every save decodes)")
+    _add_batch_options(decrypt_many)
+    decrypt_many.set_defaults(handler=command_decrypt_many)
+
+    encrypt_many = subparsers.add_parser("encrypt-many", help="encode many JSON files into saves in parallel")
+    encrypt_many.add_argument("paths", nargs="+", help="JSON files, or folders to search for .json files")
+    encrypt_many.add_argument("-o", "--output-dir", required=True, help="folder for the <name>.Es3 files")
+    encrypt_many.add_argument("--format", choices=es3_codec.CONTAINER_FORMATS,
+                              help="container format (default: keep existing files' format, else encrypted)")
+    _add_batch_options(encrypt_many)
+    encrypt_many.set_defaults(handler=command_encrypt_many)
+
+    edit = subparsers.add_parser(
+        "edit", help="apply an edit spec to many saves",
+        description="Apply a JSON or YAML edit spec to many saves. Without --commit only the changes are "
+                    "printed. With it every changed save is written, or none if any save fails. "
+                    "See app/core/bulk_edit.py for the spec format.")
+    edit.add_argument("spec", help="edit spec, .json or .yaml")
+    edit.add_argument("paths", nargs="+", help="save files, or folders to search for .es3 files")
+    edit.add_argument("--commit", action="store_true", help="write the changed saves, all or nothing")
+    edit.add_argument("--no-backup", action="store_true", help="do not back up the originals")
+    edit.add_argument("--json", action="store_true", help="print one JSON line of changes per save")
+    _add_batch_options(edit)
+    edit.set_defaults(handler=command_edit)
+
+    fsck = subparsers.add_parser(
+        "fsck", help="check saves and their backups for corruption",
+        description="Classify every save as ok, unreadable, bad_size, bad_padding, bad_gzip, invalid_utf8, "
+                    "invalid_json or missing_keys. Exits with status 1 if any file is not ok.")
+    fsck.add_argument("paths", nargs="*", help="save files or folders (default: the game's save folder)")
+    fsck.add_argument("--report", metavar="FILE", help="write one JSON record per file, - for stdout")
+    fsck.add_argument("--no-backups", action="store_true", help="do not check the .backup next to each save")
+    fsck.add_argument("--all", action="store_true", help="also list files that are ok")
+    _add_batch_options(fsck)
+    fsck.set_defaults(handler=command_fsck)
+
+    identify = subparsers.add_parser("identify", help="find which candidate password opens each save")
+    identify.add_argument("paths", nargs="+", help="save files, or folders to search for .es3 files")
+    identify.set_defaults(handler=command_identify)
+
+    export = subparsers.add_parser(
+        "export", help="stream save, player and item rows of many saves to NDJSON or CSV",
+        description="Export one row per save (team, run stats), per player (health, upgrades) and per item. "
+                    "NDJSON is one stream with a 'kind' field, CSV writes saves.csv, players.csv and items.csv.")
+    export.add_argument("paths", nargs="+", help="save files, or folders to search for .es3 files")
+    export.add_argument("--format", choices=("ndjson", "csv"), default="ndjson", help="output format (default: ndjson)")
+    export.add_argument("-o", "--output", help="NDJSON file (default: stdout) or CSV folder")
+    _add_batch_options(export)
+    export.set_defaults(handler=command_export)
+
+    import_parser = subparsers.add_parser(
+        "import", help="create a save folder for every record of an NDJSON file",
+        description="Create <output>/REPO_SAVE_<time>/REPO_SAVE_<time>.Es3 for every line of an NDJSON file. "
+                    "A line holds a complete save ({\"save\": {...}}), or changes to a new game: "
+                    "{\"patch\": {...}} (JSON merge patch), {\"edits\": [...]} (edit spec steps) "
+                    "and {\"team_name\": \"...\"}. \"folder\" sets the folder name.")
+    import_parser.add_argument("input", help="NDJSON file, - for stdin")
+    import_parser.add_argument("-o", "--output", help="folder for the save folders (default: the game's save folder)")
+    import_parser.add_argument("--template", help="save that records start from instead of a new game")
+    import_parser.add_argument("--progress", metavar="FILE",
+                               help="progress file for resuming (default: <input>.progress)")
+    import_parser.add_argument("--no-progress", action="store_true", help="do not record progress")
+    _add_batch_options(import_parser)
+    import_parser.set_defaults(handler=command_import)
+
+    new = subparsers.add_parser("new", help="create new game saves, each in its own REPO_SAVE_ folder")
+    new.add_argument("-o", "--output", help="folder for the save folders (default: the game's save folder)")
+    new.add_argument("-n", "--count", type=int, default=1, help="number of saves (default: 1)")
+    new.add_argument("--team-name", default="R.E.P.O.",
+                     help="team name, {n} is replaced by the number of the save (default: R.E.P.O.)")
+    new.add_argument("--player", action="append", default=[], metavar="STEAMID=NAME",
+                     help="player to add to every save (repeatable, at most 6)")
+    new.add_argument("--date", help="save date as YYYY-MM-DD (default: today)")
+    _add_batch_options(new)
+    new.set_defaults(handler=command_new)
+
+    list_parser = subparsers.add_parser("list", help="list the saves in a folder with their summaries")
+    list_parser.add_argument("folder", nargs="?", help="folder of save folders (default: the game's save folder)")
+    list_parser.add_argument("--json", action="store_true", help="print one JSON object per save")
+    list_parser.add_argument("--rebuild", action="store_true", help="read every save again instead of using the index")
+    list_parser.add_argument("-j", "--jobs", type=int, help="worker processes (default: one per CPU)")
+    list_parser.set_defaults(handler=command_list)
+
+    discover = subparsers.add_parser("discover", help="find the game's save folders in Proton and Wine prefixes")
+    discover.add_argument("--refresh", action="store_true", help="search again instead of using the cached result")
+    discover.set_defaults(handler=command_discover)
+
+    query = subparsers.add_parser("query", help="find saves by Steam ID, player or team name, or dictionary values")
+    query.add_argument("folders", nargs="*", help="folders of save folders (default: the game's save folders)")
+    query.add_argument("--player", action="append", default=[], metavar="STEAMID",
+                       help="save must have this player (repeatable)")
+    query.add_argument("--player-name", action="append", default=[], metavar="NAME",
+                       help="save must have a player of this name, ignoring case (repeatable)")
+    query.add_argument("--team", action="append", default=[], metavar="NAME",
+                       help="save's team name, ignoring case (repeatable, any of them matches)")
+    query.add_argument("--where", action="append", default=[], metavar="DICT.KEY<OP>NUMBER",
+                       help="dictionary value condition, e.g. \"itemsPurchased.Item Gun Shotgun>10\" (repeatable)")
+    query.add_argument("--json", action="store_true", help="print one JSON object per save")
+    query.add_argument("--rebuild", action="store_true", help="read every save again instead of using the index")
+    query.add_argument("-j", "--jobs", type=int, help="worker processes (default: one per CPU)")
+    query.set_defaults(handler=command_query)
+
+    stats = subparsers.add_parser("stats", help="percentiles, histograms and per-team figures over many saves")
+    stats.add_argument("folders", nargs="*", help="folders of save folders (default: the game's save folders)")
+    stats.add_argument("--percentiles", default="5,25,50,75,95", help="percentiles to show (default: 5,25,50,75,95)")
+    stats.add_argument("--histogram", metavar="COLUMN", help="show the histogram of a column, e.g. currency or speed")
+    stats.add_argument("--bins", type=int, default=10, help="histogram bins (default: 10)")
+    stats.add_argument("--by-team", metavar="COLUMN", help="show the count, sum, mean, min and max of a column per team")
+    stats.add_argument("--json", action="store_true", help="print the whole report as JSON")
+    stats.add_argument("--rebuild", action="store_true", help="read every save again instead of using the index")
+    stats.add_argument("-j", "--jobs", type=int, help="worker processes (default: one per CPU)")
+    stats.set_defaults(handler=command_stats)
+
+    return parser
+
+
+def _add_batch_options(parser):
+    """Add the options shared by the batch commands"""
+    parser.add_argument("-j", "--jobs", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--ordered", action="store_true", help="report files in input order instead of as they finish")
+
+
+def main(argv=None):
+    """
+    Command line entry point
+
+    Args:
+        argv (list, optional): Arguments, defaults to sys.argv[1:]
+
+    Returns:
+        int: Exit code
+    """
+    args = build_parser().parse_args(argv)
+    output = _LibraryOutput(args.verbose)
+
+    try:
+        with output.capture():
+            save_manager = SaveManager(candidate_passwords=args.try_password)
+        return args.handler(args, save_manager, output)
+    except CommandError as e:
+        output.dump()
+        print(f"error: {str(e)}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        # Output piped into a command that exited early, e.g. head
+        sys.stderr.close()
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,36 @@
 """
 Core modules for the Repo Save Modifier application.
+
+Public names are imported on first access, so importing the package is free
+and code that only needs SaveManager or GameSave never loads Qt or requests.
 """
 
-from .save_manager import SaveManager
-from .data_models import PlayerData, GameSave
-from .steam_api import SteamAPI
-from .settings import Settings
-from .user_cache import CachedUser
-
-__all__ = [
-    'SaveManager',
-    'PlayerData',
-    'GameSave',
-    'SteamAPI',
-    'Settings'
-    'CachedUser'
-]
+import importlib
+
+# Public name -> submodule defining it
+_LAZY_NAMES = {
+    'SaveManager': '.save_manager',
+    'PlayerData': '.data_models',
+    'GameSave': '.data_models',
+    'SteamAPI': '.steam_api',
+    'Settings': '.settings',
+    'CachedUser': '.user_cache',
+    'SaveTermIndex': '.save_query',
+    'SaveCorpus': '.save_analytics',
+}
+
+__all__ = list(_LAZY_NAMES)
+
+
+def __getattr__(name):
+    """Import the submodule defining a public name when the name is first used"""
+    module_name = _LAZY_NAMES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value  # Later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,180 @@
+"""
+Crash-safe file replacement.
+
+Files are written to a sibling temporary file, flushed to disk, and moved over
+the target with os.replace, so readers only ever see the old or the new
+contents. The old version can be kept as a backup by hard-linking its inode
+instead of copying its bytes.
+"""
+
+import os
+
+
+def fsync_directory(directory):
+    """
+    Flush a directory entry to disk so a rename inside it survives a crash
+
+    Args:
+        directory (str): Directory path
+    """
+    # Windows cannot open directories, NTFS journals the rename itself
+    if os.name == "nt":
+        return
+    try:
+        dir_fd = os.open(directory or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def _temp_sibling(path, suffix):
+    """
+    Create a unique temporary file next to path
+
+    Unlike tempfile.mkstemp the file is created with the default permissions
+    (0666 minus the umask), so the replaced file keeps normal permissions.
+
+    Returns:
+        tuple: (file descriptor, temporary path)
+    """
+    directory, base_name = os.path.split(os.path.abspath(path))
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        temp_path = os.path.join(directory, f".{base_name}.{os.urandom(4).hex()}{suffix}")
+        try:
+            return os.open(temp_path, flags, 0o666), temp_path
+        except FileExistsError:
+            continue
+
+
+def preserve_as_backup(path, backup_path):
+    """
+    Keep the current file as a backup without copying its bytes
+
+    The backup is a hard link to the current inode, swapped in atomically over any
+    previous backup. If hard links are not supported the file is renamed instead,
+    so the caller must put a new file at path straight away.
+
+    Args:
+        path (str): File to preserve
+        backup_path (str): Where the backup should live
+
+    Returns:
+        str: "link" or "rename" depending on how the backup was made
+    """
+    link_path = None
+    try:
+        fd, link_path = _temp_sibling(backup_path, ".link")
+        os.close(fd)
+        os.remove(link_path)
+        os.link(path, link_path)
+        os.replace(link_path, backup_path)
+        return "link"
+    except (OSError, NotImplementedError, AttributeError):
+        if link_path and os.path.exists(link_path):
+            os.remove(link_path)
+        os.replace(path, backup_path)
+        return "rename"
+
+
+class AtomicWriter:
+    """
+    Context manager that writes a file atomically:
+
+        with AtomicWriter(path, backup_path=path + ".backup") as file_out:
+            file_out.write(data)
+
+    On a clean exit the temporary file is fsynced, the current file (if any) is
+    kept as the backup, the temporary file replaces the target and the
+    directory is fsynced. On an exception the temporary file is removed and the
+    target is left untouched.
+    """
+
+    def __init__(self, path, backup_path=None, durable=True):
+        """
+        Initialize the writer
+
+        Args:
+            path (str): Target file path
+            backup_path (str, optional): Keep the previous version of the target here. Defaults to None.
+            durable (bool, optional): Whether to fsync the file and directory. Defaults to True.
+        """
+        self.path = path
+        self.backup_path = backup_path
+        self.durable = durable
+        self.backup_method = None
+        self._temp_path = None
+        self._file = None
+
+    def __enter__(self):
+        fd, self._temp_path = _temp_sibling(self.path, ".tmp")
+        self._file = os.fdopen(fd, 'wb')
+        return self._file
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+            return False
+        try:
+            self.commit()
+        except BaseException:
+            self.abort()
+            raise
+        return False
+
+    def commit(self):
+        """Flush the temporary file and move it over the target"""
+        self._file.flush()
+        if self.durable:
+            os.fsync(self._file.fileno())
+        self._file.close()
+
+        # Match the permissions of the file being replaced
+        if os.path.exists(self.path):
+            try:
+                os.chmod(self._temp_path, os.stat(self.path).st_mode & 0o7777)
+            except OSError:
+                pass
+
+            if self.backup_path:
+                self.backup_method = preserve_as_backup(self.path, self.backup_path)
+
+        os.replace(self._temp_path, self.path)
+        self._temp_path = None
+
+        if self.durable:
+            fsync_directory(os.path.dirname(os.path.abspath(self.path)))
+
+    def abort(self):
+        """Discard the temporary file"""
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+        if self._temp_path and os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+        self._temp_path = None
+
+
+def atomic_write(path, buffers, backup_path=None, durable=True):
+    """
+    Atomically replace a file with the given buffers
+
+    Args:
+        path (str): Target file path
+        buffers (list): Bytes-like objects to write in order
+        backup_path (str, optional): Keep the previous version of the target here. Defaults to None.
+        durable (bool, optional): Whether to fsync the file and directory. Defaults to True.
+
+    Returns:
+        str: How the backup was made ("link" or "rename"), or None if no backup was made
+    """
+    from .es3_codec import write_vectored
+
+    writer = AtomicWriter(path, backup_path, durable)
+    with writer as file_out:
+        write_vectored(file_out, buffers)
+    return writer.backup_method
@@ -0,0 +1,430 @@
+"""
+Content-addressed backup store for save files.
+
+Each backup is the decrypted JSON payload of a save, compressed and stored as a
+blob named after the SHA-256 of the payload, so identical versions of a save (or
+identical saves in different folders sharing a store) are only stored once. A
+small JSON index records which file each version came from and when it was
+taken, and retention is enforced by version count and total blob size.
+
+Several processes may share a store, e.g. the editor and a command line batch.
+Every change re-reads the index while holding <root>/index.lock, so no writer
+drops the versions another one added.
+
+Layout:
+    <root>/index.json
+    <root>/index.lock
+    <root>/objects/<hash[:2]>/<hash>.xz   (lzma)
+    <root>/objects/<hash[:2]>/<hash>.zz   (zlib)
+"""
+
+import contextlib
+import hashlib
+import json
+import lzma
+import os
+import threading
+import time
+import zlib
+
+from . import atomic_io
+
+
+# Folder name used for a store kept next to the save it backs up
+STORE_FOLDER_NAME = ".backups"
+
+# Default retention: versions kept per save file and total compressed blob bytes
+DEFAULT_MAX_VERSIONS = 50
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Blob compressors, keyed by name, as (file extension, compress, decompress)
+COMPRESSORS = {
+    "lzma": (".xz", lambda data: lzma.compress(data, preset=6), lzma.decompress),
+    "zlib": (".zz", lambda data: zlib.compress(data, 9), zlib.decompress),
+}
+
+INDEX_VERSION = 1
+
+
+def _lock_file(file_obj):
+    """Take an exclusive lock on an open file, waiting for other processes to release it"""
+    if os.name == "nt":
+        import msvcrt
+
+        file_obj.seek(0)
+        while True:
+            try:
+                # LK_LOCK itself retries for 10 seconds before failing
+                msvcrt.locking(file_obj.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+    import fcntl
+
+    fcntl.flock(file_obj.fileno(), fcntl.LOCK_EX)
+
+
+def _unlock_file(file_obj):
+    """Release a lock taken with _lock_file"""
+    if os.name == "nt":
+        import msvcrt
+
+        file_obj.seek(0)
+        msvcrt.locking(file_obj.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+
+        fcntl.flock(file_obj.fileno(), fcntl.LOCK_UN)
+
+
+class BackupStore:
+    """
+    Deduplicated, compressed history of save payloads under a single root folder
+    """
+
+    def __init__(self, root, compression="lzma", max_versions=DEFAULT_MAX_VERSIONS, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Initialize the backup store
+
+        Args:
+            root (str): Folder holding the index and blobs, created on first write
+            compression (str, optional): "lzma" or "zlib". Defaults to "lzma".
+            max_versions (int, optional): Versions kept per save file, 0 for unlimited. Defaults to 50.
+            max_bytes (int, optional): Budget for compressed blob bytes, 0 for unlimited. Defaults to 64 MiB.
+        """
+        if compression not in COMPRESSORS:
+            raise ValueError(f"Unknown backup compression: {compression}")
+
+        self.root = root
+        self.compression = compression
+        self.max_versions = max_versions
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(root, "index.json")
+        self.lock_path = os.path.join(root, "index.lock")
+        self.objects_path = os.path.join(root, "objects")
+        self._lock = threading.RLock()
+        self._index = None
+        self._index_stamp = None
+
+    # Index
+
+    def _index_file_stamp(self):
+        """(mtime, size) of the index file, None if there is none"""
+        try:
+            stat = os.stat(self.index_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load_index(self, refresh=False):
+        """
+        Load the index from disk, again whenever another process changed it
+
+        Args:
+            refresh (bool, optional): Read the file even if it looks unchanged. Defaults to False.
+        """
+        stamp = self._index_file_stamp()
+        if self._index is None or refresh or stamp != self._index_stamp:
+            index = {"version": INDEX_VERSION, "versions": []}
+            if stamp is not None:
+                try:
+                    with open(self.index_path, 'r', encoding='utf-8') as file_obj:
+                        index = json.load(file_obj)
+                except Exception as e:
+                    print(f"Warning: Could not read backup index {self.index_path}: {str(e)}")
+            self._index = index
+            self._index_stamp = stamp
+        return self._index
+
+    @contextlib.contextmanager
+    def _changing_index(self):
+        """
+        Hold the store's lock file while changing the index, starting from the index on disk
+
+        Yields:
+            dict: The current index, to change and write back with _save_index
+        """
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            with open(self.lock_path, 'a+b') as lock_file:
+                _lock_file(lock_file)
+                try:
+                    yield self._load_index(refresh=True)
+                finally:
+                    _unlock_file(lock_file)
+
+    def _save_index(self):
+        """Atomically write the index back to disk"""
+        os.makedirs(self.root, exist_ok=True)
+        data = json.dumps(self._index, indent=1).encode('utf-8')
+        atomic_io.atomic_write(self.index_path, [data])
+        self._index_stamp = self._index_file_stamp()
+
+    @staticmethod
+    def _source_key(file_path):
+        """Normalized path used to group versions of the same save"""
+        return os.path.normcase(os.path.abspath(file_path))
+
+    # Blobs
+
+    def _blob_path(self, blob_hash, compression):
+        """Path of a blob for the given hash and compressor"""
+        extension = COMPRESSORS[compression][0]
+        return os.path.join(self.objects_path, blob_hash[:2], blob_hash + extension)
+
+    def _find_blob(self, blob_hash):
+        """
+        Find a stored blob regardless of the compressor used to write it
+
+        Returns:
+            tuple: (path, compression) or (None, None) if the blob is missing
+        """
+        for compression in COMPRESSORS:
+            path = self._blob_path(blob_hash, compression)
+            if os.path.exists(path):
+                return path, compression
+        return None, None
+
+    def _write_blob(self, blob_hash, payload):
+        """
+        Store a payload as a compressed blob unless it is already present
+
+        Returns:
+            int: Size of the blob on disk
+        """
+        path, _ = self._find_blob(blob_hash)
+        if path is not None:
+            return os.path.getsize(path)
+
+        compressed = COMPRESSORS[self.compression][1](payload)
+        path = self._blob_path(blob_hash, self.compression)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_io.atomic_write(path, [compressed])
+        return len(compressed)
+
+    def read_blob(self, blob_hash):
+        """
+        Read and decompress a blob, checking it against its hash
+
+        Args:
+            blob_hash (str): SHA-256 hex digest of the payload
+
+        Returns:
+            bytes: The original payload
+
+        Raises:
+            FileNotFoundError: If the blob is not in the store
+            ValueError: If the blob does not match its hash
+        """
+        path, compression = self._find_blob(blob_hash)
+        if path is None:
+            raise FileNotFoundError(f"Backup blob not found: {blob_hash}")
+        with open(path, 'rb') as file_obj:
+            payload = COMPRESSORS[compression][2](file_obj.read())
+        if hashlib.sha256(payload).hexdigest() != blob_hash:
+            raise ValueError(f"Backup blob is corrupt: {blob_hash}")
+        return payload
+
+    # Versions
+
+    def add(self, file_path, payload, timestamp=None):
+        """
+        Record a version of a save file
+
+        A payload identical to the newest version of the same file is not recorded again.
+
+        Args:
+            file_path (str): Save file the payload belongs to
+            payload (bytes): Decrypted JSON payload
+            timestamp (float, optional): When the version was taken. Defaults to now.
+
+        Returns:
+            dict: The index entry for this version
+        """
+        with self._lock:
+            return self.add_stored([(file_path, self.store_payload(payload, timestamp))])[0]
+
+    def store_payload(self, payload, timestamp=None):
+        """
+        Write a payload's blob without touching the index
+
+        Blobs are named by their hash and written atomically, so several processes can
+        store payloads at once. The returned record is indexed later with add_stored.
+
+        Args:
+            payload (bytes): Decrypted JSON payload
+            timestamp (float, optional): When the version was taken. Defaults to now.
+
+        Returns:
+            dict: The hash, size, stored size and timestamp of the payload
+        """
+        payload = bytes(payload)
+        blob_hash = hashlib.sha256(payload).hexdigest()
+        return {
+            "hash": blob_hash,
+            "timestamp": time.time() if timestamp is None else timestamp,
+            "size": len(payload),
+            "stored_size": self._write_blob(blob_hash, payload),
+        }
+
+    def add_stored(self, records):
+        """
+        Index payloads already written with store_payload, saving the index once
+
+        Args:
+            records (list): (file_path, record) tuples
+
+        Returns:
+            list: The index entry for each record
+        """
+        with self._changing_index() as index:
+            entries = []
+            for file_path, record in records:
+                history = self.versions(file_path)
+                if history and history[0]["hash"] == record["hash"]:
+                    entries.append(history[0])
+                    continue
+
+                entry = {
+                    "id": f"{int(record['timestamp'] * 1000):x}-{record['hash'][:12]}",
+                    "source": self._source_key(file_path),
+                    "hash": record["hash"],
+                    "timestamp": record["timestamp"],
+                    "size": record["size"],
+                    "stored_size": record["stored_size"],
+                }
+                index["versions"].append(entry)
+                entries.append(entry)
+
+            self._enforce_retention()
+            self._save_index()
+            return entries
+
+    def versions(self, file_path=None):
+        """
+        List recorded versions, newest first
+
+        Args:
+            file_path (str, optional): Only list versions of this save file. Defaults to all.
+
+        Returns:
+            list: Index entries
+        """
+        with self._lock:
+            entries = self._load_index()["versions"]
+            if file_path is not None:
+                source = self._source_key(file_path)
+                entries = [entry for entry in entries if entry["source"] == source]
+            return sorted(entries, key=lambda entry: entry["timestamp"], reverse=True)
+
+    def get(self, version_id):
+        """
+        Look up a version by id
+
+        Returns:
+            dict: The index entry, or None if unknown
+        """
+        with self._lock:
+            for entry in self._load_index()["versions"]:
+                if entry["id"] == version_id:
+                    return entry
+        return None
+
+    def read(self, version_id):
+        """
+        Read the payload of a version
+
+        Args:
+            version_id (str): Version id from versions()
+
+        Returns:
+            bytes: The decrypted JSON payload
+        """
+        entry = self.get(version_id)
+        if entry is None:
+            raise KeyError(f"Unknown backup version: {version_id}")
+        return self.read_blob(entry["hash"])
+
+    # Retention
+
+    def _blob_sizes(self):
+        """Stored size of each blob referenced by the index"""
+        sizes = {}
+        for entry in self._index["versions"]:
+            sizes[entry["hash"]] = entry["stored_size"]
+        return sizes
+
+    def _enforce_retention(self):
+        """Drop the oldest versions beyond the count and byte budgets, then the blobs only they used"""
+        referenced = set(self._blob_sizes())
+        versions = sorted(self._index["versions"], key=lambda entry: entry["timestamp"], reverse=True)
+
+        # Keep at most max_versions per save file
+        if self.max_versions:
+            kept = []
+            per_source = {}
+            for entry in versions:
+                count = per_source.get(entry["source"], 0)
+                if count < self.max_versions:
+                    kept.append(entry)
+                    per_source[entry["source"]] = count + 1
+            versions = kept
+
+        # Drop the oldest versions until the unique blobs fit the byte budget,
+        # but always keep the newest version of every save file
+        if self.max_bytes:
+            newest = {}
+            for entry in versions:
+                newest.setdefault(entry["source"], entry["id"])
+            self._index["versions"] = versions
+            while sum(self._blob_sizes().values()) > self.max_bytes:
+                removable = [entry for entry in versions if newest[entry["source"]] != entry["id"]]
+                if not removable:
+                    break
+                versions.remove(removable[-1])
+
+        self._index["versions"] = versions
+        self._collect_garbage(referenced - set(self._blob_sizes()))
+
+    def _collect_garbage(self, dropped):
+        """
+        Delete the blobs the index stopped referencing
+
+        Only these are deleted: other files in the objects folder may be blobs that
+        batch workers stored for add_stored, or another writer's temporary files.
+
+        Args:
+            dropped (set): Hashes referenced before retention and not after
+        """
+        for blob_hash in dropped:
+            for compression in COMPRESSORS:
+                path = self._blob_path(blob_hash, compression)
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"Warning: Could not remove backup blob {os.path.basename(path)}: {str(e)}")
+
+    def prune(self):
+        """Apply the retention budgets now, e.g. after lowering them"""
+        with self._changing_index():
+            self._enforce_retention()
+            self._save_index()
+
+    def stats(self):
+        """
+        Get the size of the store
+
+        Returns:
+            dict: Number of versions and blobs, payload bytes and stored bytes
+        """
+        with self._lock:
+            versions = self._load_index()["versions"]
+            sizes = self._blob_sizes()
+            return {
+                "versions": len(versions),
+                "blobs": len(sizes),
+                "payload_bytes": sum(entry["size"] for entry in versions),
+                "stored_bytes": sum(sizes.values()),
+            }
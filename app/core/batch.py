@@ -0,0 +1,337 @@
+"""
+Parallel batch decoding and encoding of many save files.
+
+Work is spread over a pool of worker processes. Each worker builds one
+SaveManager when it starts and keeps it, so the crypto backend, JSON engine
+and key cache stay loaded for every file it handles. Results stream back as a
+generator, in completion order or input order, with at most max_in_flight
+chunks of files queued at a time, so arbitrarily long inputs use bounded
+memory. Files are sent to the workers in small chunks, so the cost of passing
+work between processes is not paid per file.
+"""
+
+import contextlib
+import io
+import itertools
+import os
+import sys
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from . import crypto_backend
+from . import es3_codec
+from . import json_engine
+
+
+# Files handed to a worker at a time
+DEFAULT_CHUNK_SIZE = 8
+
+
+class BatchResult:
+    """
+    Outcome of one file in a batch
+    """
+
+    def __init__(self, path, value=None, error=None, container=None, index=None, history=None):
+        """
+        Initialize the result
+
+        Args:
+            path (str): The save file (decrypting) or output file (encrypting)
+            value: The payload, parsed document or output path when decrypting,
+                the number of bytes written when encrypting
+            error (str, optional): Error message if the file failed. Defaults to None.
+            container (str, optional): Container format of the file. Defaults to None.
+            index (int, optional): Position of the file in the input. Defaults to None.
+            history (dict, optional): Backup blob of the original file stored by a worker,
+                for the caller to index with BackupStore.add_stored. Defaults to None.
+        """
+        self.path = path
+        self.value = value
+        self.error = error
+        self.container = container
+        self.index = index
+        self.history = history
+
+    @property
+    def ok(self):
+        """Whether the file was processed successfully"""
+        return self.error is None
+
+    def __repr__(self):
+        status = "ok" if self.ok else f"error={self.error!r}"
+        return f"BatchResult({self.path!r}, {status})"
+
+
+# Work done on a single file, shared by the workers and the in-process path
+
+def _decrypt_file(save_manager, path, password, parse, output_dir, check_only):
+    """
+    Decode one save
+
+    Returns:
+        BatchResult: The payload bytes, the parsed document if parse is set,
+            the path of the JSON file written to output_dir, or the payload size if check_only is set
+    """
+    try:
+        with open(path, 'rb') as file_obj:
+            payload = save_manager._decode_es3_file(file_obj, password, path)
+        container = save_manager.get_container_format(path)
+
+        if output_dir:
+            base_name = os.path.splitext(os.path.basename(path))[0]
+            output_path = os.path.join(output_dir, base_name + ".json")
+            with open(output_path, 'wb') as file_out:
+                file_out.write(payload)
+            value = output_path
+        elif check_only:
+            value = len(payload)
+        elif parse:
+            value = json_engine.loads(payload)
+        else:
+            value = bytes(payload)
+        return BatchResult(path, value, container=container)
+    except Exception as e:
+        return BatchResult(path, error=f"{type(e).__name__}: {str(e)}")
+
+
+def _encrypt_file(save_manager, output_path, data, password, container):
+    """
+    Encode one payload into a save file
+
+    Args:
+        data (bytes or dict): JSON bytes, or a document to serialize
+        container (str): Container format, None keeps the format of an existing
+            output file and otherwise writes an encrypted save
+
+    Returns:
+        BatchResult: The number of bytes written
+    """
+    try:
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = json_engine.dumps(data, save_manager.compact_json)
+
+        if container is None:
+            head = None
+            if os.path.isfile(output_path):
+                with open(output_path, 'rb') as file_in:
+                    head = file_in.read(es3_codec.SNIFF_SIZE)
+            container = save_manager.resolve_container(output_path, head, password)
+
+        if not save_manager.encrypt_es3_file(data, output_path, password, container=container):
+            raise IOError(f"Could not write {output_path}")
+        return BatchResult(output_path, os.path.getsize(output_path), container=container)
+    except Exception as e:
+        return BatchResult(output_path, error=f"{type(e).__name__}: {str(e)}")
+
+
+# Worker process state
+
+_worker_manager = None
+
+
+def _init_worker(manager_options):
+    """Build the worker's SaveManager and load the codec once per process"""
+    global _worker_manager
+    from .save_manager import SaveManager
+
+    # Workers have nobody to print diagnostics to
+    sys.stdout = open(os.devnull, 'w')
+    _worker_manager = SaveManager(**manager_options)
+    crypto_backend.get_backend()
+    json_engine.get_engine()
+
+
+def _run_chunk(function, chunk):
+    """Run a chunk of (index, arguments) tasks in a worker"""
+    results = []
+    for index, arguments in chunk:
+        result = function(_worker_manager, *arguments)
+        result.index = index
+        results.append(result)
+    return results
+
+
+class BatchCodec:
+    """
+    Decodes and encodes many saves in parallel with a pool of warm workers:
+
+        with BatchCodec(jobs=8) as codec:
+            for result in codec.decrypt_many(paths):
+                ...
+
+    The pool is started on first use and kept until close(), so several batches
+    can share it.
+    """
+
+    def __init__(self, jobs=None, password=None, manager_options=None, max_in_flight=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 save_manager=None):
+        """
+        Initialize the batch codec
+
+        Args:
+            jobs (int, optional): Worker processes, 1 runs in the calling process. Defaults to the CPU count.
+            password (str, optional): Save password. Defaults to the game's password.
+            manager_options (dict, optional): SaveManager arguments for the workers. Defaults to None.
+            max_in_flight (int, optional): Chunks queued or running at once. Defaults to 4 per job.
+            chunk_size (int, optional): Files sent to a worker at a time. Defaults to 8.
+            save_manager (SaveManager, optional): Manager used when jobs is 1. Defaults to a new one.
+        """
+        from .save_manager import DEFAULT_PASSWORD
+
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        self.password = password or DEFAULT_PASSWORD
+        self.manager_options = dict(manager_options or {})
+        self.max_in_flight = max(1, max_in_flight or self.jobs * 4)
+        self.chunk_size = max(1, chunk_size)
+        self._save_manager = save_manager
+        self._executor = None
+        self._pending = set()  # Futures submitted and not collected yet, by every run
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        """Shut down the worker pool"""
+        if self._executor is not None:
+            # shutdown(cancel_futures=True) needs Python 3.9
+            for future in self._pending:
+                future.cancel()
+            self._pending.clear()
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _get_executor(self):
+        """Start the worker pool on first use"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_worker,
+                                                 initargs=(self.manager_options,))
+        return self._executor
+
+    def _get_save_manager(self):
+        """SaveManager for running in the calling process"""
+        if self._save_manager is None:
+            from .save_manager import SaveManager
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                self._save_manager = SaveManager(**self.manager_options)
+        return self._save_manager
+
+    def decrypt_many(self, paths, parse=False, output_dir=None, ordered=False, check_only=False):
+        """
+        Decode many saves
+
+        Args:
+            paths (iterable): Save file paths, consumed lazily
+            parse (bool, optional): Return parsed documents instead of payload bytes. Defaults to False.
+            output_dir (str, optional): Write each payload to <output_dir>/<name>.json and return
+                that path instead, so payloads never travel between processes. Defaults to None.
+            ordered (bool, optional): Yield results in input order instead of completion order. Defaults to False.
+            check_only (bool, optional): Only check that each file decodes, returning the payload size.
+                Defaults to False.
+
+        Yields:
+            BatchResult: One result per path
+        """
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        tasks = ((path, self.password, parse, output_dir, check_only) for path in paths)
+        return self._run(_decrypt_file, tasks, ordered)
+
+    def encrypt_many(self, items, ordered=False):
+        """
+        Encode many payloads into save files
+
+        Args:
+            items (iterable): (output_path, data) or (output_path, data, container) tuples,
+                where data is JSON bytes or a document. Consumed lazily.
+            ordered (bool, optional): Yield results in input order instead of completion order. Defaults to False.
+
+        Yields:
+            BatchResult: One result per item
+        """
+        tasks = ((item[0], item[1], self.password, item[2] if len(item) > 2 else None) for item in items)
+        return self._run(_encrypt_file, tasks, ordered)
+
+    def run(self, function, tasks, ordered=False):
+        """
+        Run other per-file work on the pool
+
+        Args:
+            function (callable): Module-level function taking a SaveManager and the task
+                arguments and returning a BatchResult. It must not raise.
+            tasks (iterable): Argument tuples, the first argument is the file path. Consumed lazily.
+            ordered (bool, optional): Yield results in input order instead of completion order. Defaults to False.
+
+        Yields:
+            BatchResult: One result per task
+        """
+        return self._run(function, tasks, ordered)
+
+    def _run(self, function, tasks, ordered):
+        """
+        Run tasks on the pool, keeping at most max_in_flight chunks submitted at a time
+
+        Args:
+            function (callable): Work for one file, taking a SaveManager and the task arguments
+            tasks (iterable): Argument tuples, the first argument is the file path
+            ordered (bool): Yield in input order instead of completion order
+
+        Yields:
+            BatchResult: One result per task
+        """
+        if self.jobs == 1:
+            save_manager = self._get_save_manager()
+            for index, arguments in enumerate(tasks):
+                result = function(save_manager, *arguments)
+                result.index = index
+                yield result
+            return
+
+        executor = self._get_executor()
+        tasks = enumerate(tasks)
+        in_flight = {}  # future -> chunk of (index, arguments)
+        submitted = deque()  # Futures in input order, only kept for ordered results
+
+        def submit_next():
+            chunk = list(itertools.islice(tasks, self.chunk_size))
+            if not chunk:
+                return False
+            future = executor.submit(_run_chunk, function, chunk)
+            in_flight[future] = chunk
+            self._pending.add(future)
+            if ordered:
+                submitted.append(future)
+            return True
+
+        try:
+            while len(in_flight) < self.max_in_flight and submit_next():
+                pass
+
+            while in_flight:
+                if ordered:
+                    done = [submitted.popleft()]
+                    wait(done)
+                else:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    chunk = in_flight.pop(future)
+                    self._pending.discard(future)
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        # The worker itself failed, e.g. it was killed
+                        error = f"{type(e).__name__}: {str(e)}"
+                        results = [BatchResult(arguments[0], error=error, index=index) for index, arguments in chunk]
+                    submit_next()
+                    yield from results
+        finally:
+            # The caller stopped early, drop what has not started yet
+            for future in in_flight:
+                future.cancel()
+                self._pending.discard(future)
@@ -0,0 +1,367 @@
+"""
+Declarative bulk edits for save files.
+
+An edit spec lists operations to apply to the raw save document:
+
+    edits:
+      - {op: set, path: runStats.currency, value: 50000}
+      - {op: set, path: "playerUpgradeHealth.*", value: 5}
+      - {op: add, path: runStats.totalHaul, value: 1000}
+      - {op: purchase_item, item: Item Gun Handgun, add: 3}
+      - {op: purchase_upgrade, item: Item Upgrade Player Health, set: 2}
+
+Paths are dotted. "*" matches every key (or list element) at that level. A
+path whose first key is not at the top of the save is looked up in
+dictionaryOfDictionaries.value, so "runStats.level" and "playerHealth.*" work.
+ES3 wrappers ({"__type": ..., "value": ...}) are stepped through, so
+"teamName" and "playerNames.*" address their values.
+
+A spec is compiled once into an EditPlan, which SaveManager.apply_edits runs
+over many saves in parallel. Dry runs only report the changes, commits write
+every changed save as one transaction (see journal.py).
+"""
+
+import json
+import os
+
+from . import json_engine
+from .batch import BatchResult
+from .data_models import GameSave
+from .save_transaction import SaveTransaction
+
+
+# Where paths not found at the top of the save are looked up
+DICTIONARY_ROOT = ("dictionaryOfDictionaries", "value")
+
+WILDCARD = "*"
+
+
+class SpecError(ValueError):
+    """The edit spec is invalid"""
+
+
+def _is_wrapper(value):
+    """Whether a value is an ES3 {"__type": ..., "value": ...} wrapper"""
+    return isinstance(value, dict) and "__type" in value and "value" in value
+
+
+def _step(container, key):
+    """
+    Look up one path segment, stepping through ES3 wrappers
+
+    Returns:
+        tuple: (container holding the key, key), or (None, None) if not found
+    """
+    if isinstance(container, list):
+        try:
+            index = int(key)
+            container[index]
+            return container, index
+        except (ValueError, IndexError):
+            return None, None
+    if not isinstance(container, dict):
+        return None, None
+    if key in container:
+        return container, key
+    if _is_wrapper(container) and isinstance(container["value"], (dict, list)):
+        return _step(container["value"], key)
+    return None, None
+
+
+def _keys(container):
+    """All keys of a container for a wildcard, stepping through an ES3 wrapper"""
+    if _is_wrapper(container) and isinstance(container["value"], (dict, list)):
+        container = container["value"]
+    if isinstance(container, dict):
+        return container, list(container)
+    if isinstance(container, list):
+        return container, list(range(len(container)))
+    return container, []
+
+
+class PathSetter:
+    """
+    A compiled dotted path that can find and change every value it matches
+    """
+
+    def __init__(self, path):
+        """
+        Compile a path
+
+        Args:
+            path (str): Dotted path, "*" matches every key at its level
+        """
+        self.path = path
+        self.segments = tuple(segment for segment in path.split(".") if segment)
+        if not self.segments:
+            raise SpecError(f"Empty path: {path!r}")
+
+    def _root(self, data):
+        """The container the path starts in, the save itself or dictionaryOfDictionaries.value"""
+        if self.segments[0] in data or self.segments[0] == WILDCARD:
+            return data
+        root = data
+        for key in DICTIONARY_ROOT:
+            root = root.get(key) if isinstance(root, dict) else None
+        return root if isinstance(root, dict) else data
+
+    def matches(self, data):
+        """
+        Find every (container, key, display path) the path matches
+
+        Args:
+            data (dict): Save document
+
+        Returns:
+            list: Matches, each container[key] being a matched value
+        """
+        matches = []
+        prefix = [] if self._root(data) is data else list(DICTIONARY_ROOT)
+        self._walk(self._root(data), 0, prefix, matches)
+        return matches
+
+    def _walk(self, container, depth, walked, matches):
+        segment = self.segments[depth]
+        last = depth == len(self.segments) - 1
+
+        if segment == WILDCARD:
+            inner, keys = _keys(container)
+            inner_path = walked + ["value"] if inner is not container else walked
+            candidates = [(inner, key, inner_path) for key in keys]
+        else:
+            holder, key = _step(container, segment)
+            if holder is None:
+                if last and isinstance(container, dict) and not _is_wrapper(container):
+                    # A missing final key is created by set
+                    candidates = [(container, segment, walked)]
+                else:
+                    return
+            else:
+                holder_path = walked + ["value"] if holder is not container else walked
+                candidates = [(holder, key, holder_path)]
+
+        for holder, key, holder_path in candidates:
+            path = holder_path + [str(key)]
+            if last:
+                # The final value itself may be a wrapper, change its value
+                if key in _container_keys(holder) and _is_wrapper(holder[key]):
+                    matches.append((holder[key], "value", path + ["value"]))
+                else:
+                    matches.append((holder, key, path))
+            elif key in _container_keys(holder):
+                self._walk(holder[key], depth + 1, path, matches)
+
+
+def _container_keys(container):
+    """Keys that exist in a dict or list"""
+    if isinstance(container, dict):
+        return container
+    return range(len(container))
+
+
+class SetValue:
+    """Set every matched value"""
+
+    def __init__(self, path, value):
+        self.setter = PathSetter(path)
+        self.value = value
+
+    def apply(self, data, changes):
+        for holder, key, path in self.setter.matches(data):
+            old = holder[key] if key in _container_keys(holder) else None
+            if old != self.value or type(old) is not type(self.value):
+                holder[key] = self.value
+                changes.append((".".join(path), old, self.value))
+
+
+class AddValue:
+    """Add a number to every matched numeric value"""
+
+    def __init__(self, path, amount):
+        if isinstance(amount, bool) or not isinstance(amount, (int, float)):
+            raise SpecError(f"add needs a number, got {amount!r}")
+        self.setter = PathSetter(path)
+        self.amount = amount
+
+    def apply(self, data, changes):
+        for holder, key, path in self.setter.matches(data):
+            if key not in _container_keys(holder):
+                continue
+            old = holder[key]
+            if isinstance(old, bool) or not isinstance(old, (int, float)):
+                continue
+            new = old + self.amount
+            if new != old:
+                holder[key] = new
+                changes.append((".".join(path), old, new))
+
+
+class PurchaseItem:
+    """
+    Change an item's purchased quantity through GameSave, so the purchase totals
+    follow the same rules as edits made in the GUI
+    """
+
+    ITEM_DICTIONARIES = {
+        "purchase_item": ("purchased", "itemsPurchased", "update_item_purchased"),
+        "purchase_upgrade": ("upgradesPurchased", "itemsUpgradesPurchased", "update_upgrade_purchased"),
+    }
+
+    def __init__(self, op, item, add=None, set=None):
+        if (add is None) == (set is None):
+            raise SpecError(f"{op} needs exactly one of add or set")
+        amount = add if set is None else set
+        if isinstance(amount, bool) or not isinstance(amount, int):
+            raise SpecError(f"{op} quantity must be an integer, got {amount!r}")
+        self.op = op
+        self.item = item
+        self.add = add
+        self.set = set
+
+    def apply(self, data, changes):
+        items_key, dictionary_name, method_name = self.ITEM_DICTIONARIES[self.op]
+
+        # GameSave keeps references to the save's item dictionaries, so its
+        # update methods change the document in place
+        game_save = GameSave()
+        game_save._load_items(data)
+        purchased = game_save.items[items_key]
+        if self.item not in purchased:
+            return
+
+        watched = [(dictionary_name, purchased)]
+        if self.op == "purchase_item":
+            watched.append(("itemsPurchasedTotal", game_save.items["purchasedTotal"]))
+        before = [dictionary.get(self.item) for _, dictionary in watched]
+
+        quantity = purchased[self.item] + self.add if self.set is None else self.set
+        getattr(game_save, method_name)(self.item, quantity)
+
+        for (name, dictionary), old in zip(watched, before):
+            new = dictionary.get(self.item)
+            if new != old:
+                changes.append((".".join(DICTIONARY_ROOT + (name, self.item)), old, new))
+
+
+def _compile_edit(index, edit):
+    """Compile one entry of the spec"""
+    if not isinstance(edit, dict) or "op" not in edit:
+        raise SpecError(f"edit {index}: expected a mapping with an 'op' key")
+    options = dict(edit)
+    op = options.pop("op")
+    try:
+        if op == "set":
+            step = SetValue(options.pop("path"), options.pop("value"))
+        elif op == "add":
+            step = AddValue(options.pop("path"), options.pop("value"))
+        elif op in PurchaseItem.ITEM_DICTIONARIES:
+            step = PurchaseItem(op, options.pop("item"), options.pop("add", None), options.pop("set", None))
+        else:
+            raise SpecError(f"unknown op {op!r}")
+    except KeyError as e:
+        raise SpecError(f"edit {index} ({op}): missing {e.args[0]!r}")
+    except SpecError as e:
+        raise SpecError(f"edit {index}: {str(e)}")
+    if options:
+        raise SpecError(f"edit {index} ({op}): unknown keys {', '.join(sorted(options))}")
+    return step
+
+
+class EditPlan:
+    """
+    A compiled edit spec, applied to save documents in order
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+
+    def apply(self, data):
+        """
+        Apply every edit to a document in place
+
+        Args:
+            data (dict): Save document
+
+        Returns:
+            list: Changes as (path, old value, new value) tuples
+        """
+        changes = []
+        for step in self.steps:
+            step.apply(data, changes)
+        return changes
+
+
+def compile_spec(spec):
+    """
+    Compile an edit spec
+
+    Args:
+        spec (dict or list): {"edits": [...]} or the list of edits itself
+
+    Returns:
+        EditPlan: The compiled plan
+
+    Raises:
+        SpecError: If the spec is invalid
+    """
+    edits = spec.get("edits") if isinstance(spec, dict) else spec
+    if not isinstance(edits, list) or not edits:
+        raise SpecError("The spec needs a non-empty list of edits")
+    return EditPlan([_compile_edit(index, edit) for index, edit in enumerate(edits, 1)])
+
+
+def load_spec(path):
+    """
+    Load and compile an edit spec from a JSON or YAML file
+
+    Args:
+        path (str): Spec file, .yaml/.yml files need PyYAML
+
+    Returns:
+        EditPlan: The compiled plan
+    """
+    with open(path, 'r', encoding='utf-8') as file_obj:
+        text = file_obj.read()
+
+    if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise SpecError("YAML specs need PyYAML (pip install pyyaml), or write the spec as JSON")
+        spec = yaml.safe_load(text)
+    else:
+        try:
+            spec = json.loads(text)
+        except ValueError as e:
+            raise SpecError(f"Invalid JSON spec: {str(e)}")
+    return compile_spec(spec)
+
+
+def _edit_file(save_manager, path, plan, password, staged_path, create_backup):
+    """
+    Apply a plan to one save, staging the result for a transaction when staged_path is given
+
+    Returns:
+        BatchResult: The list of changes, the save is only staged if there are any
+    """
+    try:
+        with open(path, 'rb') as file_obj:
+            stat_result = os.fstat(file_obj.fileno())
+            file_bytes = file_obj.read()
+        plaintext = save_manager._decode_es3_buffer(file_bytes, password, path)
+        data = json_engine.loads(plaintext)
+        changes = plan.apply(data)
+
+        history = None
+        if staged_path and changes:
+            # Let the save transaction reuse this decode for its backup
+            save_manager.document_cache.put(path, password, file_bytes, stat_result, bytes(plaintext))
+            transaction = SaveTransaction(save_manager, path, password)
+            if not transaction.stage(data, staged_path, create_backup):
+                raise ValueError("Encoded data does not match the edited document")
+            history = transaction.history
+        return BatchResult(path, changes, container=save_manager.get_container_format(path), history=history)
+    except Exception as e:
+        if staged_path and os.path.exists(staged_path):
+            os.remove(staged_path)
+        return BatchResult(path, error=f"{type(e).__name__}: {str(e)}")
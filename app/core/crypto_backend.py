@@ -0,0 +1,514 @@
+"""
+Crypto backends for ES3 save files.
+
+ES3 uses PBKDF2-HMAC-SHA1 (100 iterations, IV as salt) to derive a 16-byte key
+and AES-128-CBC with PKCS7 padding. The fastest available implementation of
+each part is picked on first use, all of them produce byte-identical output.
+"""
+
+import hashlib
+import os
+
+
+# ES3 key derivation parameters
+KDF_ITERATIONS = 100
+KEY_LENGTH = 16
+BLOCK_SIZE = 16
+
+# Implementations in order of preference
+KDF_PREFERENCE = ["hashlib", "pycryptodome"]
+AES_PREFERENCE = ["cryptography", "pycryptodomex", "pycryptodome"]
+
+# Environment variable to force a backend, e.g. "hashlib+pycryptodome"
+BACKEND_ENV_VAR = "REPO_SAVE_CRYPTO_BACKEND"
+
+
+def password_bytes(password):
+    """
+    Convert a password to bytes the same way pycryptodome's PBKDF2 does
+
+    Args:
+        password (str or bytes): The password
+
+    Returns:
+        bytes: Encoded password
+    """
+    if isinstance(password, str):
+        return password.encode('latin-1')
+    return bytes(password)
+
+
+def pkcs7_pad(data, block_size=BLOCK_SIZE):
+    """
+    Apply PKCS7 padding
+
+    Args:
+        data (bytes): Data to pad
+        block_size (int, optional): Block size. Defaults to 16.
+
+    Returns:
+        bytes: Padded data
+    """
+    padding_length = block_size - len(data) % block_size
+    return bytes(data) + bytes([padding_length]) * padding_length
+
+
+def pkcs7_unpad(data, block_size=BLOCK_SIZE):
+    """
+    Remove PKCS7 padding
+
+    Args:
+        data (bytes): Padded data
+        block_size (int, optional): Block size. Defaults to 16.
+
+    Returns:
+        bytes: Unpadded data
+
+    Raises:
+        ValueError: If the padding is incorrect
+    """
+    padding_length = pkcs7_padding_length(data, block_size)
+    return data[:len(data) - padding_length]
+
+
+def pkcs7_padding_length(data, block_size=BLOCK_SIZE):
+    """
+    Validate PKCS7 padding and return its length
+
+    Args:
+        data (bytes): Padded data (only the last block is inspected)
+        block_size (int, optional): Block size. Defaults to 16.
+
+    Returns:
+        int: Number of padding bytes
+
+    Raises:
+        ValueError: If the padding is incorrect
+    """
+    data_length = len(data)
+    if data_length == 0 or data_length % block_size:
+        raise ValueError("Input data is not padded")
+    padding_length = data[-1]
+    if padding_length < 1 or padding_length > min(block_size, data_length):
+        raise ValueError("Padding is incorrect.")
+    if data[-padding_length:] != bytes([padding_length]) * padding_length:
+        raise ValueError("PKCS#7 padding is incorrect.")
+    return padding_length
+
+
+# Key derivation implementations
+
+def _kdf_hashlib(password, salt, iterations, key_length):
+    """PBKDF2-HMAC-SHA1 through hashlib (OpenSSL, runs in C)"""
+    return hashlib.pbkdf2_hmac('sha1', password_bytes(password), bytes(salt), iterations, key_length)
+
+
+def _load_kdf_pycryptodome():
+    """PBKDF2 through pycryptodome with a Python HMAC-SHA1 PRF (the original implementation)"""
+    from Crypto.Protocol.KDF import PBKDF2
+    from Crypto.Hash import HMAC, SHA1
+
+    def derive(password, salt, iterations, key_length):
+        return PBKDF2(password, bytes(salt), dkLen=key_length, count=iterations,
+                      prf=lambda p, s: HMAC.new(p, s, SHA1).digest())
+    return derive
+
+
+def _load_kdf(name):
+    """Load a key derivation function by name, raises ImportError if unavailable"""
+    if name == "hashlib":
+        if 'sha1' not in hashlib.algorithms_available and 'SHA1' not in hashlib.algorithms_available:
+            raise ImportError("hashlib has no sha1 support")
+        return _kdf_hashlib
+    if name == "pycryptodome":
+        return _load_kdf_pycryptodome()
+    raise ValueError(f"Unknown key derivation backend: {name}")
+
+
+# AES-CBC implementations
+
+class _PyCryptodomeCBC:
+    """AES-CBC through pycryptodome or pycryptodomex"""
+
+    def __init__(self, aes_module):
+        self.aes_module = aes_module
+
+    def new_cipher(self, key, iv, decrypt):
+        cipher = self.aes_module.new(bytes(key), self.aes_module.MODE_CBC, bytes(iv))
+        return cipher.decrypt if decrypt else cipher.encrypt
+
+    def new_cipher_into(self, key, iv, decrypt):
+        cipher = self.aes_module.new(bytes(key), self.aes_module.MODE_CBC, bytes(iv))
+        method = cipher.decrypt if decrypt else cipher.encrypt
+
+        def process_into(data, output):
+            method(data, output=output)
+        return process_into
+
+
+class _CryptographyCBC:
+    """AES-CBC through the cryptography package (OpenSSL)"""
+
+    def __init__(self):
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        self._cipher = Cipher
+        self._algorithms = algorithms
+        self._modes = modes
+
+    def new_cipher(self, key, iv, decrypt):
+        cipher = self._cipher(self._algorithms.AES(bytes(key)), self._modes.CBC(bytes(iv)))
+        context = cipher.decryptor() if decrypt else cipher.encryptor()
+        return context.update
+
+    def new_cipher_into(self, key, iv, decrypt):
+        update = self.new_cipher(key, iv, decrypt)
+
+        def process_into(data, output):
+            # update_into needs block_size - 1 bytes of slack, so copy the result instead
+            output[:] = update(data)
+        return process_into
+
+
+def _load_aes(name):
+    """Load an AES-CBC provider by name, raises ImportError if unavailable"""
+    if name == "cryptography":
+        return _CryptographyCBC()
+    if name == "pycryptodomex":
+        from Cryptodome.Cipher import AES
+        return _PyCryptodomeCBC(AES)
+    if name == "pycryptodome":
+        from Crypto.Cipher import AES
+        return _PyCryptodomeCBC(AES)
+    raise ValueError(f"Unknown AES backend: {name}")
+
+
+class CryptoBackend:
+    """
+    A key derivation implementation paired with an AES-CBC provider
+    """
+
+    def __init__(self, kdf_name, aes_name):
+        """
+        Initialize the backend
+
+        Args:
+            kdf_name (str): Key derivation implementation ("hashlib" or "pycryptodome")
+            aes_name (str): AES provider ("cryptography", "pycryptodomex" or "pycryptodome")
+
+        Raises:
+            ImportError: If one of the implementations is not installed
+        """
+        self.kdf_name = kdf_name
+        self.aes_name = aes_name
+        self._kdf = _load_kdf(kdf_name)
+        self._aes = _load_aes(aes_name)
+
+    @property
+    def name(self):
+        """Backend name as "<kdf>+<aes>" """
+        return f"{self.kdf_name}+{self.aes_name}"
+
+    def derive_key(self, password, salt, iterations=KDF_ITERATIONS, key_length=KEY_LENGTH):
+        """
+        Derive an AES key with PBKDF2-HMAC-SHA1
+
+        Args:
+            password (str or bytes): The password
+            salt (bytes): The salt (the file's IV for ES3)
+            iterations (int, optional): PBKDF2 iterations. Defaults to 100.
+            key_length (int, optional): Key length in bytes. Defaults to 16.
+
+        Returns:
+            bytes: The derived key
+        """
+        return self._kdf(password, salt, iterations, key_length)
+
+    def encrypt(self, key, iv, data):
+        """
+        AES-CBC encrypt already padded data
+
+        Args:
+            key (bytes): AES key
+            iv (bytes): Initialization vector
+            data (bytes): Data whose length is a multiple of 16
+
+        Returns:
+            bytes: Ciphertext
+        """
+        return self._aes.new_cipher(key, iv, decrypt=False)(data)
+
+    def decrypt(self, key, iv, data):
+        """
+        AES-CBC decrypt data without removing padding
+
+        Args:
+            key (bytes): AES key
+            iv (bytes): Initialization vector
+            data (bytes): Ciphertext whose length is a multiple of 16
+
+        Returns:
+            bytes: Padded plaintext
+        """
+        if len(data) % BLOCK_SIZE:
+            raise ValueError("Ciphertext length must be a multiple of 16 bytes")
+        return self._aes.new_cipher(key, iv, decrypt=True)(data)
+
+    def cbc_encryptor(self, key, iv):
+        """
+        Create an incremental AES-CBC encryptor
+
+        Args:
+            key (bytes): AES key
+            iv (bytes): Initialization vector
+
+        Returns:
+            callable: Function encrypting successive block-aligned chunks of one stream
+        """
+        return self._aes.new_cipher(key, iv, decrypt=False)
+
+    def cbc_decryptor(self, key, iv):
+        """
+        Create an incremental AES-CBC decryptor
+
+        Args:
+            key (bytes): AES key
+            iv (bytes): Initialization vector
+
+        Returns:
+            callable: Function decrypting successive block-aligned chunks of one stream
+        """
+        return self._aes.new_cipher(key, iv, decrypt=True)
+
+    def cbc_encryptor_into(self, key, iv):
+        """
+        Create an incremental AES-CBC encryptor that writes into caller-provided buffers
+
+        Args:
+            key (bytes): AES key
+            iv (bytes): Initialization vector
+
+        Returns:
+            callable: Function (data, output) encrypting block-aligned data into a
+                writable buffer of the same length
+        """
+        return self._aes.new_cipher_into(key, iv, decrypt=False)
+
+    def cbc_decryptor_into(self, key, iv):
+        """
+        Create an incremental AES-CBC decryptor that writes into caller-provided buffers
+
+        Args:
+            key (bytes): AES key
+            iv (bytes): Initialization vector
+
+        Returns:
+            callable: Function (data, output) decrypting block-aligned data into a
+                writable buffer of the same length
+        """
+        return self._aes.new_cipher_into(key, iv, decrypt=True)
+
+    def __repr__(self):
+        return f"CryptoBackend({self.name!r})"
+
+
+def available_backends():
+    """
+    List the installed implementations
+
+    Returns:
+        dict: {"kdf": [names], "aes": [names]} in order of preference
+    """
+    available = {"kdf": [], "aes": []}
+    for name in KDF_PREFERENCE:
+        try:
+            _load_kdf(name)
+            available["kdf"].append(name)
+        except ImportError:
+            pass
+    for name in AES_PREFERENCE:
+        try:
+            _load_aes(name)
+            available["aes"].append(name)
+        except ImportError:
+            pass
+    return available
+
+
+def _select_default_backend():
+    """Pick the fastest installed backend, honouring the override environment variable"""
+    override = os.environ.get(BACKEND_ENV_VAR)
+    if override:
+        kdf_name, _, aes_name = override.partition("+")
+        try:
+            return CryptoBackend(kdf_name, aes_name)
+        except (ImportError, ValueError) as e:
+            print(f"Warning: Crypto backend {override!r} unavailable ({str(e)}), using default")
+
+    # Only import until the first working implementation of each part is found
+    kdf_name = _first_loadable(KDF_PREFERENCE, _load_kdf)
+    aes_name = _first_loadable(AES_PREFERENCE, _load_aes)
+    if kdf_name is None or aes_name is None:
+        raise ImportError("No AES implementation found, install pycryptodome or cryptography")
+    backend = CryptoBackend(kdf_name, aes_name)
+    if backend.name == REFERENCE_BACKEND:
+        return backend
+
+    # Faster implementations must produce the same bytes as the reference
+    try:
+        mismatches = verify_backend(backend, quick=True)
+    except ImportError:
+        return backend  # No reference to compare with
+    if not mismatches:
+        return backend
+    print(f"Warning: Crypto backend {backend.name!r} failed the differential check ({mismatches[0]}), "
+          f"using {REFERENCE_BACKEND}")
+    return CryptoBackend(*REFERENCE_BACKEND.split("+"))
+
+
+def _first_loadable(names, loader):
+    """Return the first name the loader can import, or None"""
+    for name in names:
+        try:
+            loader(name)
+            return name
+        except ImportError:
+            pass
+    return None
+
+
+_active_backend = None
+
+
+def get_backend():
+    """
+    Get the active crypto backend, selecting it on first use
+
+    Returns:
+        CryptoBackend: The active backend
+    """
+    global _active_backend
+    if _active_backend is None:
+        _active_backend = _select_default_backend()
+    return _active_backend
+
+
+def set_backend(kdf_name=None, aes_name=None):
+    """
+    Switch the active crypto backend
+
+    Args:
+        kdf_name (str, optional): Key derivation implementation. Defaults to the current one.
+        aes_name (str, optional): AES provider. Defaults to the current one.
+
+    Returns:
+        CryptoBackend: The new active backend
+    """
+    global _active_backend
+    current = get_backend()
+    _active_backend = CryptoBackend(kdf_name or current.kdf_name, aes_name or current.aes_name)
+    return _active_backend
+
+
+# Implementation every other backend is checked against
+REFERENCE_BACKEND = "pycryptodome+pycryptodome"
+
+# Cases checked when a backend is selected: the game's password with a gzipped
+# payload, a password longer than an HMAC block with a partial AES block, and a
+# non-ASCII password with binary data
+_QUICK_CASES = (6, 36, 47)
+
+
+def _differential_corpus():
+    """
+    Build the fixed corpus of (password, iv, plaintext) cases used by verify_backend
+
+    Returns:
+        list: List of (password, iv, plaintext) tuples
+    """
+    import gzip
+    from .save_manager import DEFAULT_PASSWORD
+
+    passwords = [
+        DEFAULT_PASSWORD,
+        "",
+        "a",
+        "x" * 64,   # Exactly one HMAC block
+        "y" * 100,  # Longer than an HMAC block, gets hashed first
+        "café über",
+    ]
+    sample_json = b'{"teamName":{"__type":"string","value":"R.E.P.O."},"timePlayed":{"__type":"float","value":12.5}}'
+    plaintexts = [
+        b"",
+        b"{",
+        b"a" * 15,
+        b"b" * 16,
+        b"c" * 17,
+        sample_json,
+        gzip.compress(sample_json * 50, mtime=0),
+        bytes(range(256)) * 40,
+    ]
+
+    corpus = []
+    for index, password in enumerate(passwords):
+        for plain_index, plaintext in enumerate(plaintexts):
+            iv = hashlib.sha256(f"{index}:{plain_index}".encode()).digest()[:16]
+            corpus.append((password, iv, plaintext))
+    return corpus
+
+
+def verify_backend(backend=None, quick=False):
+    """
+    Check a backend against the reference pycryptodome implementation on a fixed corpus
+
+    Args:
+        backend (CryptoBackend, optional): Backend to check. Defaults to the active backend.
+        quick (bool, optional): Only check a few cases, as done when a backend is selected.
+            Defaults to False, checking the whole corpus.
+
+    Returns:
+        list: Descriptions of every mismatch, empty if the backend is byte-identical
+
+    Raises:
+        ImportError: If pycryptodome is not installed
+    """
+    backend = backend or get_backend()
+    reference = CryptoBackend(*REFERENCE_BACKEND.split("+"))
+    mismatches = []
+
+    corpus = list(enumerate(_differential_corpus()))
+    if quick:
+        corpus = [corpus[case_index] for case_index in _QUICK_CASES]
+    for case_index, (password, iv, plaintext) in corpus:
+        expected_key = reference.derive_key(password, iv)
+        key = backend.derive_key(password, iv)
+        if key != expected_key:
+            mismatches.append(f"case {case_index}: derived key differs")
+            continue
+
+        padded = pkcs7_pad(plaintext)
+        expected_cipher = reference.encrypt(expected_key, iv, padded)
+        cipher = backend.encrypt(key, iv, padded)
+        if cipher != expected_cipher:
+            mismatches.append(f"case {case_index}: ciphertext differs")
+            continue
+
+        if pkcs7_unpad(backend.decrypt(key, iv, expected_cipher)) != plaintext:
+            mismatches.append(f"case {case_index}: decrypted plaintext differs")
+
+    return mismatches
+
+
+def describe_backend():
+    """
+    Describe the active backend and the installed alternatives
+
+    Returns:
+        dict: Active backend name and available implementations
+    """
+    backend = get_backend()
+    return {
+        "active": backend.name,
+        "kdf": backend.kdf_name,
+        "aes": backend.aes_name,
+        "available": available_backends()
+    }
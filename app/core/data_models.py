@@ -248,87 +248,16 @@ class GameSave:
         Create a new game save from scratch
         
         Args:
-            team_name (str, optional): Team name. Defaults to "R.E.P.O. Team".
+            team_name (str, optional): Team name. Defaults to "R.E.P.O.".
             
         Returns:
             tuple: (game_save, raw_data)
         """
-        import datetime
-        
-        # Create basic save structure
-        raw_data = {
-            "dictionaryOfDictionaries": {
-                "__type": "System.Collections.Generic.Dictionary`2[[System.String, mscorlib, Version=4.0.0.0, Culture=neutral, PublicKeyToken=b77a5c561934e089],[System.Collections.Generic.Dictionary`2[[System.String, mscorlib, Version=4.0.0.0, Culture=neutral, PublicKeyToken=b77a5c561934e089],[System.Int32, mscorlib, Version=4.0.0.0, Culture=neutral, PublicKeyToken=b77a5c561934e089]], mscorlib, Version=4.0.0.0, Culture=neutral, PublicKeyToken=b77a5c561934e089]],mscorlib",
-                "value": {
-                    "runStats": {
-                        "level": 1,
-                        "currency": 0,
-                        "lives": 0,
-                        "chargingStationCharge": 0,
-                        "totalHaul": 0,
-                        "save level": 0
-                    },
-                    "playerHealth": {},
-                    "playerUpgradeHealth": {},
-                    "playerUpgradeStamina": {},
-                    "playerUpgradeExtraJump": {},
-                    "playerUpgradeLaunch": {},
-                    "playerUpgradeMapPlayerCount": {},
-                    "playerUpgradeSpeed": {},
-                    "playerUpgradeStrength": {},
-                    "playerUpgradeRange": {},
-                    "playerUpgradeThrow": {},
-                    "playerHasCrown": {},
-                    "itemsPurchased": {},
-                    "itemsPurchasedTotal": {},
-                    "itemsUpgradesPurchased": {},
-                    "itemBatteryUpgrades": {},
-                    "item": {},
-                    "itemStatBattery": {}
-                }
-            },
-            "playerNames": {
-                "__type": "System.Collections.Generic.Dictionary`2[[System.String, mscorlib, Version=4.0.0.0, Culture=neutral, PublicKeyToken=b77a5c561934e089],[System.String, mscorlib, Version=4.0.0.0, Culture=neutral, PublicKeyToken=b77a5c561934e089]],mscorlib",
-                "value": {}
-            },
-            "timePlayed": {
-                "__type": "float",
-                "value": 0.0
-            },
-            "dateAndTime": {
-                "__type": "string",
-                "value": datetime.datetime.now().strftime("%Y-%m-%d")
-            },
-            "teamName": {
-                "__type": "string",
-                "value": team_name
-            }
-        }
+        from . import json_engine
+        from .save_template import new_game_template
         
-        # Initialize standard item lists
-        common_items = [
-            "Item Cart Medium", "Item Cart Small", "Item Drone Battery", "Item Drone Feather",
-            "Item Drone Indestructible", "Item Drone Torque", "Item Drone Zero Gravity",
-            "Item Extraction Tracker", "Item Grenade Duct Taped", "Item Grenade Explosive",
-            "Item Grenade Human", "Item Grenade Shockwave", "Item Grenade Stun", "Item Gun Handgun",
-            "Item Gun Shotgun", "Item Gun Tranq", "Item Health Pack Large", "Item Health Pack Medium",
-            "Item Health Pack Small", "Item Melee Baseball Bat", "Item Melee Frying Pan",
-            "Item Melee Inflatable Hammer", "Item Melee Sledge Hammer", "Item Melee Sword",
-            "Item Mine Explosive", "Item Mine Shockwave", "Item Mine Stun", "Item Orb Zero Gravity",
-            "Item Power Crystal", "Item Rubber Duck", "Item Upgrade Map Player Count",
-            "Item Upgrade Player Energy", "Item Upgrade Player Extra Jump", "Item Upgrade Player Grab Range",
-            "Item Upgrade Player Grab Strength", "Item Upgrade Player Health", 
-            "Item Upgrade Player Sprint Speed", "Item Upgrade Player Tumble Launch", "Item Valuable Tracker"
-        ]
-        
-        # Initialize all item dictionaries with zeros
-        for item_name in common_items:
-            raw_data["dictionaryOfDictionaries"]["value"]["itemsPurchased"][item_name] = 0
-            raw_data["dictionaryOfDictionaries"]["value"]["itemsPurchasedTotal"][item_name] = 0
-            raw_data["dictionaryOfDictionaries"]["value"]["itemsUpgradesPurchased"][item_name] = 0
-            raw_data["dictionaryOfDictionaries"]["value"]["itemBatteryUpgrades"][item_name] = 0
-            raw_data["dictionaryOfDictionaries"]["value"]["item"][item_name] = 0
-            raw_data["dictionaryOfDictionaries"]["value"]["itemStatBattery"][item_name] = 0
+        # The skeleton is serialized once, parsing a copy is much cheaper than rebuilding it
+        raw_data = json_engine.loads(new_game_template().render_game(team_name))
         
         # Create GameSave instance
         game_save = cls(raw_data)
@@ -0,0 +1,322 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from . import json_engine
+
+
+# Default budget for decoded documents kept in memory
+DEFAULT_MAX_ENTRIES = 32
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Bytes hashed per read when computing a file's identity
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Rough multiplier for the memory a parsed JSON document takes compared to its bytes
+PARSED_OVERHEAD_FACTOR = 6
+
+
+class CachedDocument:
+    """
+    A decoded ES3 document held by the DocumentCache
+    """
+
+    def __init__(self, identity, plaintext):
+        """
+        Initialize the cached document
+
+        Args:
+            identity (tuple): File identity (size, mtime_ns, content_hash)
+            plaintext (bytes): Decrypted and decompressed JSON bytes
+        """
+        self.identity = identity
+        self.plaintext = plaintext
+        self._document = None
+        self.charged = 0  # Cost currently counted against the cache budget
+        self.key = None  # Cache key, set when the entry is stored
+
+    @property
+    def is_parsed(self):
+        """Whether the JSON document has already been parsed"""
+        return self._document is not None
+
+    @property
+    def document(self):
+        """
+        Shared parsed JSON document. Callers must treat it as read-only,
+        use DocumentCache.load_copy for a document that can be modified.
+        """
+        if self._document is None:
+            self._document = json_engine.loads(self.plaintext)
+        return self._document
+
+    @property
+    def cost(self):
+        """Approximate number of bytes this entry keeps alive"""
+        size = len(self.plaintext)
+        if self._document is not None:
+            size += size * PARSED_OVERHEAD_FACTOR
+        return size
+
+
+class DocumentCache:
+    """
+    Bounded LRU cache of decoded ES3 documents keyed by file identity.
+
+    An entry is only reused while the file's path, size, mtime and content hash
+    all still match, so a save modified on disk is decoded again automatically.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Initialize the document cache
+
+        Args:
+            max_entries (int, optional): Maximum number of cached documents. Defaults to 32.
+            max_bytes (int, optional): Approximate memory budget in bytes. Defaults to 64 MiB.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _cache_key(path, password):
+        """Build the lookup key for a path and password pair"""
+        password_digest = hashlib.sha1(password.encode('utf-8')).digest()
+        return (os.path.normcase(os.path.abspath(path)), password_digest)
+
+    @staticmethod
+    def file_identity(file_obj, stat_result=None):
+        """
+        Compute the identity of a file's current contents, reading it in chunks
+
+        Args:
+            file_obj (file): Binary file object positioned at the start of the file
+            stat_result (os.stat_result, optional): Stat result for the file. Fetched if not provided.
+
+        Returns:
+            tuple: (size, mtime_ns, content_hash)
+        """
+        if stat_result is None:
+            stat_result = os.fstat(file_obj.fileno())
+        hasher = hashlib.blake2b(digest_size=16)
+        for chunk in iter(lambda: file_obj.read(HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+        return (stat_result.st_size, stat_result.st_mtime_ns, hasher.digest())
+
+    def get(self, path, password, decoder):
+        """
+        Get the decoded document for a file, decoding it on a miss
+
+        Args:
+            path (str): Path to the ES3 file
+            password (str): Password used to decode the file
+            decoder (callable): Function taking a binary file object positioned at the
+                start of the file and returning the plaintext
+
+        Returns:
+            CachedDocument: The cached (or freshly decoded) document
+        """
+        key = self._cache_key(path, password)
+
+        with open(path, 'rb') as file_obj:
+            identity = self.file_identity(file_obj)
+            entry = self._lookup(key, identity)
+            if entry is not None:
+                return entry
+
+            # Decode outside the lock so other files can be served meanwhile
+            file_obj.seek(0)
+            entry = CachedDocument(identity, decoder(file_obj))
+
+        self._store(key, entry)
+        return entry
+
+    def get_for_bytes(self, path, password, file_bytes, stat_result, decoder):
+        """
+        Get the decoded document for file contents the caller has already read
+
+        Args:
+            path (str): Path the bytes were read from
+            password (str): Password used to decode the file
+            file_bytes (bytes): The file's raw contents
+            stat_result (os.stat_result): Stat result taken when the bytes were read
+            decoder (callable): Function taking the raw bytes and returning the plaintext
+
+        Returns:
+            CachedDocument: The cached (or freshly decoded) document
+        """
+        key = self._cache_key(path, password)
+        identity = self.bytes_identity(file_bytes, stat_result)
+        entry = self._lookup(key, identity)
+        if entry is not None:
+            return entry
+
+        entry = CachedDocument(identity, decoder(file_bytes))
+        self._store(key, entry)
+        return entry
+
+    def put(self, path, password, file_bytes, stat_result, plaintext):
+        """
+        Record the plaintext of a file that was just written
+
+        Args:
+            path (str): Path of the written file
+            password (str): Password the file was encrypted with
+            file_bytes (bytes): The raw contents written
+            stat_result (os.stat_result): Stat result of the file after writing
+            plaintext (bytes): The payload the file decodes to
+        """
+        entry = CachedDocument(self.bytes_identity(file_bytes, stat_result), plaintext)
+        self._store(self._cache_key(path, password), entry)
+
+    @staticmethod
+    def bytes_identity(file_bytes, stat_result):
+        """
+        Compute the identity of file contents already held in memory
+
+        Args:
+            file_bytes (bytes): The file's contents
+            stat_result (os.stat_result): Stat result for the file
+
+        Returns:
+            tuple: (size, mtime_ns, content_hash)
+        """
+        content_hash = hashlib.blake2b(file_bytes, digest_size=16).digest()
+        return (stat_result.st_size, stat_result.st_mtime_ns, content_hash)
+
+    def _lookup(self, key, identity):
+        """Return the entry for key if it still matches identity, counting the hit or miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.identity == identity:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+
+                # File changed on disk since it was cached
+                self._remove(key)
+                self.invalidations += 1
+            self.misses += 1
+            return None
+
+    def load_copy(self, path, password, decoder):
+        """
+        Get a private, modifiable copy of the parsed document for a file
+
+        Args:
+            path (str): Path to the ES3 file
+            password (str): Password used to decode the file
+            decoder (callable): Function taking a binary file object and returning the plaintext
+
+        Returns:
+            dict: Freshly parsed JSON document
+        """
+        entry = self.get(path, password, decoder)
+        return json_engine.loads(entry.plaintext)
+
+    def get_document(self, path, password, decoder):
+        """
+        Get the shared parsed document for a file. The result must not be modified.
+
+        Args:
+            path (str): Path to the ES3 file
+            password (str): Password used to decode the file
+            decoder (callable): Function taking a binary file object and returning the plaintext
+
+        Returns:
+            dict: Shared parsed JSON document
+        """
+        return self.parse(self.get(path, password, decoder))
+
+    def parse(self, entry):
+        """
+        Get the shared parsed document of an entry, charging the parse against the budget
+
+        Args:
+            entry (CachedDocument): Entry returned by get or get_for_bytes
+
+        Returns:
+            dict: Shared parsed JSON document, which must not be modified
+        """
+        if entry.is_parsed:
+            return entry.document
+
+        document = entry.document
+
+        # Parsing grows the entry, so charge the difference if it is still cached
+        with self._lock:
+            if self._entries.get(entry.key) is entry:
+                self._total_bytes += entry.cost - entry.charged
+                entry.charged = entry.cost
+                self._enforce_budget()
+        return document
+
+    def invalidate(self, path=None):
+        """
+        Drop cached documents
+
+        Args:
+            path (str, optional): Only drop entries for this path. Drops everything if None.
+        """
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._total_bytes = 0
+                return
+
+            norm_path = os.path.normcase(os.path.abspath(path))
+            for key in [k for k in self._entries if k[0] == norm_path]:
+                self._remove(key)
+
+    def stats(self):
+        """
+        Get cache statistics
+
+        Returns:
+            dict: Hit/miss counters and current size
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes
+            }
+
+    def _store(self, key, entry):
+        """Insert an entry and evict old ones to stay within budget"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            entry.key = key
+            entry.charged = entry.cost
+            self._total_bytes += entry.charged
+            self._enforce_budget()
+
+    def _remove(self, key):
+        """Remove an entry and update the byte total"""
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry.charged
+
+    def _enforce_budget(self):
+        """Evict least recently used entries until within budget"""
+        # Always keep the most recent entry, even if it alone exceeds the budget
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
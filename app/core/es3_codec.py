@@ -0,0 +1,731 @@
+"""
+Streaming encoder and decoder for ES3 save files.
+
+An ES3 file is a 16-byte IV followed by AES-128-CBC ciphertext of the
+(optionally gzip-compressed) JSON payload. The streaming functions process
+data in fixed-size chunks, so memory use stays bounded no matter how large the
+save is. The zero-copy functions instead minimise allocations for callers that
+need the whole payload in memory anyway.
+
+Saves can also be plain or gzip-compressed JSON without encryption. The
+container functions at the end of the module detect which of the four formats
+a file uses from its header and length, and write a payload back in the same
+format.
+"""
+
+import mmap
+import os
+import zlib
+
+from . import crypto_backend
+from .crypto_backend import BLOCK_SIZE, pkcs7_pad, pkcs7_padding_length
+
+
+IV_SIZE = 16
+GZIP_MAGIC = b'\x1f\x8b'
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+# Size of the chunks read, encrypted and decompressed at a time
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Compression level used by gzip.compress, which the original encoder used
+DEFAULT_COMPRESS_LEVEL = 9
+
+
+def _default_derive_key(password, init_vector):
+    """Derive a key with the active crypto backend and no caching"""
+    return crypto_backend.get_backend().derive_key(password, init_vector)
+
+
+def _read_exact(file_obj, size):
+    """Read up to size bytes, retrying on short reads"""
+    parts = []
+    remaining = size
+    while remaining > 0:
+        part = file_obj.read(remaining)
+        if not part:
+            break
+        parts.append(part)
+        remaining -= len(part)
+    return b"".join(parts)
+
+
+def iter_chunks(data, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Split a bytes-like object into chunks without copying it
+
+    Args:
+        data (bytes-like): The data to split
+        chunk_size (int, optional): Chunk size. Defaults to 64 KiB.
+
+    Yields:
+        memoryview: Successive slices of the data
+    """
+    view = memoryview(data)
+    for offset in range(0, len(view), chunk_size):
+        yield view[offset:offset + chunk_size]
+
+
+def _gzip(data, compress_level=DEFAULT_COMPRESS_LEVEL):
+    """Gzip a complete buffer (zlib.compress only takes wbits from Python 3.11)"""
+    deflater = zlib.compressobj(compress_level, zlib.DEFLATED, GZIP_WBITS)
+    return deflater.compress(data) + deflater.flush()
+
+
+class _GzipInflater:
+    """
+    Incremental gzip decompressor that handles multi-member streams
+    and caps the size of each output piece
+    """
+
+    def __init__(self, max_output=DEFAULT_CHUNK_SIZE):
+        self.max_output = max_output
+        self._decompressor = zlib.decompressobj(GZIP_WBITS)
+
+    def feed(self, data):
+        """Decompress data, yielding output pieces of at most max_output bytes"""
+        while data:
+            if self._decompressor.eof:
+                # Another gzip member follows the previous one
+                self._decompressor = zlib.decompressobj(GZIP_WBITS)
+
+            output = self._decompressor.decompress(data, self.max_output)
+            if output:
+                yield output
+
+            if self._decompressor.eof:
+                data = self._decompressor.unused_data
+            else:
+                data = self._decompressor.unconsumed_tail
+
+    def finish(self):
+        """Check the stream ended cleanly and yield any remaining output"""
+        if not self._decompressor.eof:
+            raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+        remaining = self._decompressor.flush()
+        if remaining:
+            yield remaining
+
+
+def iter_decode(file_obj, password, derive_key=None, chunk_size=DEFAULT_CHUNK_SIZE, decompress=True):
+    """
+    Decode an ES3 stream incrementally
+
+    Args:
+        file_obj (file): Binary file object positioned at the start of the ES3 data
+        password (str): The decryption password
+        derive_key (callable, optional): Function (password, iv) -> key. Defaults to the active backend.
+        chunk_size (int, optional): Bytes read per step, rounded to whole AES blocks. Defaults to 64 KiB.
+        decompress (bool, optional): Whether to gunzip compressed payloads. Defaults to True.
+
+    Yields:
+        bytes: Successive pieces of the decrypted (and possibly decompressed) payload
+
+    Raises:
+        ValueError: If the file is truncated or the padding is incorrect
+    """
+    derive_key = derive_key or _default_derive_key
+    chunk_size = max(BLOCK_SIZE, chunk_size - chunk_size % BLOCK_SIZE)
+
+    init_vector = _read_exact(file_obj, IV_SIZE)
+    if len(init_vector) < IV_SIZE:
+        raise ValueError("File is too short to be an ES3 save")
+
+    key = derive_key(password, init_vector)
+    decrypt = crypto_backend.get_backend().cbc_decryptor(key, init_vector)
+
+    inflater = None
+    mode_decided = False
+    held_back = b""  # Last decrypted block, which carries the padding
+
+    def emit(plaintext):
+        # The first plaintext bytes decide whether the payload is gzip compressed
+        nonlocal inflater, mode_decided
+        if not mode_decided and plaintext:
+            mode_decided = True
+            if decompress and plaintext[:2] == GZIP_MAGIC:
+                inflater = _GzipInflater(chunk_size)
+        if inflater is not None:
+            yield from inflater.feed(plaintext)
+        elif plaintext:
+            yield plaintext
+
+    remainder = b""
+    while True:
+        chunk = file_obj.read(chunk_size)
+        if not chunk:
+            break
+        if remainder:
+            chunk = remainder + chunk
+        usable = len(chunk) - len(chunk) % BLOCK_SIZE
+        remainder = chunk[usable:]
+        if not usable:
+            continue
+
+        plaintext = held_back + decrypt(chunk[:usable])
+        held_back = plaintext[-BLOCK_SIZE:]
+        yield from emit(plaintext[:-BLOCK_SIZE])
+
+    if remainder:
+        raise ValueError("Ciphertext length must be a multiple of 16 bytes")
+    if not held_back:
+        raise ValueError("Input data is not padded")
+
+    # Strip the PKCS7 padding from the final block
+    padding_length = pkcs7_padding_length(held_back, BLOCK_SIZE)
+    yield from emit(held_back[:BLOCK_SIZE - padding_length])
+
+    if inflater is not None:
+        yield from inflater.finish()
+
+
+def decode_bytes(file_obj, password, derive_key=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Decode an ES3 stream into a single bytes object
+
+    Args:
+        file_obj (file): Binary file object positioned at the start of the ES3 data
+        password (str): The decryption password
+        derive_key (callable, optional): Function (password, iv) -> key. Defaults to the active backend.
+        chunk_size (int, optional): Bytes processed per step. Defaults to 64 KiB.
+
+    Returns:
+        bytes: The decrypted (and possibly decompressed) payload
+    """
+    return b"".join(iter_decode(file_obj, password, derive_key, chunk_size))
+
+
+def decode_to(file_obj, output_obj, password, derive_key=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Decode an ES3 stream into another file object with bounded memory
+
+    Args:
+        file_obj (file): Binary file object positioned at the start of the ES3 data
+        output_obj (file): Binary file object receiving the payload
+        password (str): The decryption password
+        derive_key (callable, optional): Function (password, iv) -> key. Defaults to the active backend.
+        chunk_size (int, optional): Bytes processed per step. Defaults to 64 KiB.
+
+    Returns:
+        int: Number of payload bytes written
+    """
+    written = 0
+    for piece in iter_decode(file_obj, password, derive_key, chunk_size):
+        output_obj.write(piece)
+        written += len(piece)
+    return written
+
+
+def iter_encode(chunks, password, derive_key=None, compress=False,
+                compress_level=DEFAULT_COMPRESS_LEVEL, init_vector=None):
+    """
+    Encode a payload into the ES3 format incrementally
+
+    Args:
+        chunks (iterable): Bytes-like pieces of the payload
+        password (str): The encryption password
+        derive_key (callable, optional): Function (password, iv) -> key. Defaults to the active backend.
+        compress (bool, optional): Whether to gzip the payload before encryption. Defaults to False.
+        compress_level (int, optional): Gzip compression level. Defaults to 9.
+        init_vector (bytes, optional): IV to use. Defaults to 16 random bytes.
+
+    Yields:
+        bytes: The IV, followed by successive pieces of ciphertext
+    """
+    derive_key = derive_key or _default_derive_key
+    init_vector = init_vector or os.urandom(IV_SIZE)
+
+    key = derive_key(password, init_vector)
+    encrypt = crypto_backend.get_backend().cbc_encryptor(key, init_vector)
+    deflater = zlib.compressobj(compress_level, zlib.DEFLATED, GZIP_WBITS) if compress else None
+
+    yield init_vector
+
+    remainder = b""
+    for chunk in chunks:
+        if deflater is not None:
+            chunk = deflater.compress(chunk)
+        if not len(chunk):
+            continue
+
+        data = remainder + chunk
+        usable = len(data) - len(data) % BLOCK_SIZE
+        remainder = data[usable:]
+        if usable:
+            yield encrypt(data[:usable])
+
+    if deflater is not None:
+        remainder += deflater.flush()
+
+    # Encrypt the whole blocks left over, then the padded final block
+    usable = len(remainder) - len(remainder) % BLOCK_SIZE
+    if usable:
+        yield encrypt(remainder[:usable])
+    yield encrypt(pkcs7_pad(remainder[usable:], BLOCK_SIZE))
+
+
+def encode_bytes(data, password, derive_key=None, compress=False,
+                 compress_level=DEFAULT_COMPRESS_LEVEL, init_vector=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Encode a payload into ES3 bytes
+
+    Args:
+        data (bytes-like): The payload
+        password (str): The encryption password
+        derive_key (callable, optional): Function (password, iv) -> key. Defaults to the active backend.
+        compress (bool, optional): Whether to gzip the payload before encryption. Defaults to False.
+        compress_level (int, optional): Gzip compression level. Defaults to 9.
+        init_vector (bytes, optional): IV to use. Defaults to 16 random bytes.
+        chunk_size (int, optional): Bytes processed per step. Defaults to 64 KiB.
+
+    Returns:
+        bytes: IV followed by the ciphertext
+    """
+    return b"".join(iter_encode(iter_chunks(data, chunk_size), password, derive_key,
+                                compress, compress_level, init_vector))
+
+
+def encode_to(chunks, output_obj, password, derive_key=None, compress=False,
+              compress_level=DEFAULT_COMPRESS_LEVEL, init_vector=None):
+    """
+    Encode a payload into a file object with bounded memory
+
+    Args:
+        chunks (iterable): Bytes-like pieces of the payload
+        output_obj (file): Binary file object receiving the ES3 data
+        password (str): The encryption password
+        derive_key (callable, optional): Function (password, iv) -> key. Defaults to the active backend.
+        compress (bool, optional): Whether to gzip the payload before encryption. Defaults to False.
+        compress_level (int, optional): Gzip compression level. Defaults to 9.
+        init_vector (bytes, optional): IV to use. Defaults to 16 random bytes.
+
+    Returns:
+        int: Number of bytes written
+    """
+    written = 0
+    for piece in iter_encode(chunks, password, derive_key, compress, compress_level, init_vector):
+        output_obj.write(piece)
+        written += len(piece)
+    return written
+
+
+# Zero-copy paths
+#
+# These trade the bounded memory of the streaming functions for the fewest
+# possible copies: the file is memory-mapped, decrypted straight into one
+# preallocated buffer and written back with a single vectored write.
+
+def decode_mapped(file_obj, password, derive_key=None):
+    """
+    Decode an ES3 file through mmap into a single preallocated buffer
+
+    Args:
+        file_obj (file): Binary file object opened on the ES3 file
+        password (str): The decryption password
+        derive_key (callable, optional): Function (password, iv) -> key. Defaults to the active backend.
+
+    Returns:
+        bytearray: The decrypted payload, or bytes if it had to be decompressed.
+            Both can be passed to json.loads directly.
+
+    Raises:
+        ValueError: If the file is truncated or the padding is incorrect
+    """
+    if os.fstat(file_obj.fileno()).st_size < IV_SIZE + BLOCK_SIZE:
+        raise ValueError("File is too short to be an ES3 save")
+
+    with mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return decode_buffer(mapped, password, derive_key)
+
+
+def decode_buffer(buffer, password, derive_key=None):
+    """
+    Decode ES3 data already in memory into a single preallocated buffer
+
+    Args:
+        buffer (bytes-like): The raw ES3 data (IV followed by ciphertext)
+        password (str): The decryption password
+        derive_key (callable, optional): Function (password, iv) -> key. Defaults to the active backend.
+
+    Returns:
+        bytearray: The decrypted payload, or bytes if it had to be decompressed.
+            Both can be passed to json.loads directly.
+
+    Raises:
+        ValueError: If the data is truncated or the padding is incorrect
+    """
+    derive_key = derive_key or _default_derive_key
+
+    with memoryview(buffer) as view:
+        if len(view) < IV_SIZE + BLOCK_SIZE:
+            raise ValueError("File is too short to be an ES3 save")
+        if (len(view) - IV_SIZE) % BLOCK_SIZE:
+            raise ValueError("Ciphertext length must be a multiple of 16 bytes")
+
+        plaintext = bytearray(len(view) - IV_SIZE)
+        init_vector = bytes(view[:IV_SIZE])
+        key = derive_key(password, init_vector)
+        decrypt_into = crypto_backend.get_backend().cbc_decryptor_into(key, init_vector)
+        with view[IV_SIZE:] as cipher_text:
+            decrypt_into(cipher_text, plaintext)
+
+    # Truncating the end of a bytearray resizes it in place
+    padding_length = pkcs7_padding_length(plaintext[-BLOCK_SIZE:], BLOCK_SIZE)
+    del plaintext[len(plaintext) - padding_length:]
+
+    if plaintext[:2] == GZIP_MAGIC:
+        inflater = _GzipInflater(max_output=0)
+        return b"".join(list(inflater.feed(plaintext)) + list(inflater.finish()))
+
+    return plaintext
+
+
+def encode_buffers(data, password, derive_key=None, compress=False,
+                   compress_level=DEFAULT_COMPRESS_LEVEL, init_vector=None):
+    """
+    Encrypt a payload into a preallocated buffer without copying the input
+
+    Args:
+        data (bytes-like): The payload
+        password (str): The encryption password
+        derive_key (callable, optional): Function (password, iv) -> key. Defaults to the active backend.
+        compress (bool, optional): Whether to gzip the payload before encryption. Defaults to False.
+        compress_level (int, optional): Gzip compression level. Defaults to 9.
+        init_vector (bytes, optional): IV to use. Defaults to 16 random bytes.
+
+    Returns:
+        tuple: (init_vector, ciphertext bytearray), ready for write_vectored
+    """
+    derive_key = derive_key or _default_derive_key
+    init_vector = init_vector or os.urandom(IV_SIZE)
+
+    if compress:
+        data = _gzip(data, compress_level)
+
+    key = derive_key(password, init_vector)
+    encrypt_into = crypto_backend.get_backend().cbc_encryptor_into(key, init_vector)
+
+    # Whole blocks are encrypted straight from the input, only the last one is padded
+    with memoryview(data) as source:
+        whole = len(source) - len(source) % BLOCK_SIZE
+        cipher_text = bytearray(whole + BLOCK_SIZE)
+        with memoryview(cipher_text) as output:
+            if whole:
+                encrypt_into(source[:whole], output[:whole])
+            encrypt_into(pkcs7_pad(source[whole:], BLOCK_SIZE), output[whole:])
+
+    return init_vector, cipher_text
+
+
+def write_vectored(file_obj, buffers):
+    """
+    Write several buffers with as few system calls as possible
+
+    Uses os.writev where available, falling back to one write per buffer.
+
+    Args:
+        file_obj (file): Binary file object opened for writing
+        buffers (list): Bytes-like objects to write in order
+
+    Returns:
+        int: Number of bytes written
+    """
+    total = sum(len(buffer) for buffer in buffers)
+    if not hasattr(os, "writev"):
+        for buffer in buffers:
+            file_obj.write(buffer)
+        return total
+
+    file_obj.flush()
+    views = [memoryview(buffer).cast("B") for buffer in buffers]
+    written = 0
+    while views:
+        count = os.writev(file_obj.fileno(), views)
+        written += count
+
+        # Drop fully written buffers and trim a partially written one
+        while views and count >= len(views[0]):
+            count -= len(views[0])
+            views.pop(0)
+        if views and count:
+            views[0] = views[0][count:]
+    return written
+
+
+# Container formats
+
+FORMAT_JSON = "json"
+FORMAT_GZIP = "gzip"
+FORMAT_ENCRYPTED = "encrypted"
+FORMAT_ENCRYPTED_GZIP = "encrypted+gzip"
+CONTAINER_FORMATS = (FORMAT_JSON, FORMAT_GZIP, FORMAT_ENCRYPTED, FORMAT_ENCRYPTED_GZIP)
+
+# Bytes needed to tell the formats apart: the IV and the first ciphertext block
+SNIFF_SIZE = IV_SIZE + BLOCK_SIZE
+
+UTF8_BOM = b'\xef\xbb\xbf'
+_JSON_WHITESPACE = b" \t\r\n"
+
+
+def is_encrypted(container):
+    """Whether a container format is encrypted"""
+    return container in (FORMAT_ENCRYPTED, FORMAT_ENCRYPTED_GZIP)
+
+
+def is_compressed(container):
+    """Whether a container format is gzip compressed"""
+    return container in (FORMAT_GZIP, FORMAT_ENCRYPTED_GZIP)
+
+
+def container_for(encrypted, compressed):
+    """
+    Get the container format with the given layers
+
+    Args:
+        encrypted (bool): Whether the payload is encrypted
+        compressed (bool): Whether the payload is gzip compressed
+
+    Returns:
+        str: One of CONTAINER_FORMATS
+    """
+    if encrypted:
+        return FORMAT_ENCRYPTED_GZIP if compressed else FORMAT_ENCRYPTED
+    return FORMAT_GZIP if compressed else FORMAT_JSON
+
+
+def _looks_like_json(head):
+    """Whether the start of a file is JSON text rather than random IV bytes"""
+    if head[:3] == UTF8_BOM:
+        head = head[3:]
+    stripped = head.lstrip(_JSON_WHITESPACE)
+    if stripped[:1] not in (b"{", b"["):
+        return False
+    # Random bytes are almost never printable text, JSON always is
+    return all(byte >= 0x20 or byte in _JSON_WHITESPACE for byte in stripped)
+
+
+def _looks_like_gzip(head):
+    """Whether the start of a file is a gzip header (magic, deflate method, no reserved flags)"""
+    return head[:2] == GZIP_MAGIC and head[2:3] == b'\x08' and len(head) > 3 and not head[3] & 0xe0
+
+
+def _whole_blocks(total_size):
+    """Whether a file of this size can be an IV followed by whole AES blocks"""
+    return total_size >= IV_SIZE + BLOCK_SIZE and not (total_size - IV_SIZE) % BLOCK_SIZE
+
+
+def _sniff_encrypted(head, password, derive_key=None):
+    """Decrypt the first block of an encrypted save to see whether its payload is gzip compressed"""
+    derive_key = derive_key or _default_derive_key
+    init_vector = bytes(head[:IV_SIZE])
+    first_block = crypto_backend.get_backend().decrypt(derive_key(password, init_vector), init_vector,
+                                                       bytes(head[IV_SIZE:SNIFF_SIZE]))
+    return FORMAT_ENCRYPTED_GZIP if first_block[:2] == GZIP_MAGIC else FORMAT_ENCRYPTED
+
+
+def sniff_container(head, total_size, password=None, derive_key=None):
+    """
+    Detect the container format of a save from its first bytes and its length
+
+    Plain and gzip JSON are recognised from their headers. Anything else must be
+    an IV followed by whole AES blocks; with a password the first block is
+    decrypted to see whether the payload inside is gzip compressed. An IV can
+    start like a gzip header by chance, so decode_container and decode_file
+    decrypt a file reported as gzip that does not decompress but is whole blocks.
+
+    Args:
+        head (bytes-like): The first SNIFF_SIZE (or more) bytes of the file
+        total_size (int): Size of the whole file
+        password (str, optional): Password to look inside encrypted files. Defaults to None.
+        derive_key (callable, optional): Function (password, iv) -> key. Defaults to the active backend.
+
+    Returns:
+        str: One of CONTAINER_FORMATS. Without a password encrypted files are reported as FORMAT_ENCRYPTED.
+
+    Raises:
+        ValueError: If the data is not in any known format
+    """
+    head = bytes(head[:SNIFF_SIZE * 4])
+    if _looks_like_json(head):
+        return FORMAT_JSON
+    if _looks_like_gzip(head):
+        return FORMAT_GZIP
+    if not _whole_blocks(total_size):
+        raise ValueError("Unrecognized save format: not JSON, gzip or whole AES blocks")
+
+    if password is None:
+        return FORMAT_ENCRYPTED
+    return _sniff_encrypted(head, password, derive_key)
+
+
+def read_probe(file_obj):
+    """
+    Read the parts of a file needed to sniff its format and test passwords
+
+    Args:
+        file_obj (file): Binary file object positioned at the start of the file
+
+    Returns:
+        tuple: (head, tail, total size), head being the first SNIFF_SIZE * 4 bytes
+            and tail the last two blocks
+    """
+    start = file_obj.tell()
+    total_size = os.fstat(file_obj.fileno()).st_size - start
+    head = _read_exact(file_obj, SNIFF_SIZE * 4)
+    tail = head[-2 * BLOCK_SIZE:]
+    if total_size > len(head):
+        file_obj.seek(start + total_size - 2 * BLOCK_SIZE)
+        tail = _read_exact(file_obj, 2 * BLOCK_SIZE)
+    return head, tail, total_size
+
+
+def probe_password(head, tail, password, derive_key=None):
+    """
+    Test whether a password opens an encrypted save without decrypting all of it
+
+    In CBC the last block decrypts on its own with the block before it as IV, so
+    only two blocks are decrypted: the last one must end in valid PKCS7 padding
+    and the first one must start a JSON document or a gzip stream. A wrong
+    password passes both by chance about once in twenty thousand tries.
+
+    Args:
+        head (bytes-like): At least the IV and the first block of the file
+        tail (bytes-like): The last two blocks of the file (the IV and the block for a one-block file)
+        password (str): Password to test
+        derive_key (callable, optional): Function (password, iv) -> key. Defaults to the active backend.
+
+    Returns:
+        bool: Whether the password is very likely right
+    """
+    derive_key = derive_key or _default_derive_key
+    backend = crypto_backend.get_backend()
+    init_vector = bytes(head[:IV_SIZE])
+    key = derive_key(password, init_vector)
+
+    last_block = backend.decrypt(key, bytes(tail[:BLOCK_SIZE]), bytes(tail[BLOCK_SIZE:2 * BLOCK_SIZE]))
+    try:
+        pkcs7_padding_length(last_block, BLOCK_SIZE)
+    except ValueError:
+        return False
+
+    first_block = backend.decrypt(key, init_vector, bytes(head[IV_SIZE:SNIFF_SIZE]))
+    if first_block[:2] == GZIP_MAGIC:
+        return True
+    if first_block[:3] == UTF8_BOM:
+        first_block = first_block[3:]
+    return first_block.lstrip(_JSON_WHITESPACE)[:1] in (b"{", b"[")
+
+
+def _gunzip(data):
+    """Decompress a complete, possibly multi-member, gzip buffer"""
+    inflater = _GzipInflater(max_output=0)
+    return b"".join(list(inflater.feed(data)) + list(inflater.finish()))
+
+
+def decode_container(buffer, password, derive_key=None):
+    """
+    Decode a save in any container format that is already in memory
+
+    Args:
+        buffer (bytes-like): The raw file contents
+        password (str): The decryption password, only used for encrypted files
+        derive_key (callable, optional): Function (password, iv) -> key. Defaults to the active backend.
+
+    Returns:
+        tuple: (payload, container format)
+    """
+    container = sniff_container(buffer[:SNIFF_SIZE * 4], len(buffer))
+    if container == FORMAT_JSON:
+        return buffer, container
+    gzip_error = None
+    if container == FORMAT_GZIP:
+        try:
+            return _gunzip(buffer), container
+        except (zlib.error, EOFError) as e:
+            # The IV of an encrypted save may start like a gzip header
+            if not _whole_blocks(len(buffer)):
+                raise
+            gzip_error = e
+
+    try:
+        plaintext = decode_buffer(buffer, password, derive_key)
+    except ValueError:
+        if gzip_error is None:
+            raise
+        raise gzip_error from None
+    # decode_buffer only returns bytes when it had to decompress
+    return plaintext, FORMAT_ENCRYPTED_GZIP if isinstance(plaintext, bytes) else FORMAT_ENCRYPTED
+
+
+def decode_file(file_obj, password, derive_key=None, mapped=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Decode a save file in any container format
+
+    Unencrypted files are never run through the decryptor.
+
+    Args:
+        file_obj (file): Binary file object positioned at the start of the file
+        password (str): The decryption password, only used for encrypted files
+        derive_key (callable, optional): Function (password, iv) -> key. Defaults to the active backend.
+        mapped (bool, optional): Decode encrypted files with decode_mapped instead of streaming. Defaults to False.
+        chunk_size (int, optional): Bytes processed per step when streaming. Defaults to 64 KiB.
+
+    Returns:
+        tuple: (payload, container format)
+    """
+    derive_key = derive_key or _default_derive_key
+    start = file_obj.tell()
+    total_size = os.fstat(file_obj.fileno()).st_size - start
+    head = _read_exact(file_obj, SNIFF_SIZE * 4)
+    container = sniff_container(head, total_size, password, derive_key)
+
+    if container == FORMAT_JSON:
+        return head + file_obj.read(), container
+    gzip_error = None
+    if container == FORMAT_GZIP:
+        inflater = _GzipInflater(chunk_size)
+        try:
+            pieces = list(inflater.feed(head))
+            for chunk in iter(lambda: file_obj.read(chunk_size), b""):
+                pieces.extend(inflater.feed(chunk))
+            pieces.extend(inflater.finish())
+            return b"".join(pieces), container
+        except (zlib.error, EOFError) as e:
+            # The IV of an encrypted save may start like a gzip header
+            if not _whole_blocks(total_size):
+                raise
+            gzip_error = e
+            container = _sniff_encrypted(head, password, derive_key)
+
+    file_obj.seek(start)
+    try:
+        if mapped:
+            return decode_mapped(file_obj, password, derive_key), container
+        return b"".join(iter_decode(file_obj, password, derive_key, chunk_size)), container
+    except ValueError:
+        if gzip_error is None:
+            raise
+        raise gzip_error from None
+
+
+def encode_container(data, container, password, derive_key=None, compress_level=DEFAULT_COMPRESS_LEVEL):
+    """
+    Encode a payload into the given container format in memory
+
+    Args:
+        data (bytes-like): The JSON payload
+        container (str): One of CONTAINER_FORMATS
+        password (str): The encryption password, only used for encrypted formats
+        derive_key (callable, optional): Function (password, iv) -> key. Defaults to the active backend.
+        compress_level (int, optional): Gzip compression level. Defaults to 9.
+
+    Returns:
+        list: Bytes-like buffers to write in order
+    """
+    if container not in CONTAINER_FORMATS:
+        raise ValueError(f"Unknown container format: {container}")
+    if is_encrypted(container):
+        return list(encode_buffers(data, password, derive_key, is_compressed(container), compress_level))
+    if is_compressed(container):
+        return [_gzip(data, compress_level)]
+    return [data]
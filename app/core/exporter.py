@@ -0,0 +1,176 @@
+"""
+Export many saves as flat records for analysis tools.
+
+Each save becomes three kinds of rows:
+
+    save    one per save: team name, date, time played and run stats
+    player  one per player: name, health and upgrade levels
+    item    one per item: purchased, purchased in total and upgrade purchases
+
+The batch workers decode and flatten the saves, so only the small rows travel
+back, and the rows are written as each save finishes. Memory use stays bounded
+however many saves are exported and no intermediate JSON files are written.
+
+NDJSON output is a single stream with a "kind" field on every row. CSV output
+is one file per kind (saves.csv, players.csv, items.csv) with a fixed header.
+"""
+
+import csv
+import os
+
+from . import json_engine
+from .batch import BatchResult
+from .data_models import GameSave, PlayerData
+from .save_index import _wrapped_value
+
+
+KIND_SAVE = "save"
+KIND_PLAYER = "player"
+KIND_ITEM = "item"
+KINDS = (KIND_SAVE, KIND_PLAYER, KIND_ITEM)
+
+FORMAT_NDJSON = "ndjson"
+FORMAT_CSV = "csv"
+EXPORT_FORMATS = (FORMAT_NDJSON, FORMAT_CSV)
+
+# Run stats every save has, in the order of GameSave
+RUN_STAT_KEYS = tuple(GameSave().run_stats)
+UPGRADE_KEYS = tuple(PlayerData("").upgrades)
+
+CSV_COLUMNS = {
+    KIND_SAVE: ["save", "team_name", "date_and_time", "time_played", "players"] + list(RUN_STAT_KEYS),
+    KIND_PLAYER: ["save", "player_id", "name", "health"] + [f"upgrade_{key}" for key in UPGRADE_KEYS],
+    KIND_ITEM: ["save", "item", "purchased", "purchased_total", "upgrades_purchased"],
+}
+CSV_FILE_NAMES = {KIND_SAVE: "saves.csv", KIND_PLAYER: "players.csv", KIND_ITEM: "items.csv"}
+
+
+def flatten_save(path, data):
+    """
+    Flatten a save document into rows
+
+    Args:
+        path (str): Path of the save, stored in every row
+        data (dict): Save document
+
+    Returns:
+        list: (kind, row dict) tuples, the save row first
+    """
+    game_save = GameSave(data)
+
+    save_row = {
+        "save": path,
+        "team_name": game_save.team_name,
+        "date_and_time": _wrapped_value(data, "dateAndTime"),
+        "time_played": _wrapped_value(data, "timePlayed"),
+        "players": len(game_save.players),
+    }
+    save_row.update(game_save.run_stats)
+    rows = [(KIND_SAVE, save_row)]
+
+    for player_id, player in sorted(game_save.players.items()):
+        player_row = {"save": path, "player_id": player_id, "name": player.name, "health": player.health}
+        for key, level in player.upgrades.items():
+            player_row[f"upgrade_{key}"] = level
+        rows.append((KIND_PLAYER, player_row))
+
+    purchased = game_save.items["purchased"]
+    purchased_total = game_save.items["purchasedTotal"]
+    upgrades_purchased = game_save.items["upgradesPurchased"]
+    for item in sorted(set(purchased) | set(purchased_total) | set(upgrades_purchased)):
+        rows.append((KIND_ITEM, {
+            "save": path,
+            "item": item,
+            "purchased": purchased.get(item),
+            "purchased_total": purchased_total.get(item),
+            "upgrades_purchased": upgrades_purchased.get(item),
+        }))
+    return rows
+
+
+def _export_file(save_manager, path, password):
+    """
+    Decode and flatten one save
+
+    Returns:
+        BatchResult: The save's rows
+    """
+    try:
+        with open(path, 'rb') as file_obj:
+            payload = save_manager._decode_es3_file(file_obj, password, path)
+        rows = flatten_save(path, json_engine.loads(payload))
+        return BatchResult(path, rows, container=save_manager.get_container_format(path))
+    except Exception as e:
+        return BatchResult(path, error=f"{type(e).__name__}: {str(e)}")
+
+
+class NdjsonExporter:
+    """
+    Writes rows as newline-delimited JSON to a binary stream
+    """
+
+    def __init__(self, file_obj, close_file=False):
+        """
+        Initialize the exporter
+
+        Args:
+            file_obj (file): Binary output stream
+            close_file (bool, optional): Close the stream in close(). Defaults to False.
+        """
+        self.file_obj = file_obj
+        self.close_file = close_file
+        self.rows = 0
+
+    def write(self, kind, row):
+        """Write one row"""
+        record = {"kind": kind}
+        record.update(row)
+        self.file_obj.write(json_engine.dumps(record) + b"\n")
+        self.rows += 1
+
+    def close(self):
+        """Flush the output"""
+        self.file_obj.flush()
+        if self.close_file:
+            self.file_obj.close()
+
+
+class CsvExporter:
+    """
+    Writes rows to one CSV file per kind in a folder, each file created on its first row
+    """
+
+    def __init__(self, directory):
+        """
+        Initialize the exporter
+
+        Args:
+            directory (str): Output folder, created if needed
+        """
+        self.directory = directory
+        self.rows = 0
+        self._files = {}
+        self._writers = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _writer(self, kind):
+        writer = self._writers.get(kind)
+        if writer is None:
+            file_obj = open(os.path.join(self.directory, CSV_FILE_NAMES[kind]), 'w', encoding='utf-8', newline='')
+            writer = csv.DictWriter(file_obj, CSV_COLUMNS[kind], restval="", extrasaction="ignore")
+            writer.writeheader()
+            self._files[kind] = file_obj
+            self._writers[kind] = writer
+        return writer
+
+    def write(self, kind, row):
+        """Write one row, values missing from the row are left empty"""
+        self._writer(kind).writerow(row)
+        self.rows += 1
+
+    def close(self):
+        """Close every file"""
+        for file_obj in self._files.values():
+            file_obj.close()
+        self._files.clear()
+        self._writers.clear()
@@ -0,0 +1,199 @@
+"""
+Integrity checks for save files.
+
+Every save is put in one class:
+
+    ok              decodes to JSON with the keys every save has
+    unreadable      the file could not be read
+    bad_size        not JSON or gzip, and not an IV followed by whole AES blocks
+    bad_padding     the last block does not decrypt to valid PKCS7 padding
+                    (corrupt or truncated, or a different password)
+    bad_gzip        the compressed payload is damaged
+    invalid_utf8    the payload is not UTF-8 text
+    invalid_json    the payload is not a JSON document
+    missing_keys    the document lacks dictionaryOfDictionaries, playerNames or teamName
+
+The checks run cheapest first and stop at the first failure: the file size and
+header, then the first AES block (is a gzip header inside?), then the last
+block alone (is its padding valid?). Only files passing those are decrypted,
+decompressed and parsed in full, so damaged saves in a large archive cost
+almost nothing. <save>.backup files next to each save are checked as well.
+"""
+
+import os
+import zlib
+
+from . import crypto_backend
+from . import es3_codec
+from . import json_engine
+from .batch import BatchResult
+
+
+STATUS_OK = "ok"
+STATUS_UNREADABLE = "unreadable"
+STATUS_BAD_SIZE = "bad_size"
+STATUS_BAD_PADDING = "bad_padding"
+STATUS_BAD_GZIP = "bad_gzip"
+STATUS_INVALID_UTF8 = "invalid_utf8"
+STATUS_INVALID_JSON = "invalid_json"
+STATUS_MISSING_KEYS = "missing_keys"
+
+# In the order the checks run
+STATUSES = (STATUS_OK, STATUS_UNREADABLE, STATUS_BAD_SIZE, STATUS_BAD_PADDING, STATUS_BAD_GZIP,
+            STATUS_INVALID_UTF8, STATUS_INVALID_JSON, STATUS_MISSING_KEYS)
+
+# Top-level keys of every save
+REQUIRED_KEYS = ("dictionaryOfDictionaries", "playerNames", "teamName")
+
+BACKUP_SUFFIX = ".backup"
+
+
+def _quick_check(file_obj, size, password, derive_key, record):
+    """
+    Checks that only need the first and last blocks of the file
+
+    Returns:
+        tuple: (status, detail) of the first failure, or None if the file passed
+    """
+    head = file_obj.read(es3_codec.SNIFF_SIZE * 4)
+    try:
+        container = es3_codec.sniff_container(head, size)
+    except ValueError as e:
+        return STATUS_BAD_SIZE, f"{size} bytes: {str(e)}"
+    record["container"] = container
+
+    if container == es3_codec.FORMAT_GZIP:
+        if not es3_codec._looks_like_gzip(head):
+            return STATUS_BAD_GZIP, "invalid gzip header"
+        return None
+    if not es3_codec.is_encrypted(container):
+        return None
+
+    backend = crypto_backend.get_backend()
+    init_vector = head[:es3_codec.IV_SIZE]
+    key = derive_key(password, init_vector)
+
+    # A gzip header in the first block means the payload is compressed
+    first_block = backend.decrypt(key, init_vector, head[es3_codec.IV_SIZE:es3_codec.SNIFF_SIZE])
+    compressed = first_block[:2] == es3_codec.GZIP_MAGIC
+    record["container"] = es3_codec.container_for(True, compressed)
+    if compressed and not es3_codec._looks_like_gzip(first_block):
+        return STATUS_BAD_GZIP, "invalid gzip header"
+
+    # In CBC the last block decrypts on its own, with the block before it as IV
+    block_size = crypto_backend.BLOCK_SIZE
+    file_obj.seek(size - 2 * block_size)
+    tail = file_obj.read(2 * block_size)
+    last_block = backend.decrypt(key, tail[:block_size], tail[block_size:])
+    try:
+        crypto_backend.pkcs7_padding_length(last_block, block_size)
+    except ValueError as e:
+        return STATUS_BAD_PADDING, str(e)
+    return None
+
+
+def _full_check(data, password, derive_key, record):
+    """
+    Decode and parse the whole file
+
+    Returns:
+        tuple: (status, detail) of the first failure, or None if the file passed
+    """
+    try:
+        payload, record["container"] = es3_codec.decode_container(data, password, derive_key)
+    except (zlib.error, EOFError) as e:
+        return STATUS_BAD_GZIP, str(e)
+    except ValueError as e:
+        return STATUS_BAD_PADDING, str(e)
+    record["payload_size"] = len(payload)
+
+    try:
+        text = bytes(payload).decode('utf-8')
+    except UnicodeDecodeError as e:
+        return STATUS_INVALID_UTF8, f"invalid byte at offset {e.start}"
+
+    try:
+        document = json_engine.loads(text.lstrip('\ufeff'))
+    except ValueError as e:
+        return STATUS_INVALID_JSON, str(e)
+
+    missing = [key for key in REQUIRED_KEYS if not isinstance(document, dict) or key not in document]
+    if missing:
+        return STATUS_MISSING_KEYS, ", ".join(missing)
+    return None
+
+
+def check_file(path, password, derive_key=None, backup_of=None):
+    """
+    Classify one save file
+
+    Args:
+        path (str): File to check
+        password (str): Save password
+        derive_key (callable, optional): Function (password, iv) -> key. Defaults to the active backend.
+        backup_of (str, optional): The save this file is a backup of. Defaults to None.
+
+    Returns:
+        dict: Report record with the path, status, detail, container and size
+    """
+    derive_key = derive_key or crypto_backend.get_backend().derive_key
+    record = {"path": path, "status": STATUS_OK, "detail": None, "container": None, "size": None}
+    if backup_of:
+        record["backup_of"] = backup_of
+
+    try:
+        with open(path, 'rb') as file_obj:
+            size = os.fstat(file_obj.fileno()).st_size
+            record["size"] = size
+            failure = _quick_check(file_obj, size, password, derive_key, record)
+            if failure is None:
+                file_obj.seek(0)
+                data = file_obj.read()
+    except OSError as e:
+        failure = STATUS_UNREADABLE, str(e)
+
+    if failure is None:
+        failure = _full_check(data, password, derive_key, record)
+    if failure is not None:
+        record["status"], record["detail"] = failure
+    return record
+
+
+def _check_file(save_manager, path, password, backup_of):
+    """Batch work for one file, sharing the worker's key cache"""
+    record = check_file(path, password, save_manager._derive_key, backup_of)
+    return BatchResult(path, record, container=record["container"])
+
+
+def iter_tasks(paths, password, check_backups=True):
+    """
+    Build batch tasks for the saves and their backups
+
+    Args:
+        paths (iterable): Save files
+        password (str): Save password
+        check_backups (bool, optional): Also check <save>.backup where it exists. Defaults to True.
+
+    Yields:
+        tuple: Arguments for _check_file after the save manager
+    """
+    for path in paths:
+        yield path, password, None
+        if check_backups and os.path.exists(path + BACKUP_SUFFIX):
+            yield path + BACKUP_SUFFIX, password, path
+
+
+def summarize(records):
+    """
+    Count the records in each class
+
+    Args:
+        records (iterable): Records from check_file
+
+    Returns:
+        dict: Status -> count, for every status
+    """
+    counts = dict.fromkeys(STATUSES, 0)
+    for record in records:
+        counts[record["status"]] += 1
+    return counts
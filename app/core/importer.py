@@ -0,0 +1,259 @@
+"""
+Create many saves from NDJSON records, the reverse of exporter.py.
+
+Each line of the input is one record:
+
+    {"save": {...}}                     a complete decrypted save document
+    {"patch": {...}}                    a JSON merge patch (RFC 7386) applied to the template
+    {"edits": [...]}                    bulk_edit steps applied to the template
+    {"team_name": "Heroes"}             the team name of a template save
+
+"patch", "edits" and "team_name" can be combined and apply in that order. The
+template is the document GameSave.create_new_game builds, or an existing save.
+"folder" picks the save's folder name, otherwise the record gets the next free
+REPO_SAVE_ name from save_template.reserve_save_folders, as new saves do. Each
+save is written to <output>/<folder>/<folder>.Es3, the layout list_save_files
+expects.
+
+The batch workers parse, build, encode and write the records, so only the raw
+lines travel to them. Lines are read as workers free up, so the input can be
+larger than memory. With a progress file, the folder reserved for every line
+and the line of every save written are recorded, and running the same import
+again skips those, keeps saves written to a reserved folder and retries the rest.
+"""
+
+import os
+import time
+
+from . import es3_codec
+from . import json_engine
+from .batch import BatchResult
+from .fsck import REQUIRED_KEYS
+from .save_template import DEFAULT_TEAM_NAME, new_game_template, release_save_folder
+
+
+RECORD_KEYS = ("save", "patch", "edits", "team_name", "folder")
+
+PROGRESS_VERSION = 2
+
+
+def merge_patch(target, patch):
+    """
+    Apply a JSON merge patch (RFC 7386): objects are merged key by key,
+    null removes a key and any other value replaces the target
+
+    Args:
+        target: Document to patch, changed in place when it is a dict
+        patch: The patch
+
+    Returns:
+        The patched document
+    """
+    if not isinstance(patch, dict):
+        return patch
+    if not isinstance(target, dict):
+        target = {}
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        else:
+            target[key] = merge_patch(target.get(key), value)
+    return target
+
+
+def _check_folder(folder):
+    """Refuse folder names that would leave the output folder"""
+    if (not isinstance(folder, str) or not folder or folder in (".", "..")
+            or os.sep in folder or (os.altsep and os.altsep in folder)):
+        raise ValueError(f"Invalid folder name: {folder!r}")
+    return folder
+
+
+# Template documents serialized once per process, keyed by template file (None for a new game)
+_templates = {}
+
+
+def _template_bytes(save_manager, template_path, password):
+    """JSON bytes of the template, cached for the life of the process"""
+    payload = _templates.get(template_path)
+    if payload is None:
+        if template_path is None:
+            payload = new_game_template().render_game()
+        else:
+            with open(template_path, 'rb') as file_obj:
+                payload = bytes(save_manager._decode_es3_file(file_obj, password, template_path))
+        _templates[template_path] = payload
+    return payload
+
+
+def build_document(record, template):
+    """
+    Build the save document of a record
+
+    Args:
+        record (dict): Parsed NDJSON record
+        template (bytes): JSON of the template document, parsed afresh for every record
+
+    Returns:
+        dict: The save document
+
+    Raises:
+        ValueError: If the record is invalid or the document lacks a required key
+    """
+    if not isinstance(record, dict):
+        raise ValueError("Record is not a JSON object")
+    unknown = sorted(set(record) - set(RECORD_KEYS))
+    if unknown:
+        raise ValueError(f"Unknown record keys: {', '.join(unknown)}")
+
+    if "save" in record:
+        if set(record) - {"save", "folder"}:
+            raise ValueError("A record with a complete save cannot also patch it")
+        document = record["save"]
+    else:
+        document = json_engine.loads(template)
+        if "patch" in record:
+            document = merge_patch(document, record["patch"])
+        if "edits" in record:
+            from .bulk_edit import compile_spec
+
+            compile_spec({"edits": record["edits"]}).apply(document)
+        if "team_name" in record:
+            document["teamName"]["value"] = record["team_name"]
+
+    missing = [key for key in REQUIRED_KEYS if not isinstance(document, dict) or key not in document]
+    if missing:
+        raise ValueError(f"Save lacks {', '.join(missing)}")
+    return document
+
+
+def _import_record(save_manager, line_number, line, output_dir, reserved, template_path, password, resuming):
+    """
+    Build one record and write it as a save
+
+    Args:
+        reserved (str): Folder reserved for the record, used unless the record names its own
+        resuming (bool): Whether an earlier run may have written this save already
+
+    Returns:
+        BatchResult: The number of bytes written, or of the save kept from the earlier run
+    """
+    path = f"line {line_number}"
+    reserved_path = os.path.join(output_dir, reserved)
+    try:
+        record = json_engine.loads(line)
+        if isinstance(record, dict) and "folder" in record:
+            release_save_folder(reserved_path)
+            folder = _check_folder(record["folder"])
+        else:
+            folder = reserved
+        folder_path = os.path.join(output_dir, folder)
+        path = os.path.join(folder_path, folder + ".Es3")
+
+        if os.path.exists(path):
+            # Saves are written atomically, so one left by an interrupted run is complete
+            if resuming:
+                with open(path, 'rb') as file_in:
+                    head = file_in.read(es3_codec.SNIFF_SIZE)
+                return BatchResult(path, os.path.getsize(path),
+                                   container=save_manager.resolve_container(path, head, password))
+            raise FileExistsError(f"Save already exists: {path}")
+
+        if template_path is None and isinstance(record, dict) and set(record) <= {"team_name", "folder"}:
+            # Nothing to change but the team name, render the new game without building it
+            team_name = record.get("team_name", DEFAULT_TEAM_NAME)
+            json_bytes = new_game_template(save_manager.compact_json).render_game(team_name)
+        else:
+            document = build_document(record, _template_bytes(save_manager, template_path, password))
+            json_bytes = json_engine.dumps(document, save_manager.compact_json)
+        os.makedirs(folder_path, exist_ok=True)
+        if not save_manager.encrypt_es3_file(json_bytes, path, password):
+            raise IOError(f"Could not write {path}")
+        return BatchResult(path, os.path.getsize(path), container=save_manager.get_container_format(path))
+    except Exception as e:
+        release_save_folder(reserved_path)
+        error = f"{type(e).__name__}: {str(e)}"
+        if path.endswith(".Es3"):
+            error = f"line {line_number}: {error}"
+        return BatchResult(path, error=error)
+
+
+class ImportProgress:
+    """
+    Record of the lines an import has written, for resuming it. The file holds a
+    JSON header with the start time, then "<line> <folder>" for the folder reserved
+    for a line before it is written and the number of each line written.
+    """
+
+    def __init__(self, path):
+        """
+        Open the progress file, reading what an earlier run recorded
+
+        Args:
+            path (str): Progress file, created if it does not exist
+        """
+        self.path = path
+        self.start = None
+        self.done = set()
+        self.folders = {}  # Line number -> folder reserved for it
+
+        if os.path.exists(path):
+            with open(path, 'rb') as file_obj:
+                header = file_obj.readline()
+                if header.strip():
+                    self.start = json_engine.loads(header)["start"]
+                for line in file_obj:
+                    # A crash may leave the last line cut short
+                    if line.endswith(b"\n"):
+                        line_number, _, folder = line.strip().partition(b" ")
+                        if folder:
+                            self.folders[int(line_number)] = folder.decode('utf-8')
+                        else:
+                            self.done.add(int(line_number))
+
+        self.resuming = self.start is not None
+        if self.start is None:
+            self.start = time.time()
+            with open(path, 'wb') as file_obj:
+                header = {"version": PROGRESS_VERSION, "start": self.start}
+                file_obj.write(json_engine.dumps(header) + b"\n")
+        self._file = open(path, 'ab')
+
+    def reserve(self, line_number, folder):
+        """Record the folder reserved for a line, before its save is written"""
+        self.folders[line_number] = folder
+        self._file.write(b"%d %s\n" % (line_number, folder.encode('utf-8')))
+        self._file.flush()
+
+    def mark(self, line_number):
+        """Record that a line's save was written"""
+        self.done.add(line_number)
+        self._file.write(b"%d\n" % line_number)
+        self._file.flush()
+
+    def close(self, finished=False):
+        """
+        Close the file
+
+        Args:
+            finished (bool, optional): Every line was written, remove the file. Defaults to False.
+        """
+        self._file.close()
+        if finished:
+            os.remove(self.path)
+
+
+def iter_lines(lines, done=()):
+    """
+    Number the records of an NDJSON input
+
+    Args:
+        lines (iterable): Lines as bytes or str, e.g. a file
+        done (set, optional): Line numbers to skip. Defaults to ().
+
+    Yields:
+        tuple: (line number from 1, line) for every non-blank line not in done
+    """
+    for line_number, line in enumerate(lines, 1):
+        if line.strip() and line_number not in done:
+            yield line_number, line
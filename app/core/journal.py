@@ -0,0 +1,440 @@
+"""
+All-or-nothing transactions over many save files.
+
+A transaction writes a record to the journal folder before touching anything,
+then every new save is encoded into a staging file next to its target (in
+parallel, by the batch workers). Only when every file has been staged and
+flushed is the record switched to "committing", after which the staging files
+are renamed over their targets in one quick sweep. Each replaced save is
+first hard-linked aside, so a failed sweep can put the old files back.
+
+After a crash, the next SaveManager to start finds the record and repairs
+the files:
+- "staging": nothing was replaced yet, the staging files are removed
+- "committing": every staging file is complete, the sweep is finished and the
+  backups the workers stored of the replaced saves are indexed
+- "rolling_back": the old files are put back
+"""
+
+import os
+import time
+
+from . import atomic_io
+from . import json_engine
+from .save_transaction import SaveTransaction
+
+
+JOURNAL_VERSION = 1
+
+STATE_STAGING = "staging"
+STATE_COMMITTING = "committing"
+STATE_ROLLING_BACK = "rolling_back"
+
+
+def default_journal_dir():
+    """Journal folder used when SaveManager is not given one"""
+    return os.path.join(os.path.expanduser("~"), ".reposavemodifier", "journal")
+
+
+def _sibling(path, transaction_id, suffix):
+    """Hidden file next to path belonging to a transaction"""
+    directory, base_name = os.path.split(path)
+    return os.path.join(directory, f".{base_name}.{transaction_id}{suffix}")
+
+
+def _remove(path):
+    """Remove a file if it exists"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _host_name():
+    """Name of this machine, without importing platform at startup"""
+    if hasattr(os, "uname"):
+        return os.uname().nodename
+    return os.environ.get("COMPUTERNAME", "")
+
+
+# Ids of the transactions open in this process, which recovery must not touch
+_open_transactions = set()
+
+
+def _windows_process_alive(pid):
+    """Whether a process is running, asked through OpenProcess and GetExitCodeProcess"""
+    import ctypes
+    from ctypes import wintypes
+
+    process_query_limited_information = 0x1000
+    still_active = 259
+    error_access_denied = 5
+
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+    kernel32.GetExitCodeProcess.argtypes = (wintypes.HANDLE, ctypes.POINTER(wintypes.DWORD))
+    kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+
+    handle = kernel32.OpenProcess(process_query_limited_information, False, pid)
+    if not handle:
+        # Running under another user, or no such process
+        return ctypes.get_last_error() == error_access_denied
+    try:
+        exit_code = wintypes.DWORD()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+            return True
+        return exit_code.value == still_active
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def _process_alive(pid):
+    """Whether a process with this id is running on this machine"""
+    if not isinstance(pid, int):
+        return False
+    if os.name == "nt":
+        # os.kill on Windows terminates the process, so ask the kernel instead
+        try:
+            return _windows_process_alive(pid)
+        except Exception as e:
+            print(f"Warning: Could not check whether process {pid} is running: {str(e)}")
+            return True  # Leaving a record for later is safe, undoing a live transaction is not
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _owner_alive(record):
+    """Whether the process that wrote a transaction record may still be working on it"""
+    if record.get("host") != _host_name():
+        # Another machine sharing the journal folder may still be running it
+        print(f"Transaction {record.get('id')} belongs to {record.get('host')!r}, leaving it to that machine")
+        return True
+    if record.get("pid") == os.getpid():
+        return record.get("id") in _open_transactions
+    return _process_alive(record.get("pid"))
+
+
+# Steps on a single entry, shared by commit, rollback and recovery. Each one
+# can be repeated after a crash part way through.
+
+def _swap(entry, missing_ok=False):
+    """
+    Move an entry's staging file over its target, keeping the old file aside
+
+    Raises:
+        FileNotFoundError: If the staging file is missing, unless missing_ok is set
+            because a sweep being repeated may have moved it already
+    """
+    if not os.path.exists(entry["staged"]):
+        if missing_ok:
+            return
+        raise FileNotFoundError(f"Staged file of {entry['path']} is missing: {entry['staged']}")
+    path = entry["path"]
+    if entry["existed"]:
+        if not os.path.exists(entry["original"]):
+            try:
+                os.link(path, entry["original"])
+            except (OSError, NotImplementedError, AttributeError):
+                import shutil
+
+                shutil.copy2(path, entry["original"])
+        try:
+            os.chmod(entry["staged"], os.stat(path).st_mode & 0o7777)
+        except OSError:
+            pass
+    os.replace(entry["staged"], path)
+
+
+def _restore(entry):
+    """Undo an entry, whether or not its staging file was moved in yet"""
+    if os.path.exists(entry["staged"]):
+        _remove(entry["staged"])
+        _remove(entry["original"])
+    elif entry["existed"]:
+        if os.path.exists(entry["original"]):
+            os.replace(entry["original"], entry["path"])
+    else:
+        _remove(entry["path"])
+
+
+def _finish(entry, create_backup):
+    """Keep the old file as <save>.backup, or drop it"""
+    if os.path.exists(entry["original"]):
+        if create_backup:
+            os.replace(entry["original"], entry["path"] + ".backup")
+        else:
+            _remove(entry["original"])
+
+
+def _sync_directories(entries, durable=True):
+    """Flush the directories holding the entries"""
+    if durable:
+        for directory in {os.path.dirname(entry["path"]) for entry in entries}:
+            atomic_io.fsync_directory(directory)
+
+
+class JournalTransaction:
+    """
+    One multi-file transaction. Stage a file for every path with staged_path(),
+    then call commit() with the paths that were staged, or rollback().
+    """
+
+    def __init__(self, journal, paths, create_backup=True):
+        """
+        Initialize the transaction
+
+        Args:
+            journal (SaveJournal): Journal recording the transaction
+            paths (list): Save files the transaction may write
+            create_backup (bool, optional): Keep each replaced save as <save>.backup. Defaults to True.
+
+        Raises:
+            ValueError: If a path is listed twice
+        """
+        self.journal = journal
+        self.id = f"{int(time.time() * 1000):x}-{os.urandom(4).hex()}"
+        self.create_backup = create_backup
+        self.record_path = os.path.join(journal.journal_dir, self.id + ".json")
+        self.state = None
+
+        self.entries = {}
+        for path in paths:
+            path = os.path.abspath(path)
+            if path in self.entries:
+                raise ValueError(f"Save listed twice in one transaction: {path}")
+            self.entries[path] = {
+                "path": path,
+                "staged": _sibling(path, self.id, ".stage"),
+                "original": _sibling(path, self.id, ".orig"),
+            }
+
+    @property
+    def open(self):
+        """Whether the transaction has begun and is not finished yet"""
+        return self.state is not None
+
+    def staged_path(self, path):
+        """
+        Get the staging file for a save
+
+        Args:
+            path (str): A save file passed to the transaction
+
+        Returns:
+            str: Where the new contents of the save must be written
+        """
+        return self.entries[os.path.abspath(path)]["staged"]
+
+    def _write_record(self, state, entries):
+        """Atomically write the transaction's record"""
+        record = {
+            "version": JOURNAL_VERSION,
+            "id": self.id,
+            "state": state,
+            "pid": os.getpid(),
+            "host": _host_name(),
+            "created": time.time(),
+            "backup": self.create_backup,
+            "entries": entries,
+        }
+        os.makedirs(self.journal.journal_dir, exist_ok=True)
+        _open_transactions.add(self.id)
+        atomic_io.atomic_write(self.record_path, [json_engine.dumps(record)], durable=self.journal.durable)
+        self.state = state
+
+    def _discard_record(self):
+        """Remove the record, ending the transaction"""
+        _remove(self.record_path)
+        _open_transactions.discard(self.id)
+        self.state = None
+
+    def begin(self):
+        """Record the intent to write every path, before any staging file exists"""
+        self._write_record(STATE_STAGING, list(self.entries.values()))
+        return self
+
+    def commit(self, staged_paths, history=None):
+        """
+        Move the staged files into place
+
+        Args:
+            staged_paths (iterable): Saves whose staging file was written and flushed,
+                saves not listed are left untouched
+            history (dict, optional): Save -> backup record stored by the worker that staged it,
+                kept in the record so recovery can index it after a crash. Defaults to None.
+
+        Raises:
+            OSError: If a file could not be moved, after every save has been restored.
+                FileNotFoundError if a staging file is missing, after the transaction was rolled back.
+        """
+        entries = [self.entries[os.path.abspath(path)] for path in staged_paths]
+        missing = [entry["path"] for entry in entries if not os.path.exists(entry["staged"])]
+        if missing:
+            self.rollback()
+            raise FileNotFoundError(f"Staged file missing for {len(missing)} saves, e.g. {missing[0]}")
+        staged = {entry["staged"] for entry in entries}
+        for entry in self.entries.values():
+            if entry["staged"] not in staged:
+                _remove(entry["staged"])
+        for entry in entries:
+            entry["existed"] = os.path.exists(entry["path"])
+        for path, record in (history or {}).items():
+            self.entries[os.path.abspath(path)]["history"] = record
+
+        # Staging files are durable, from here on a crash rolls forward
+        _sync_directories(entries, self.journal.durable)
+        self._write_record(STATE_COMMITTING, entries)
+
+        try:
+            for entry in entries:
+                _swap(entry)
+        except OSError:
+            self._write_record(STATE_ROLLING_BACK, entries)
+            restored = True
+            for entry in entries:
+                try:
+                    _restore(entry)
+                except OSError as e:
+                    print(f"Warning: Could not restore {entry['path']}: {str(e)}")
+                    restored = False
+            _sync_directories(entries, self.journal.durable)
+            if restored:
+                self._discard_record()
+            else:
+                # Keep the record so the next start retries the rollback
+                _open_transactions.discard(self.id)
+                self.state = None
+            raise
+
+        _sync_directories(entries, self.journal.durable)
+        for entry in entries:
+            _finish(entry, self.create_backup)
+        self._discard_record()
+
+    def rollback(self):
+        """Abandon the transaction before commit, removing every staging file"""
+        for entry in self.entries.values():
+            _remove(entry["staged"])
+        self._discard_record()
+
+
+class SaveJournal:
+    """
+    Write-ahead journal of multi-file save transactions, kept in one folder
+    """
+
+    def __init__(self, journal_dir=None, durable=True):
+        """
+        Initialize the journal
+
+        Args:
+            journal_dir (str, optional): Folder for transaction records. Defaults to default_journal_dir().
+            durable (bool, optional): Whether to fsync records and directories. Defaults to True.
+        """
+        self.journal_dir = journal_dir or default_journal_dir()
+        self.durable = durable
+
+    def begin(self, paths, create_backup=True):
+        """
+        Start a transaction over some saves
+
+        Args:
+            paths (list): Save files the transaction may write
+            create_backup (bool, optional): Keep each replaced save as <save>.backup. Defaults to True.
+
+        Returns:
+            JournalTransaction: The recorded transaction
+        """
+        return JournalTransaction(self, paths, create_backup).begin()
+
+    def pending(self):
+        """
+        List the records of unfinished transactions
+
+        Returns:
+            list: Record file paths, oldest first
+        """
+        if not os.path.isdir(self.journal_dir):
+            return []
+        return [os.path.join(self.journal_dir, name) for name in sorted(os.listdir(self.journal_dir))
+                if name.endswith(".json") and not name.startswith(".")]
+
+    def recover(self, index_history=None):
+        """
+        Finish or undo transactions interrupted by a crash
+
+        Transactions still owned by a running process, or started on another
+        machine, are left alone.
+
+        Args:
+            index_history (callable, optional): Called with the (save, backup record) pairs of
+                every transaction rolled forward, to index the backups its workers stored.
+                Defaults to None.
+
+        Returns:
+            list: (transaction id, "rolled forward" or "rolled back", number of saves) for each repair
+        """
+        recovered = []
+        for record_path in self.pending():
+            try:
+                with open(record_path, 'rb') as file_obj:
+                    record = json_engine.loads(file_obj.read())
+            except Exception as e:
+                print(f"Warning: Could not read transaction record {record_path}: {str(e)}")
+                continue
+
+            if _owner_alive(record):
+                continue
+
+            entries = record["entries"]
+            if record["state"] == STATE_COMMITTING:
+                # Staging files already moved in by the interrupted sweep are missing
+                for entry in entries:
+                    _swap(entry, missing_ok=True)
+                _sync_directories(entries, self.durable)
+                for entry in entries:
+                    _finish(entry, record.get("backup", True))
+                stored = [(entry["path"], entry["history"]) for entry in entries if entry.get("history")]
+                if stored and index_history is not None:
+                    index_history(stored)
+                action = "rolled forward"
+            elif record["state"] == STATE_ROLLING_BACK:
+                for entry in entries:
+                    _restore(entry)
+                action = "rolled back"
+            else:
+                for entry in entries:
+                    _remove(entry["staged"])
+                action = "rolled back"
+
+            _sync_directories(entries, self.durable)
+            _remove(record_path)
+            recovered.append((record["id"], action, len(entries)))
+        return recovered
+
+
+def _stage_file(save_manager, path, data, password, staged_path, create_backup):
+    """
+    Encode a document into a save's staging file
+
+    Returns:
+        BatchResult: The number of bytes staged, with the backup blob of the original in history
+    """
+    # Only batch workers stage files, keep the pool machinery out of startup recovery
+    from .batch import BatchResult
+
+    try:
+        transaction = SaveTransaction(save_manager, path, password)
+        if not transaction.stage(data, staged_path, create_backup):
+            raise ValueError("Encoded data does not match the document")
+        return BatchResult(path, os.path.getsize(staged_path), container=transaction.container,
+                           history=transaction.history)
+    except Exception as e:
+        _remove(staged_path)
+        return BatchResult(path, error=f"{type(e).__name__}: {str(e)}")
@@ -0,0 +1,338 @@
+"""
+JSON engines for ES3 payloads.
+
+Parsing and serializing the JSON payload is most of the cost of loading and
+saving a large save, so the fastest installed library is used: orjson, then
+ujson, then the standard library. Every engine must round-trip ES3 documents
+exactly ({"__type": ..., "value": ...} wrappers, floats such as timePlayed,
+64-bit integers), an engine failing the fidelity check is skipped.
+
+Compact output drops the whitespace after separators, which the game's parser
+does not need, so there are fewer bytes to pad, encrypt and write.
+"""
+
+import json
+import math
+import os
+
+
+# Engines in order of preference
+ENGINE_PREFERENCE = ["orjson", "ujson", "json"]
+
+# Environment variable to force an engine, e.g. "json"
+ENGINE_ENV_VAR = "REPO_SAVE_JSON_ENGINE"
+
+# orjson parses integers outside the 64-bit range as floats instead of failing,
+# documents containing digit runs that long are parsed by the standard library.
+# Mapping every digit to "0" and searching for a run is much faster than a regex.
+_DIGIT_TABLE = bytes(ord("0") if 0x30 <= byte <= 0x39 else ord(" ") for byte in range(256))
+_LONG_DIGIT_RUN = b"0" * 19
+
+
+def _has_long_digit_run(data):
+    """Whether JSON text contains a run of 19 or more digits"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    elif isinstance(data, memoryview):
+        data = data.tobytes()
+    return _LONG_DIGIT_RUN in data.translate(_DIGIT_TABLE)
+
+
+def _has_non_finite(data):
+    """Whether a document contains NaN or an infinite float"""
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return True
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return False
+
+
+def _stdlib_loads(data):
+    """Parse with the standard library, accepting bytes-like objects"""
+    if isinstance(data, (bytearray, memoryview)):
+        data = bytes(data)
+    return json.loads(data)
+
+
+def _stdlib_dumps(data, compact=True):
+    """
+    Serialize with the standard library
+
+    Args:
+        data: JSON-compatible object
+        compact (bool, optional): Drop whitespace and write UTF-8 directly. Defaults to True.
+            Without it the output is exactly what json.dumps produces by default.
+
+    Returns:
+        bytes: UTF-8 encoded JSON
+    """
+    if not compact:
+        return json.dumps(data).encode('utf-8')
+    try:
+        return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode('utf-8')
+    except UnicodeEncodeError:
+        # Lone surrogates cannot be written as UTF-8, keep them escaped
+        return json.dumps(data, separators=(",", ":")).encode('utf-8')
+
+
+def _load_engine(name):
+    """
+    Import an engine
+
+    Args:
+        name (str): Engine name
+
+    Returns:
+        tuple: (loads, compact_dumps) functions
+
+    Raises:
+        ImportError: If the library is not installed
+        ValueError: If the name is unknown
+    """
+    if name == "json":
+        return _stdlib_loads, _stdlib_dumps
+    if name == "orjson":
+        import orjson
+
+        def orjson_loads(data):
+            if _has_long_digit_run(data):
+                return _stdlib_loads(data)
+            return orjson.loads(data)
+
+        def orjson_dumps(data, compact=True):
+            encoded = orjson.dumps(data)
+            # orjson writes NaN and infinities as null, only look for them when there is one
+            if b"null" in encoded and _has_non_finite(data):
+                return _stdlib_dumps(data)
+            return encoded
+
+        return orjson_loads, orjson_dumps
+    if name == "ujson":
+        import ujson
+
+        def ujson_loads(data):
+            if isinstance(data, (bytearray, memoryview)):
+                data = bytes(data)
+            return ujson.loads(data)
+
+        def ujson_dumps(data, compact=True):
+            return ujson.dumps(data, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+
+        return ujson_loads, ujson_dumps
+    raise ValueError(f"Unknown JSON engine: {name}")
+
+
+class JsonEngine:
+    """
+    A JSON implementation with a common interface. Anything the fast library
+    rejects (integers beyond 64 bits, NaN, ...) is handled by the standard library.
+    """
+
+    def __init__(self, name):
+        """
+        Initialize the engine
+
+        Args:
+            name (str): One of ENGINE_PREFERENCE
+        """
+        self.name = name
+        self._loads, self._dumps = _load_engine(name)
+
+    def loads(self, data):
+        """
+        Parse a JSON document
+
+        Args:
+            data (bytes, bytearray, memoryview or str): JSON text
+
+        Returns:
+            The parsed document
+        """
+        try:
+            return self._loads(data)
+        except (ValueError, OverflowError):
+            if self._loads is _stdlib_loads:
+                raise
+            return _stdlib_loads(data)
+
+    def dumps(self, data, compact=True):
+        """
+        Serialize a document
+
+        Args:
+            data: JSON-compatible object
+            compact (bool, optional): Compact separators. Defaults to True.
+                Non-compact output always matches json.dumps with default settings.
+
+        Returns:
+            bytes: UTF-8 encoded JSON
+        """
+        if not compact:
+            return _stdlib_dumps(data, compact=False)
+        try:
+            return self._dumps(data)
+        except (TypeError, ValueError, OverflowError):
+            if self._dumps is _stdlib_dumps:
+                raise
+            return _stdlib_dumps(data)
+
+
+def available_engines():
+    """
+    List the installed engines
+
+    Returns:
+        list: Engine names in order of preference
+    """
+    available = []
+    for name in ENGINE_PREFERENCE:
+        try:
+            _load_engine(name)
+            available.append(name)
+        except ImportError:
+            pass
+    return available
+
+
+def _fidelity_corpus():
+    """
+    Build the fixed set of documents used by verify_engine
+
+    Returns:
+        list: JSON-compatible documents shaped like ES3 saves
+    """
+    return [
+        {"teamName": {"__type": "string", "value": "R.E.P.O."}},
+        {"timePlayed": {"__type": "float", "value": 12.5}},
+        {"timePlayed": {"__type": "float", "value": 1234.5678901234567}},
+        {"floats": [0.1, 1.0, -0.0, 1e-07, 3.4028234663852886e+38, 1.7976931348623157e+308, 5e-324, 1e16, 123456789.0]},
+        {"ints": [0, -1, 2 ** 31, -2 ** 31, 2 ** 63 - 1, -2 ** 63, 2 ** 64, 10 ** 30]},
+        {"strings": ["", "café über", "日本語", "emoji \U0001F600", "quote \" slash / backslash \\", "\u0000\u001f\t\n"]},
+        {"nested": {"__type": "System.Collections.Generic.Dictionary`2[[System.String],[System.Int32]],mscorlib",
+                    "value": {"Item Gun Handgun": 1, "Item Upgrade Player Health": 0}}},
+        {"empty": {}, "list": [], "bool": [True, False], "null": None},
+        {"nonFinite": [float("nan"), float("inf"), float("-inf")], "null": None},
+        [1, "two", 3.0, [4, [5, {"six": 6}]]],
+    ]
+
+
+def _same(expected, actual):
+    """Compare two documents, treating int and float as different types"""
+    if type(expected) is not type(actual):
+        return False
+    if isinstance(expected, dict):
+        return (list(expected) == list(actual)
+                and all(_same(expected[key], actual[key]) for key in expected))
+    if isinstance(expected, list):
+        return len(expected) == len(actual) and all(_same(a, b) for a, b in zip(expected, actual))
+    if isinstance(expected, float):
+        return repr(expected) == repr(actual)
+    return expected == actual
+
+
+def verify_engine(engine=None):
+    """
+    Check that an engine round-trips ES3-style documents exactly and
+    interoperates with the standard library in both directions
+
+    Args:
+        engine (JsonEngine, optional): Engine to check. Defaults to the active engine.
+
+    Returns:
+        list: Descriptions of every mismatch, empty if the engine is faithful
+    """
+    engine = engine or get_engine()
+    mismatches = []
+
+    for case_index, document in enumerate(_fidelity_corpus()):
+        try:
+            for compact in (True, False):
+                encoded = engine.dumps(document, compact)
+                if not _same(document, engine.loads(encoded)):
+                    mismatches.append(f"case {case_index}: round trip differs (compact={compact})")
+                if not _same(document, json.loads(encoded)):
+                    mismatches.append(f"case {case_index}: standard library reads different data (compact={compact})")
+            if not _same(document, engine.loads(json.dumps(document).encode('utf-8'))):
+                mismatches.append(f"case {case_index}: standard library output parsed differently")
+        except Exception as e:
+            mismatches.append(f"case {case_index}: {type(e).__name__}: {str(e)}")
+
+    return mismatches
+
+
+def _select_default_engine():
+    """Pick the fastest faithful engine, honouring the override environment variable"""
+    override = os.environ.get(ENGINE_ENV_VAR)
+    if override:
+        try:
+            return JsonEngine(override)
+        except (ImportError, ValueError) as e:
+            print(f"Warning: JSON engine {override!r} unavailable ({str(e)}), using default")
+
+    for name in available_engines():
+        engine = JsonEngine(name)
+        mismatches = verify_engine(engine)
+        if not mismatches:
+            return engine
+        print(f"Warning: JSON engine {name!r} failed the fidelity check ({mismatches[0]}), skipping it")
+    return JsonEngine("json")
+
+
+_active_engine = None
+
+
+def get_engine():
+    """
+    Get the active JSON engine, selecting it on first use
+
+    Returns:
+        JsonEngine: The active engine
+    """
+    global _active_engine
+    if _active_engine is None:
+        _active_engine = _select_default_engine()
+    return _active_engine
+
+
+def set_engine(name):
+    """
+    Switch the active JSON engine
+
+    Args:
+        name (str): Engine name
+
+    Returns:
+        JsonEngine: The new active engine
+    """
+    global _active_engine
+    _active_engine = JsonEngine(name)
+    return _active_engine
+
+
+def loads(data):
+    """Parse JSON with the active engine"""
+    return get_engine().loads(data)
+
+
+def dumps(data, compact=True):
+    """Serialize JSON to bytes with the active engine"""
+    return get_engine().dumps(data, compact)
+
+
+def describe_engine():
+    """
+    Describe the active engine and the installed alternatives
+
+    Returns:
+        dict: Active engine name and available engines
+    """
+    return {
+        "active": get_engine().name,
+        "available": available_engines()
+    }
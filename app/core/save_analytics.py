@@ -0,0 +1,411 @@
+"""
+Distributions over a whole corpus of saves.
+
+Balance questions ("what does currency look like at level 10", "which upgrades
+do players buy", "which items does nobody own") need a few numbers from every
+save. Reading them save by save means decrypting each one and walking its
+dictionaries in Python, every time.
+
+Instead, each save's numbers are read once through GameSave's accessors and
+kept in SaveStatsIndex, a SaveIndex stamped with the file's size and mtime, so
+only new or changed saves are decoded again (in parallel, see
+SaveManager.refresh_stats_index). SaveCorpus lays the index out as column
+arrays: one row per save for the run stats, one row per player for health and
+upgrades, and one row per owned item. Percentiles, histograms and group-by-team
+reductions then run on whole columns.
+
+Columns are NumPy arrays when NumPy is installed and the standard library's
+array.array otherwise, where the reductions fall back to plain loops. Set
+REPO_SAVE_ARRAY_BACKEND to "array" to force the fallback.
+"""
+
+import math
+import os
+from array import array
+from bisect import bisect_right
+
+from .save_index import SaveIndex
+
+
+STATS_VERSION = 1
+STATS_FILE_NAME = "save_stats.json"
+ARRAY_ENV_VAR = "REPO_SAVE_ARRAY_BACKEND"
+
+# Save columns, in the order entries store them, and the GameSave accessor reading each
+RUN_STAT_COLUMNS = ("level", "currency", "lives", "totalHaul", "chargingStationCharge", "save level")
+_RUN_STAT_ACCESSORS = ("get_level", "get_currency", "get_lives", "get_total_haul", "get_charging_station_charge",
+                       "get_save_level")
+SAVE_COLUMNS = RUN_STAT_COLUMNS + ("players",)
+
+# Player columns, in the order entries store them: PlayerData's health, max_health and upgrades
+UPGRADE_COLUMNS = ("health", "stamina", "extraJump", "launch", "mapPlayerCount", "speed", "strength", "range", "throw")
+PLAYER_COLUMNS = ("hp", "maxHp") + UPGRADE_COLUMNS
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+GROUP_REDUCTIONS = ("count", "sum", "mean", "min", "max")
+
+_numpy = None
+_numpy_checked = False
+
+
+def get_numpy():
+    """
+    Get NumPy if it is installed and not disabled with REPO_SAVE_ARRAY_BACKEND=array
+
+    Returns:
+        module: numpy, or None to use array.array
+    """
+    global _numpy, _numpy_checked
+    if not _numpy_checked:
+        _numpy_checked = True
+        if os.environ.get(ARRAY_ENV_VAR, "").lower() != "array":
+            try:
+                import numpy
+                _numpy = numpy
+            except ImportError:
+                if os.environ.get(ARRAY_ENV_VAR, "").lower() == "numpy":
+                    print("Warning: NumPy is not installed, using array.array")
+    return _numpy
+
+
+def _column(values, typecode='d'):
+    """Make a column of numbers, typecode 'd' for floats or 'q' for indexes"""
+    numpy = get_numpy()
+    if numpy is not None:
+        return numpy.array(values, dtype=numpy.float64 if typecode == 'd' else numpy.int64)
+    return array(typecode, values)
+
+
+def corpus_row(data):
+    """
+    Read the numbers of a save through GameSave
+
+    Args:
+        data (dict): Save document
+
+    Returns:
+        dict: team_name, run_stats (in RUN_STAT_COLUMNS order), players (Steam ID ->
+            numbers in PLAYER_COLUMNS order) and items (purchased item -> quantity, non-zero only)
+    """
+    from .data_models import GameSave
+
+    save = GameSave(data)
+    players = {}
+    for player_id, player in save.players.items():
+        players[str(player_id)] = [float(player.health), float(player.max_health)] + \
+            [float(player.upgrades.get(name, 0)) for name in UPGRADE_COLUMNS]
+    return {
+        "team_name": str(save.team_name),
+        "run_stats": [float(getattr(save, accessor)()) for accessor in _RUN_STAT_ACCESSORS],
+        "players": players,
+        "items": {str(name): float(quantity) for name, quantity in save.items["purchased"].items() if quantity},
+    }
+
+
+class SaveStatsIndex(SaveIndex):
+    """
+    Numbers of save files for the analytics, kept in <cache_dir>/save_stats.json
+    """
+
+    file_name = STATS_FILE_NAME
+    version = STATS_VERSION
+    summarize = staticmethod(corpus_row)
+
+
+def percentiles(values, percents=DEFAULT_PERCENTILES):
+    """
+    Percentiles of a column, interpolating linearly between values as numpy.percentile does
+
+    Args:
+        values: Column
+        percents (iterable, optional): Percentiles from 0 to 100. Defaults to 5, 25, 50, 75 and 95.
+
+    Returns:
+        list: One float per percentile, None for an empty column
+    """
+    percents = list(percents)
+    if len(values) == 0:
+        return [None] * len(percents)
+    numpy = get_numpy()
+    if numpy is not None:
+        return [float(value) for value in numpy.percentile(values, percents)]
+    ordered = sorted(values)
+    last = len(ordered) - 1
+    result = []
+    for percent in percents:
+        position = last * percent / 100
+        low = math.floor(position)
+        high = min(low + 1, last)
+        result.append(ordered[low] + (ordered[high] - ordered[low]) * (position - low))
+    return result
+
+
+def histogram(values, bins=10):
+    """
+    Count the values of a column in equal-width bins over its range, as numpy.histogram does
+
+    Args:
+        values: Column
+        bins (int, optional): Number of bins. Defaults to 10.
+
+    Returns:
+        tuple: (bin edges, bins + 1 floats; counts, bins ints), both empty for an empty column
+    """
+    if len(values) == 0:
+        return [], []
+    numpy = get_numpy()
+    if numpy is not None:
+        counts, edges = numpy.histogram(values, bins)
+        return [float(edge) for edge in edges], [int(count) for count in counts]
+    low, high = min(values), max(values)
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    width = (high - low) / bins
+    edges = [low + width * number for number in range(bins)] + [high]
+    counts = [0] * bins
+    for value in values:
+        # Last bin includes its right edge
+        counts[min(bisect_right(edges, value) - 1, bins - 1)] += 1
+    return edges, counts
+
+
+def describe(values):
+    """
+    Count, mean, standard deviation, minimum and maximum of a column
+
+    Args:
+        values: Column
+
+    Returns:
+        dict: count, mean, std, min and max, None where the column is empty
+    """
+    count = len(values)
+    if count == 0:
+        return {"count": 0, "mean": None, "std": None, "min": None, "max": None}
+    numpy = get_numpy()
+    if numpy is not None:
+        return {"count": count, "mean": float(values.mean()), "std": float(values.std()),
+                "min": float(values.min()), "max": float(values.max())}
+    mean = math.fsum(values) / count
+    variance = math.fsum((value - mean) ** 2 for value in values) / count
+    return {"count": count, "mean": mean, "std": math.sqrt(variance), "min": min(values), "max": max(values)}
+
+
+def group_reduce(codes, values, groups, how="mean"):
+    """
+    Reduce a column per group
+
+    Args:
+        codes: Column of group numbers, 0 to groups - 1, one per value
+        values: Column
+        groups (int): Number of groups
+        how (str, optional): One of count, sum, mean, min and max. Defaults to "mean".
+
+    Returns:
+        list: One float per group, None for the mean, min and max of empty groups
+
+    Raises:
+        ValueError: If how is not a reduction
+    """
+    if how not in GROUP_REDUCTIONS:
+        raise ValueError(f"Unknown reduction {how!r}, expected one of {', '.join(GROUP_REDUCTIONS)}")
+    numpy = get_numpy()
+    if numpy is not None:
+        counts = numpy.bincount(codes, minlength=groups)
+        if how == "count":
+            return [float(count) for count in counts]
+        if how in ("sum", "mean"):
+            sums = numpy.bincount(codes, weights=values, minlength=groups)
+            if how == "sum":
+                return [float(total) for total in sums]
+            return [float(total / count) if count else None for total, count in zip(sums, counts)]
+        result = numpy.full(groups, numpy.inf if how == "min" else -numpy.inf)
+        (numpy.minimum if how == "min" else numpy.maximum).at(result, codes, values)
+        return [float(value) if count else None for value, count in zip(result, counts)]
+
+    counts = [0] * groups
+    for code in codes:
+        counts[code] += 1
+    if how == "count":
+        return [float(count) for count in counts]
+    if how in ("sum", "mean"):
+        sums = [0.0] * groups
+        for code, value in zip(codes, values):
+            sums[code] += value
+        if how == "sum":
+            return sums
+        return [total / count if count else None for total, count in zip(sums, counts)]
+    pick = min if how == "min" else max
+    result = [None] * groups
+    for code, value in zip(codes, values):
+        result[code] = value if result[code] is None else pick(result[code], value)
+    return result
+
+
+class SaveCorpus:
+    """
+    Column arrays of a set of saves:
+
+        saves:   paths, team_codes (index into team_names), one column per SAVE_COLUMNS name
+        players: player_saves (row of their save), player_ids, one column per PLAYER_COLUMNS name
+        items:   item_saves (row of their save), item_codes (index into item_names), item_quantities
+    """
+
+    def __init__(self, entries):
+        """
+        Lay entries out as columns
+
+        Args:
+            entries (iterable): (save path, entry made by corpus_row) pairs
+        """
+        self.paths = []
+        self.team_names = []
+        team_codes = {}
+        codes = []
+        stats = [[] for _ in RUN_STAT_COLUMNS]
+        player_counts = []
+        self.player_ids = []
+        player_saves = []
+        players = [[] for _ in PLAYER_COLUMNS]
+        self.item_names = []
+        item_codes = {}
+        item_saves = []
+        items = []
+        quantities = []
+
+        for row, (path, entry) in enumerate(entries):
+            self.paths.append(path)
+            code = team_codes.get(entry["team_name"])
+            if code is None:
+                code = team_codes[entry["team_name"]] = len(self.team_names)
+                self.team_names.append(entry["team_name"])
+            codes.append(code)
+            for column, value in zip(stats, entry["run_stats"]):
+                column.append(value)
+            player_counts.append(len(entry["players"]))
+            for player_id, numbers in entry["players"].items():
+                self.player_ids.append(player_id)
+                player_saves.append(row)
+                for column, value in zip(players, numbers):
+                    column.append(value)
+            for item_name, quantity in entry["items"].items():
+                code = item_codes.get(item_name)
+                if code is None:
+                    code = item_codes[item_name] = len(self.item_names)
+                    self.item_names.append(item_name)
+                item_saves.append(row)
+                items.append(code)
+                quantities.append(quantity)
+
+        self.team_codes = _column(codes, 'q')
+        self.save_columns = {name: _column(values) for name, values in zip(RUN_STAT_COLUMNS, stats)}
+        self.save_columns["players"] = _column(player_counts)
+        self.player_saves = _column(player_saves, 'q')
+        self.player_columns = {name: _column(values) for name, values in zip(PLAYER_COLUMNS, players)}
+        self.item_saves = _column(item_saves, 'q')
+        self.item_codes = _column(items, 'q')
+        self.item_quantities = _column(quantities)
+
+    @classmethod
+    def from_index(cls, index, paths=None):
+        """
+        Build a corpus from a SaveStatsIndex
+
+        Args:
+            index (SaveStatsIndex): The index
+            paths (iterable, optional): Saves to include, those without a current entry are skipped.
+                Defaults to every indexed save.
+
+        Returns:
+            SaveCorpus: The corpus
+        """
+        if paths is None:
+            return cls(sorted(index.entries.items()))
+        return cls((path, entry) for path, entry in ((path, index.lookup(path)) for path in paths)
+                   if entry is not None)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def column(self, name):
+        """
+        Get a column by name
+
+        Args:
+            name (str): A SAVE_COLUMNS or PLAYER_COLUMNS name
+
+        Returns:
+            The column
+
+        Raises:
+            KeyError: If there is no such column
+        """
+        if name in self.save_columns:
+            return self.save_columns[name]
+        if name in self.player_columns:
+            return self.player_columns[name]
+        raise KeyError(f"No column {name!r}, expected one of {', '.join(SAVE_COLUMNS + PLAYER_COLUMNS)}")
+
+    def group_by_team(self, name, how="mean"):
+        """
+        Reduce a column per team. Player columns are grouped by the team of each player's save.
+
+        Args:
+            name (str): A SAVE_COLUMNS or PLAYER_COLUMNS name
+            how (str, optional): One of count, sum, mean, min and max. Defaults to "mean".
+
+        Returns:
+            dict: Team name -> value
+        """
+        values = self.column(name)
+        if name in self.save_columns:
+            codes = self.team_codes
+        elif get_numpy() is not None:
+            codes = self.team_codes[self.player_saves]
+        else:
+            codes = array('q', (self.team_codes[row] for row in self.player_saves))
+        return dict(zip(self.team_names, group_reduce(codes, values, len(self.team_names), how)))
+
+    def item_ownership(self):
+        """
+        How many saves own each purchased item, and how many of it in total
+
+        Returns:
+            dict: Item name -> {"saves": saves owning it, "share": fraction of all saves, "quantity": total}
+        """
+        groups = len(self.item_names)
+        owners = group_reduce(self.item_codes, self.item_quantities, groups, "count")
+        totals = group_reduce(self.item_codes, self.item_quantities, groups, "sum")
+        return {name: {"saves": int(saves), "share": saves / len(self) if len(self) else 0.0, "quantity": total}
+                for name, saves, total in zip(self.item_names, owners, totals)}
+
+    def report(self, percents=DEFAULT_PERCENTILES, bins=10):
+        """
+        Summarize every column
+
+        Args:
+            percents (iterable, optional): Percentiles to compute. Defaults to 5, 25, 50, 75 and 95.
+            bins (int, optional): Histogram bins. Defaults to 10.
+
+        Returns:
+            dict: saves, players, teams, backend, and per column its describe() values,
+                percentiles and histogram, plus item_ownership()
+        """
+        percents = list(percents)
+
+        def summarize(values):
+            summary = describe(values)
+            summary["percentiles"] = dict(zip((f"p{percent:g}" for percent in percents),
+                                              percentiles(values, percents)))
+            summary["histogram"] = dict(zip(("edges", "counts"), histogram(values, bins)))
+            return summary
+
+        return {
+            "saves": len(self),
+            "players": len(self.player_ids),
+            "teams": len(self.team_names),
+            "backend": "numpy" if get_numpy() is not None else "array",
+            "save_columns": {name: summarize(values) for name, values in self.save_columns.items()},
+            "player_columns": {name: summarize(values) for name, values in self.player_columns.items()},
+            "items": self.item_ownership(),
+        }
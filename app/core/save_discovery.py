@@ -0,0 +1,319 @@
+"""
+Finding the game's save folders outside Windows.
+
+Under Proton the game runs in a Wine prefix per Steam library:
+
+    <library>/steamapps/compatdata/<app id>/pfx/drive_c/users/<user>/AppData/LocalLow/semiwork/Repo/saves
+
+The Steam libraries are listed in libraryfolders.vdf in the Steam folder, which
+may be a native, Flatpak or Snap install. Plain Wine prefixes (~/.wine and
+$WINEPREFIX) are searched as well. Libraries are searched in parallel, since
+they are often on different disks.
+
+The folders found are cached together with the mtime of every file and folder
+whose contents the search depended on (the .vdf files, compatdata folders and
+prefix user folders). While none of those changed, later startups reuse the
+cached result after a handful of stat calls instead of searching again.
+"""
+
+import os
+import re
+
+from . import atomic_io
+from . import json_engine
+
+
+REPO_APP_ID = "3241660"
+
+# Where the game keeps its saves inside a Windows user folder
+SAVES_RELATIVE_PATH = os.path.join("AppData", "LocalLow", "semiwork", "Repo", "saves")
+
+CACHE_VERSION = 1
+CACHE_FILE_NAME = "save_discovery.json"
+
+_VDF_TOKEN = re.compile(r'"((?:[^"\\]|\\.)*)"|([{}])|//[^\n]*|\s+|([^\s{}"]+)')
+
+
+def parse_vdf(text):
+    """
+    Parse Valve's KeyValues text format, as used by libraryfolders.vdf
+
+    Args:
+        text (str): File contents
+
+    Returns:
+        dict: Nested dicts of string values, keys as written
+
+    Raises:
+        ValueError: If the braces do not match
+    """
+    root = {}
+    stack = [root]
+    key = None
+    for match in _VDF_TOKEN.finditer(text):
+        quoted, brace, bare = match.groups()
+        if brace == "{":
+            child = {}
+            stack[-1][key if key is not None else ""] = child
+            stack.append(child)
+            key = None
+        elif brace == "}":
+            if len(stack) == 1:
+                raise ValueError("Unmatched closing brace")
+            stack.pop()
+            key = None
+        elif quoted is not None or bare is not None:
+            value = bare if quoted is None else re.sub(r'\\(.)', r'\1', quoted)
+            if key is None:
+                key = value
+            else:
+                stack[-1][key] = value
+                key = None
+    if len(stack) != 1:
+        raise ValueError("Unclosed brace")
+    return root
+
+
+def steam_roots():
+    """
+    List the Steam installs of the current user
+
+    Returns:
+        list: Existing Steam folders, each once even when reached through several links
+    """
+    home = os.path.expanduser("~")
+    candidates = [
+        os.path.join(home, ".steam", "steam"),
+        os.path.join(home, ".steam", "root"),
+        os.path.join(home, ".local", "share", "Steam"),
+        os.path.join(home, ".var", "app", "com.valvesoftware.Steam", ".local", "share", "Steam"),
+        os.path.join(home, "snap", "steam", "common", ".local", "share", "Steam"),
+        os.path.join(home, "Library", "Application Support", "Steam"),
+    ]
+    roots = {}
+    for path in candidates:
+        if os.path.isdir(path):
+            roots.setdefault(os.path.realpath(path), path)
+    return list(roots)
+
+
+def _library_files(steam_root):
+    """libraryfolders.vdf files of a Steam install, newest layout first"""
+    return [os.path.join(steam_root, "steamapps", "libraryfolders.vdf"),
+            os.path.join(steam_root, "config", "libraryfolders.vdf")]
+
+
+def library_folders(steam_root):
+    """
+    List the Steam libraries of an install
+
+    Args:
+        steam_root (str): Steam folder
+
+    Returns:
+        list: Library folders, the install itself first
+    """
+    libraries = [steam_root]
+    for vdf_path in _library_files(steam_root):
+        try:
+            with open(vdf_path, 'r', encoding='utf-8', errors='replace') as file_obj:
+                data = parse_vdf(file_obj.read())
+        except OSError:
+            continue
+        except ValueError as e:
+            print(f"Could not parse {vdf_path}: {str(e)}")
+            continue
+
+        folders = next((value for key, value in data.items() if key.lower() == "libraryfolders"), {})
+        for key, value in folders.items():
+            # Current format: "0" { "path" "..." }, old format: "1" "..."
+            if isinstance(value, dict):
+                path = next((item for name, item in value.items() if name.lower() == "path"), None)
+            elif key.isdigit():
+                path = value
+            else:
+                path = None
+            if path and path not in libraries:
+                libraries.append(path)
+    return libraries
+
+
+def _prefix_saves(prefix, stamps):
+    """Saves folders of every user in a Wine prefix, recording the mtimes the result depends on"""
+    users = os.path.join(prefix, "drive_c", "users")
+    try:
+        stamps[users] = os.stat(users).st_mtime_ns
+        names = sorted(os.listdir(users))
+    except OSError:
+        stamps[users] = None
+        return []
+    folders = []
+    for name in names:
+        # Stamped even when missing, the game creates it on first start
+        folder = os.path.join(users, name, SAVES_RELATIVE_PATH)
+        stamps[folder] = _stamp(folder)
+        if stamps[folder] is not None and os.path.isdir(folder):
+            folders.append(folder)
+    return folders
+
+
+def _search_library(library, app_id):
+    """
+    Search a Steam library's Proton prefix for the game
+
+    Returns:
+        tuple: (saves folders, {path: mtime_ns or None} the result depends on)
+    """
+    stamps = {}
+    compatdata = os.path.join(library, "steamapps", "compatdata")
+    try:
+        stamps[compatdata] = os.stat(compatdata).st_mtime_ns
+    except OSError:
+        stamps[compatdata] = None
+        return [], stamps
+    prefix = os.path.join(compatdata, app_id, "pfx")
+    return _prefix_saves(prefix, stamps), stamps
+
+
+def wine_prefixes():
+    """Plain Wine prefixes the game may have been installed in"""
+    prefixes = [os.path.join(os.path.expanduser("~"), ".wine")]
+    if os.environ.get("WINEPREFIX"):
+        prefixes.insert(0, os.environ["WINEPREFIX"])
+    return list(dict.fromkeys(prefixes))
+
+
+def _stamp(path):
+    """mtime of a path, or None if it does not exist"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def search_save_folders(app_id=REPO_APP_ID, max_workers=8):
+    """
+    Search every Steam library and Wine prefix for the game's saves folders
+
+    Args:
+        app_id (str, optional): Steam app id of the game. Defaults to R.E.P.O.'s.
+        max_workers (int, optional): Libraries searched at once. Defaults to 8.
+
+    Returns:
+        tuple: (saves folders, {path: mtime_ns or None} of everything the result depends on)
+    """
+    stamps = {}
+    libraries = []
+    for steam_root in steam_roots():
+        for vdf_path in _library_files(steam_root):
+            stamps[vdf_path] = _stamp(vdf_path)
+        for library in library_folders(steam_root):
+            if library not in libraries:
+                libraries.append(library)
+
+    folders = []
+    if len(libraries) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(libraries))) as executor:
+            results = list(executor.map(lambda library: _search_library(library, app_id), libraries))
+    else:
+        results = [_search_library(library, app_id) for library in libraries]
+    for library_folders_found, library_stamps in results:
+        folders.extend(library_folders_found)
+        stamps.update(library_stamps)
+
+    for prefix in wine_prefixes():
+        folders.extend(_prefix_saves(prefix, stamps))
+
+    # Steam installs found on a later start must invalidate the cache too
+    home = os.path.expanduser("~")
+    for path in (os.path.join(home, ".steam"), os.path.join(home, ".local", "share"),
+                 os.path.join(home, ".var", "app"), os.path.join(home, "snap")):
+        stamps.setdefault(path, _stamp(path))
+    return list(dict.fromkeys(folders)), stamps
+
+
+class SaveDiscovery:
+    """
+    Finds the game's saves folders, caching the result in <cache_dir>/save_discovery.json
+    """
+
+    def __init__(self, cache_dir=None, app_id=REPO_APP_ID):
+        """
+        Initialize the discovery
+
+        Args:
+            cache_dir (str, optional): Folder of the cache file. Defaults to app/resources/cache.
+            app_id (str, optional): Steam app id of the game. Defaults to R.E.P.O.'s.
+        """
+        from .save_index import default_cache_dir
+
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.cache_file = os.path.join(self.cache_dir, CACHE_FILE_NAME)
+        self.app_id = app_id
+
+    def _load_cache(self):
+        """Cached folders if nothing they depend on changed, else None"""
+        try:
+            with open(self.cache_file, 'rb') as file_obj:
+                data = json_engine.loads(file_obj.read())
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != CACHE_VERSION or data.get("app_id") != self.app_id:
+            return None
+        if data.get("home") != os.path.expanduser("~") or data.get("wineprefix") != os.environ.get("WINEPREFIX"):
+            return None
+        for path, stamp in data["stamps"].items():
+            if _stamp(path) != stamp:
+                return None
+        folders = data["folders"]
+        if not all(os.path.isdir(folder) for folder in folders):
+            return None
+        return folders
+
+    def _save_cache(self, folders, stamps):
+        """Write the result and what it depends on"""
+        data = {
+            "version": CACHE_VERSION,
+            "app_id": self.app_id,
+            "home": os.path.expanduser("~"),
+            "wineprefix": os.environ.get("WINEPREFIX"),
+            "folders": folders,
+            "stamps": stamps,
+        }
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            atomic_io.atomic_write(self.cache_file, [json_engine.dumps(data)], durable=False)
+        except Exception as e:
+            print(f"Error saving save discovery cache: {str(e)}")
+
+    def find(self, refresh=False):
+        """
+        Get the game's saves folders
+
+        Args:
+            refresh (bool, optional): Search again even if the cached result is current. Defaults to False.
+
+        Returns:
+            list: Saves folders, the most recently changed first
+        """
+        folders = None if refresh else self._load_cache()
+        if folders is None:
+            folders, stamps = search_save_folders(self.app_id)
+            self._save_cache(folders, stamps)
+        return sorted(folders, key=lambda folder: _stamp(folder) or 0, reverse=True)
+
+
+def discover_save_folders(refresh=False, cache_dir=None):
+    """
+    Get the game's saves folders on this machine, see SaveDiscovery
+
+    Args:
+        refresh (bool, optional): Search again even if the cached result is current. Defaults to False.
+        cache_dir (str, optional): Folder of the cache file. Defaults to app/resources/cache.
+
+    Returns:
+        list: Saves folders, the most recently changed first
+    """
+    return SaveDiscovery(cache_dir).find(refresh)
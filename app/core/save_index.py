@@ -0,0 +1,219 @@
+"""
+Persistent index of save summaries for the save browser.
+
+Showing a save's team name, level, currency, players and time played means
+decrypting it. The index keeps those fields for every save it has seen in one
+JSON file in the cache folder, each entry stamped with the size and mtime of
+the file it was read from. An entry is only used while the file still has the
+same size and mtime, so listing thousands of saves costs one stat per save, and
+only new or changed saves are decoded again (in parallel, see
+SaveManager.refresh_save_index).
+"""
+
+import os
+import threading
+
+from . import atomic_io
+from . import json_engine
+
+
+INDEX_VERSION = 1
+INDEX_FILE_NAME = "save_index.json"
+
+# Fields of a summary besides the file's size and mtime
+SUMMARY_FIELDS = ("team_name", "level", "currency", "players", "time_played", "date")
+
+
+def default_cache_dir():
+    """Cache folder shared with the user and avatar caches"""
+    app_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    return os.path.join(app_dir, 'resources', 'cache')
+
+
+def _index_key(path):
+    """Key of a save in the index"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _wrapped_value(data, key):
+    """Value of an ES3 {"__type": ..., "value": ...} entry, or None"""
+    entry = data.get(key)
+    return entry.get("value") if isinstance(entry, dict) else None
+
+
+def summarize_document(data):
+    """
+    Pick the summary fields out of a save document
+
+    Args:
+        data (dict): Save document
+
+    Returns:
+        dict: team_name, level, currency, players (names), time_played and date
+    """
+    dictionaries = _wrapped_value(data, "dictionaryOfDictionaries") or {}
+    run_stats = dictionaries.get("runStats") or {}
+    names = _wrapped_value(data, "playerNames") or {}
+    return {
+        "team_name": _wrapped_value(data, "teamName"),
+        "level": run_stats.get("level"),
+        "currency": run_stats.get("currency"),
+        "players": [str(name) for name in names.values()],
+        "time_played": _wrapped_value(data, "timePlayed"),
+        "date": _wrapped_value(data, "dateAndTime"),
+    }
+
+
+def _summarize_file(save_manager, path, password, summarize=summarize_document):
+    """
+    Decode one save and summarize it with summarize(document)
+
+    Returns:
+        BatchResult: The index entry, stamped with the size and mtime the file had before it was read
+    """
+    # Only batch workers summarize files, keep the pool machinery out of startup
+    from .batch import BatchResult
+
+    try:
+        with open(path, 'rb') as file_obj:
+            stat = os.fstat(file_obj.fileno())
+            payload = save_manager._decode_es3_file(file_obj, password, path)
+        entry = summarize(json_engine.loads(payload))
+        entry["size"] = stat.st_size
+        entry["mtime_ns"] = stat.st_mtime_ns
+        return BatchResult(path, entry, container=save_manager.get_container_format(path))
+    except Exception as e:
+        return BatchResult(path, error=f"{type(e).__name__}: {str(e)}")
+
+
+class SaveIndex:
+    """
+    Summaries of save files, kept in <cache_dir>/save_index.json. Safe to use from
+    several threads.
+
+    Subclasses index other fields by changing file_name, version and summarize,
+    and keep data derived from the entries up to date in _entry_changed.
+    """
+
+    file_name = INDEX_FILE_NAME
+    version = INDEX_VERSION
+    # Module-level function making an entry from a save document, run in batch workers
+    summarize = staticmethod(summarize_document)
+
+    def __init__(self, cache_dir=None):
+        """
+        Initialize the index, loading the index file if there is one
+
+        Args:
+            cache_dir (str, optional): Folder of the index file. Defaults to app/resources/cache.
+        """
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.index_file = os.path.join(self.cache_dir, self.file_name)
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        """Load the index file, starting empty if it is missing or unreadable"""
+        entries = {}
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'rb') as file_obj:
+                    data = json_engine.loads(file_obj.read())
+                if data.get("version") == self.version:
+                    entries = data["entries"]
+                else:
+                    print(f"{self.file_name} has an old format, rebuilding it")
+            except Exception as e:
+                print(f"Error loading {self.file_name}: {str(e)}")
+        with self._lock:
+            self.entries = entries
+            self._dirty = False
+            self._entries_reset()
+
+    def save(self):
+        """
+        Write the index file if anything changed, dropping saves that no longer exist
+
+        Returns:
+            bool: True if the index is on disk
+        """
+        with self._lock:
+            if not self._dirty:
+                return True
+            for key in [key for key in self.entries if not os.path.exists(key)]:
+                self._entry_changed(key, self.entries.pop(key), None)
+            payload = json_engine.dumps({"version": self.version, "entries": self.entries})
+            self._dirty = False
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            atomic_io.atomic_write(self.index_file, [payload], durable=False)
+            return True
+        except Exception as e:
+            print(f"Error saving {self.file_name}: {str(e)}")
+            with self._lock:
+                self._dirty = True
+            return False
+
+    def lookup(self, path):
+        """
+        Get the summary of a save if it is still current
+
+        Args:
+            path (str): Save file
+
+        Returns:
+            dict: The index entry, or None if the save is not indexed or changed since
+        """
+        with self._lock:
+            entry = self.entries.get(_index_key(path))
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_size != entry["size"] or stat.st_mtime_ns != entry["mtime_ns"]:
+            return None
+        return entry
+
+    def stale(self, paths):
+        """
+        Find the saves that need decoding
+
+        Args:
+            paths (iterable): Save files
+
+        Returns:
+            list: The paths without a current entry
+        """
+        return [path for path in paths if self.lookup(path) is None]
+
+    def update(self, path, entry):
+        """
+        Store the summary of a save
+
+        Args:
+            path (str): Save file
+            entry (dict): Summary with size and mtime_ns, as made by _summarize_file
+        """
+        key = _index_key(path)
+        with self._lock:
+            old_entry = self.entries.get(key)
+            self.entries[key] = entry
+            self._dirty = True
+            self._entry_changed(key, old_entry, entry)
+
+    def clear(self):
+        """Forget every entry"""
+        with self._lock:
+            self.entries = {}
+            self._dirty = True
+            self._entries_reset()
+
+    def _entry_changed(self, key, old_entry, new_entry):
+        """Called with the lock held when an entry is added (old_entry None), replaced or removed (new_entry None)"""
+
+    def _entries_reset(self):
+        """Called with the lock held when all entries were replaced"""
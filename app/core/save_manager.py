@@ -1,17 +1,25 @@
 import json
 import os
-from Crypto.Cipher import AES
-from Crypto.Protocol.KDF import PBKDF2
-from Crypto.Util.Padding import pad, unpad
-from Crypto.Hash import HMAC, SHA1
-import gzip
+import hashlib
 import sys
+import threading
+from collections import OrderedDict
 
+from . import atomic_io
+from . import crypto_backend
+from . import es3_codec
+from . import json_engine
+from .backup_store import BackupStore, STORE_FOLDER_NAME
+from .document_cache import DocumentCache
+from .save_transaction import SaveTransaction
 
 
 # Default game save password
 DEFAULT_PASSWORD = "Why would you want to cheat?... :o It's no fun. :') :'D"
 
+# Number of derived AES keys remembered per (password, IV) pair
+DEFAULT_KEY_CACHE_SIZE = 256
+
 class SaveManager:
     """
     Handles ES3 file operations for the Repo game saves, including:
@@ -20,17 +28,110 @@ class SaveManager:
     - Managing save file operations
     """
     
-    def __init__(self):
-        # Initialize default paths and settings
-        self.default_save_path = self._get_save_folder()
+    def __init__(self, key_cache_size=DEFAULT_KEY_CACHE_SIZE, zero_copy=False, atomic_writes=True,
+                 backup_root=None, backup_options=None, compact_json=True,
+                 compress_level=es3_codec.DEFAULT_COMPRESS_LEVEL, journal_dir=None, recover_journal=True,
+                 candidate_passwords=None):
+        """
+        Initialize the save manager
+        
+        Args:
+            key_cache_size (int, optional): Number of derived keys to cache. Defaults to 256.
+            zero_copy (bool, optional): Decode through mmap into preallocated buffers and write
+                with a single vectored write, instead of streaming in fixed-size chunks.
+                Fewer copies, but the whole payload is held in memory. Defaults to False.
+            atomic_writes (bool, optional): Write saves to a temporary file, fsync it and rename it
+                over the target, so a crash never leaves a truncated save. Defaults to True.
+            backup_root (str, optional): Folder for a single backup store shared by all saves.
+                Defaults to None, which keeps a store in a .backups folder inside each save folder.
+            backup_options (dict, optional): Extra BackupStore arguments such as compression,
+                max_versions and max_bytes. Defaults to None.
+            compact_json (bool, optional): Write JSON without whitespace after separators.
+                Defaults to True, False writes exactly what json.dumps produces by default.
+            compress_level (int, optional): Gzip level used when writing compressed saves. Defaults to 9.
+            journal_dir (str, optional): Folder for the records of multi-file transactions.
+                Defaults to ~/.reposavemodifier/journal.
+            recover_journal (bool, optional): Finish or undo multi-file transactions interrupted
+                by a crash. Defaults to True.
+            candidate_passwords (list, optional): Other passwords saves may use, e.g. from other
+                builds or mods. Each encrypted save is opened with whichever candidate (or the
+                default password) matches it, see identify_password. Defaults to None.
+        """
+        # Initialize default paths and settings, the save folder is looked up on first use
+        self._default_save_path = None
+        self._default_save_path_found = False
         self.password = DEFAULT_PASSWORD
-        self.should_gzip = False  # Default compression setting
-        print(f"Default save path: {self.default_save_path}")
+        self.candidate_passwords = list(candidate_passwords or [])
+        self._folder_passwords = {}  # Folder -> password that opened a save in it
+        self._password_pool = None
+        self.should_gzip = False  # Compression for new saves, existing saves keep their format
+        self.compress_level = compress_level
+        self.zero_copy = zero_copy
+        self.atomic_writes = atomic_writes
+        self.compact_json = compact_json
+        
+        # Container format (plain, gzip, encrypted, encrypted+gzip) of every file decoded or written
+        self.container_formats = {}
+        
+        # Decoded documents shared between load, compare and verify passes
+        self.document_cache = DocumentCache()
+        
+        # Derived AES keys keyed by (password digest, IV), so re-reading a file skips PBKDF2
+        self.key_cache_size = key_cache_size
+        self._key_cache = OrderedDict()
+        self._key_cache_lock = threading.Lock()
+        self.key_cache_hits = 0
+        self.key_cache_misses = 0
+        
+        # Versioned backup stores, keyed by their root folder
+        self.backup_root = backup_root
+        self.backup_options = dict(backup_options or {})
+        self._backup_stores = {}
+        
+        # Journal of multi-file transactions, see save_many
+        self.journal_dir = journal_dir
+        self._journal = None
+        self.last_transaction = None
+        
+        # Summaries of saves for the save browser, see get_save_index
+        self._save_index = None
+        # Inverted index of Steam IDs, team names and values, see get_term_index
+        self._term_index = None
+        # Run stats, upgrades and items for analytics, see get_stats_index
+        self._stats_index = None
+        
+        # Per-phase timings of the most recent save_es3_from_json call
+        self.last_save_timings = {}
+        print(f"Crypto backend: {self.get_crypto_backend_name()}")
+        print(f"JSON engine: {json_engine.get_engine().name}")
         
-        # Verify the path exists
-        if self.default_save_path and os.path.exists(self.default_save_path):
-            print(f"Default save path exists: {os.path.exists(self.default_save_path)}")
-            print(f"Contents: {os.listdir(self.default_save_path)}")
+        if recover_journal:
+            self.recover_transactions()
+    
+    @property
+    def default_save_path(self):
+        """
+        The game's save folder, looked up on first use. Outside Windows that searches
+        Proton and Wine prefixes, which batch workers and most commands never need.
+        
+        Returns:
+            str: Path to the save folder, or None if there is none
+        """
+        if not self._default_save_path_found:
+            self._default_save_path = self._get_save_folder()
+            self._default_save_path_found = True
+            print(f"Default save path: {self._default_save_path}")
+            
+            # Verify the path exists
+            if self._default_save_path and os.path.exists(self._default_save_path):
+                print(f"Default save path exists: {os.path.exists(self._default_save_path)}")
+                print(f"Contents: {os.listdir(self._default_save_path)}")
+        return self._default_save_path
+    
+    @default_save_path.setter
+    def default_save_path(self, path):
+        self._default_save_path = path
+        self._default_save_path_found = True
     
     def decrypt_es3(self, path, pwd=None):
         """
@@ -43,32 +144,266 @@ class SaveManager:
         Returns:
             bytes: The decrypted (and possibly decompressed) data.
         """
-        # Use the class password if none is provided
-        decryption_pwd = pwd or self.password
+        # Use the password that opens this save if none is provided
+        decryption_pwd = pwd or self.password_for(path)
 
-        # Read the entire file content as binary data
-        with open(path, 'rb') as file_obj:
-            file_bytes = file_obj.read()
+        # Reuse the decoded bytes if this exact file was decoded before
+        entry = self.document_cache.get(path, decryption_pwd,
+                                        lambda file_obj: self._decode_es3_file(file_obj, decryption_pwd, path))
+        plaintext = entry.plaintext
+        
+        # Zero-copy decodes are kept in a bytearray, don't hand out the cached buffer
+        if isinstance(plaintext, bytearray):
+            plaintext = bytes(plaintext)
+        return plaintext
 
-        # The first 16 bytes are used as the initialization vector (IV)
-        init_vector = file_bytes[:16]
-        cipher_text = file_bytes[16:]
+    def _decode_es3_file(self, file_obj, decryption_pwd, path=None):
+        """
+        Decodes an open save file in any container format.
 
-        # Derive a 16-byte AES key using PBKDF2 with the IV as the salt
-        derived_key = PBKDF2(decryption_pwd, init_vector, dkLen=16, count=100,
-                            prf=lambda p, s: HMAC.new(p, s, SHA1).digest())
+        Parameters:
+            file_obj (file): Binary file object positioned at the start of the ES3 file.
+            decryption_pwd (str): The decryption password.
+            path (str, optional): Path of the file, to remember its container format.
 
-        # Set up the AES cipher in CBC mode and decrypt the ciphertext
-        aes_decipher = AES.new(derived_key, AES.MODE_CBC, init_vector)
-        plaintext = unpad(aes_decipher.decrypt(cipher_text), AES.block_size)
+        Returns:
+            bytes: The decrypted (and possibly decompressed) data.
+        """
+        # The header decides the format, plain JSON is never run through the decryptor.
+        # Encrypted files are decrypted straight from a mapped file in zero-copy mode,
+        # otherwise the codec decrypts and gunzips them in fixed-size chunks.
+        plaintext, container = es3_codec.decode_file(file_obj, decryption_pwd, derive_key=self._derive_key,
+                                                     mapped=self.zero_copy)
+        if path:
+            self._remember_container(path, container)
+        return plaintext
 
-        # If the decrypted data is GZip compressed, decompress it
-        if plaintext.startswith(b'\x1f\x8b'):  # GZip magic number
-            plaintext = gzip.decompress(plaintext)
+    def _decode_es3_buffer(self, buffer, decryption_pwd, path=None):
+        """
+        Decodes save data in any container format that is already in memory.
+
+        Parameters:
+            buffer (bytes-like): The raw file contents.
+            decryption_pwd (str): The decryption password.
+            path (str, optional): Path the data was read from, to remember its container format.
 
+        Returns:
+            bytes-like: The decrypted (and possibly decompressed) data.
+        """
+        plaintext, container = es3_codec.decode_container(buffer, decryption_pwd, derive_key=self._derive_key)
+        if path:
+            self._remember_container(path, container)
         return plaintext
 
-    def encrypt_es3_file(self, data, output_path=None, pwd=None, compress=None):
+    def _password_candidates(self, folder=None):
+        """Passwords to try, the one known to work in the folder first"""
+        candidates = [self._folder_passwords.get(folder), self.password] + self.candidate_passwords
+        ordered = []
+        for candidate in candidates:
+            if candidate is not None and candidate not in ordered:
+                ordered.append(candidate)
+        return ordered
+
+    def identify_password(self, file_path, candidates=None):
+        """
+        Find which candidate password opens an encrypted save
+        
+        Each candidate costs a key derivation and two block decryptions: the last
+        block must have valid padding and the first must start JSON or gzip data
+        (see es3_codec.probe_password). The password last found in the same folder
+        is tried first, the rest are tried in parallel. The winner is remembered
+        for the folder.
+        
+        Args:
+            file_path (str): Path to the save file
+            candidates (list, optional): Passwords to try. Defaults to the known
+                password of the folder, the default password and candidate_passwords.
+            
+        Returns:
+            str: The matching password, None if no candidate matches. Unencrypted
+                saves need no password and return the default one.
+        """
+        folder = self._container_key(os.path.dirname(file_path) or ".")
+        candidates = candidates or self._password_candidates(folder)
+        
+        try:
+            with open(file_path, 'rb') as file_obj:
+                head, tail, total_size = es3_codec.read_probe(file_obj)
+            container = es3_codec.sniff_container(head, total_size)
+        except (OSError, ValueError) as e:
+            print(f"Could not identify password for {file_path}: {str(e)}")
+            return None
+        if not es3_codec.is_encrypted(container):
+            return self.password
+        
+        def probe(candidate):
+            return es3_codec.probe_password(head, tail, candidate, derive_key=self._derive_key)
+        
+        # Saves in one folder almost always share a password, so try that one alone first
+        password = candidates[0] if probe(candidates[0]) else None
+        remaining = candidates[1:]
+        if password is None and len(remaining) == 1:
+            password = remaining[0] if probe(remaining[0]) else None
+        elif password is None and remaining:
+            password = self._probe_in_parallel(probe, remaining)
+        
+        if password is None:
+            print(f"None of the {len(candidates)} candidate passwords opens {file_path}")
+            return None
+        self._folder_passwords[folder] = password
+        return password
+
+    def _probe_in_parallel(self, probe, candidates):
+        """
+        Test candidates on a thread pool, key derivation and AES release the GIL
+        
+        Returns:
+            str: The first candidate in order that passes, or None
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        
+        if self._password_pool is None:
+            self._password_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1),
+                                                     thread_name_prefix="password-probe")
+        futures = [self._password_pool.submit(probe, candidate) for candidate in candidates]
+        try:
+            for candidate, future in zip(candidates, futures):
+                if future.result():
+                    return candidate
+            return None
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def password_for(self, file_path):
+        """
+        Get the password to open or write a save with
+        
+        Without candidate passwords this is always the default password. Otherwise
+        existing saves are identified with identify_password, and new files use the
+        password known to work in their folder.
+        
+        Args:
+            file_path (str): Path to the save file
+            
+        Returns:
+            str: The password, the default one if no candidate matches
+        """
+        if not self.candidate_passwords:
+            return self.password
+        if not os.path.exists(file_path):
+            folder = self._container_key(os.path.dirname(file_path) or ".")
+            return self._folder_passwords.get(folder, self.password)
+        return self.identify_password(file_path) or self.password
+
+    @staticmethod
+    def _container_key(path):
+        """Normalized path used to remember a file's container format"""
+        return os.path.normcase(os.path.abspath(path))
+
+    def _remember_container(self, path, container):
+        """Remember the container format a file was read or written in"""
+        self.container_formats[self._container_key(path)] = container
+
+    def get_container_format(self, file_path):
+        """
+        Get the container format a file was last read or written in
+        
+        Args:
+            file_path (str): Path to the save file
+            
+        Returns:
+            str: One of es3_codec.CONTAINER_FORMATS, or None if the file has not been seen
+        """
+        return self.container_formats.get(self._container_key(file_path))
+
+    def resolve_container(self, file_path, file_bytes=None, password=None, should_gzip=None):
+        """
+        Decide which container format to write a save in
+        
+        The format of the existing file wins, then the format it was loaded in,
+        then encrypted with self.should_gzip for new files. An explicit
+        should_gzip only switches compression and keeps the encryption layer.
+        
+        Args:
+            file_path (str): Path to the save file
+            file_bytes (bytes, optional): Current contents of the file, if already read
+            password (str, optional): Password to look inside encrypted files. Defaults to class password.
+            should_gzip (bool, optional): Force compression on or off. Defaults to None.
+            
+        Returns:
+            str: One of es3_codec.CONTAINER_FORMATS
+        """
+        container = None
+        if file_bytes is not None:
+            try:
+                container = es3_codec.sniff_container(file_bytes, len(file_bytes), password or self.password,
+                                                      derive_key=self._derive_key)
+            except ValueError as e:
+                print(f"Could not detect format of {file_path}: {str(e)}")
+            remembered = self.get_container_format(file_path)
+            if container == es3_codec.FORMAT_GZIP and es3_codec.is_encrypted(remembered):
+                # Decoding found the gzip-like header to be the IV of an encrypted save
+                container = remembered
+        
+        if container is None:
+            container = self.get_container_format(file_path)
+        if container is None:
+            container = es3_codec.container_for(True, self.should_gzip)
+        
+        if should_gzip is not None:
+            container = es3_codec.container_for(es3_codec.is_encrypted(container), should_gzip)
+        return container
+
+    def _derive_key(self, password, init_vector):
+        """
+        Derive the AES key for a password and IV, reusing previously derived keys
+        
+        Args:
+            password (str): The password
+            init_vector (bytes): The 16-byte IV used as PBKDF2 salt
+            
+        Returns:
+            bytes: The 16-byte AES key
+        """
+        cache_key = (hashlib.sha256(crypto_backend.password_bytes(password)).digest(), bytes(init_vector))
+        
+        with self._key_cache_lock:
+            derived_key = self._key_cache.get(cache_key)
+            if derived_key is not None:
+                self._key_cache.move_to_end(cache_key)
+                self.key_cache_hits += 1
+                return derived_key
+            self.key_cache_misses += 1
+        
+        derived_key = crypto_backend.get_backend().derive_key(password, init_vector)
+        
+        if self.key_cache_size > 0:
+            with self._key_cache_lock:
+                self._key_cache[cache_key] = derived_key
+                while len(self._key_cache) > self.key_cache_size:
+                    self._key_cache.popitem(last=False)
+        
+        return derived_key
+
+    def set_key_cache_size(self, size):
+        """
+        Change how many derived keys are cached
+        
+        Args:
+            size (int): Maximum number of cached keys, 0 disables caching
+        """
+        with self._key_cache_lock:
+            self.key_cache_size = max(0, size)
+            while len(self._key_cache) > self.key_cache_size:
+                self._key_cache.popitem(last=False)
+
+    def clear_key_cache(self):
+        """Forget all cached derived keys"""
+        with self._key_cache_lock:
+            self._key_cache.clear()
+
+    def encrypt_es3_file(self, data, output_path=None, pwd=None, compress=None, container=None):
         """
         Encrypts raw data into the ES3 format.
 
@@ -77,6 +412,8 @@ class SaveManager:
             output_path (str, optional): Destination file path. If provided, the encrypted data is written to the file.
             pwd (str, optional): Encryption password. Defaults to self.password if not specified.
             compress (bool, optional): Whether to GZip compress the data before encryption. Defaults to self.should_gzip.
+            container (str, optional): Container format from es3_codec.CONTAINER_FORMATS to write instead,
+                which may be unencrypted. Overrides compress. Defaults to None.
 
         Returns:
             bytes or bool: Returns the encrypted data as bytes if output_path is None, 
@@ -85,38 +422,39 @@ class SaveManager:
         # Set default password and compression setting if not provided
         encryption_pwd = pwd if pwd is not None else self.password
         use_compression = compress if compress is not None else self.should_gzip
+        if container is None:
+            container = es3_codec.container_for(True, use_compression)
+        use_compression = es3_codec.is_compressed(container)
 
-        # Optionally compress the data using gzip
-        if use_compression:
-            data = gzip.compress(data)
-
-        # Generate a 16-byte Initialization Vector (IV)
-        iv_bytes = os.urandom(16)
-
-        # Derive a 16-byte key using PBKDF2 with the IV as salt and HMAC-SHA1 as the pseudorandom function
-        encryption_key = PBKDF2(
-            encryption_pwd,
-            iv_bytes,
-            dkLen=16,
-            count=100,
-            prf=lambda p, s: HMAC.new(p, s, SHA1).digest()
-        )
-
-        # Create an AES cipher in CBC mode and encrypt the padded data
-        cipher_obj = AES.new(encryption_key, AES.MODE_CBC, iv_bytes)
-        padded_data = pad(data, AES.block_size)
-        encrypted_bytes = cipher_obj.encrypt(padded_data)
-
-        # Prepend the IV to the encrypted data
-        final_output = iv_bytes + encrypted_bytes
+        if self.zero_copy or not es3_codec.is_encrypted(container):
+            # Encode into memory and write every buffer in a single call
+            buffers = es3_codec.encode_container(data, container, encryption_pwd, derive_key=self._derive_key,
+                                                 compress_level=self.compress_level)
+            if output_path:
+                if self.atomic_writes:
+                    atomic_io.atomic_write(output_path, buffers)
+                else:
+                    with open(output_path, 'wb') as file_out:
+                        es3_codec.write_vectored(file_out, buffers)
+                self._remember_container(output_path, container)
+                return True
+            return b"".join(buffers)
+        
+        # Compress, pad and encrypt in fixed-size chunks, so only the input is held in memory
+        chunks = es3_codec.iter_chunks(data)
+        encoded = es3_codec.iter_encode(chunks, encryption_pwd, derive_key=self._derive_key,
+                                        compress=use_compression, compress_level=self.compress_level)
 
         # Write the output to a file if a path is provided, else return the encrypted bytes
         if output_path:
-            with open(output_path, 'wb') as file_out:
-                file_out.write(final_output)
+            writer = atomic_io.AtomicWriter(output_path) if self.atomic_writes else open(output_path, 'wb')
+            with writer as file_out:
+                for piece in encoded:
+                    file_out.write(piece)
+            self._remember_container(output_path, container)
             return True
 
-        return final_output
+        return b"".join(encoded)
 
     def load_json_from_es3(self, file_path, password=None):
         """
@@ -130,15 +468,14 @@ class SaveManager:
             dict: Parsed JSON data or None if unsuccessful
         """
         try:
-            # Decrypt the file
+            # Decrypt the file, or reuse a previous decode of the same contents
             print(f"Attempting to decrypt {file_path}")
-            decrypted_data = self.decrypt_es3(file_path, password)
-            
-            # Convert bytes to string
-            json_string = decrypted_data.decode('utf-8')
+            decryption_pwd = password or self.password_for(file_path)
             
-            # Convert decrypted data to JSON
-            json_data = json.loads(json_string)
+            # Callers own the returned data, so hand out a fresh copy of the document
+            json_data = self.document_cache.load_copy(
+                file_path, decryption_pwd,
+                lambda file_obj: self._decode_es3_file(file_obj, decryption_pwd, file_path))
             print("Successfully loaded JSON data")
             return json_data
                 
@@ -146,6 +483,48 @@ class SaveManager:
             print(f"Error during decryption or JSON conversion: {str(e)}")
             return None
 
+    def _load_shared_document(self, file_path, password=None):
+        """
+        Load the cached, read-only JSON document for an ES3 file
+        
+        Args:
+            file_path (str): Path to the ES3 file
+            password (str, optional): Password for decryption. Defaults to class password.
+            
+        Returns:
+            dict: Shared parsed JSON data (must not be modified) or None if unsuccessful
+        """
+        try:
+            decryption_pwd = password or self.password_for(file_path)
+            return self.document_cache.get_document(
+                file_path, decryption_pwd,
+                lambda file_obj: self._decode_es3_file(file_obj, decryption_pwd, file_path))
+        except Exception as e:
+            print(f"Error during decryption or JSON conversion: {str(e)}")
+            return None
+
+    def get_crypto_backend_name(self):
+        """
+        Get the name of the active crypto backend
+        
+        Returns:
+            str: Backend name such as "hashlib+pycryptodome"
+        """
+        return crypto_backend.get_backend().name
+
+    def get_cache_stats(self):
+        """
+        Get hit/miss statistics for the decoded document and derived key caches
+        
+        Returns:
+            dict: Cache counters and current sizes
+        """
+        stats = self.document_cache.stats()
+        stats["key_hits"] = self.key_cache_hits
+        stats["key_misses"] = self.key_cache_misses
+        stats["keys"] = len(self._key_cache)
+        return stats
+
     def save_es3_from_json(self, data, file_path, password=None, should_gzip=None, create_backup=True, debug_compare=True, debug_player_stats=True):
         """
         Save JSON data back to an ES3 encrypted file
@@ -163,79 +542,106 @@ class SaveManager:
             bool: True if successful, False otherwise
         """
         try:
-            # Compare player stats specifically if enabled
-            if debug_player_stats and os.path.exists(file_path):
-                self.compare_player_stats(file_path, data)
-            
-            # Compare all data differences if debug is enabled
-            elif debug_compare and os.path.exists(file_path):
-                self.compare_save_data(file_path, data)
-                
-            # Convert JSON to string, then to bytes
-            json_bytes = json.dumps(data).encode('utf-8')
-            
-            # Create backup of original file if requested
-            if create_backup and os.path.exists(file_path):
-                backup_path = file_path + ".backup"
-                
-                # Remove existing backup file if it exists
-                if os.path.exists(backup_path):
-                    try:
-                        os.remove(backup_path)
-                        print(f"Removed existing backup: {backup_path}")
-                    except Exception as e:
-                        print(f"Warning: Could not remove existing backup: {str(e)}")
-                
-                # Now create the backup
-                try:
-                    import shutil
-                    shutil.copy2(file_path, backup_path)
-                    print(f"Backup created: {backup_path}")
-                except Exception as e:
-                    print(f"Warning: Could not create backup: {str(e)}")
-            
-            # Encrypt and save the data - this will overwrite the original file
-            print(f"Overwriting original file: {file_path}")
-            success = self.encrypt_es3(json_bytes, file_path, password, should_gzip)
+            # Read and decode the original once, verify in memory, then write
+            transaction = SaveTransaction(self, file_path, password, should_gzip)
+            success = transaction.commit(data, create_backup, debug_compare, debug_player_stats)
+            self.last_save_timings = transaction.timings
             
-            if success:
-                print(f"Successfully saved to: {file_path}")
-                
-                # Verify the saved file by decrypting it and comparing to the original data
-                if debug_compare:
-                    print("Verifying saved file...")
-                    try:
-                        saved_data = self.load_json_from_es3(file_path)
-                        if saved_data == data:
-                            print("✅ Verification successful: Saved data matches expected data")
-                        else:
-                            print("❌ Verification failed: Saved data does not match expected data")
-                    except Exception as e:
-                        print(f"❌ Verification error: {str(e)}")
-                
-                return True
-            else:
+            if not success:
                 print(f"Failed to save to: {file_path}")
-                return False
+            return success
                 
         except Exception as e:
             print(f"Error during encryption or saving: {str(e)}")
             return False
     
+    def get_backup_store(self, file_path):
+        """
+        Get the backup store that holds the history of a save file
+        
+        Args:
+            file_path (str): Path to the ES3 save file
+            
+        Returns:
+            BackupStore: The shared store, or the store inside the save's folder
+        """
+        if self.backup_root:
+            root = self.backup_root
+        else:
+            root = os.path.join(os.path.dirname(os.path.abspath(file_path)), STORE_FOLDER_NAME)
+        
+        store = self._backup_stores.get(root)
+        if store is None:
+            store = BackupStore(root, **self.backup_options)
+            self._backup_stores[root] = store
+        return store
+
+    def list_backups(self, file_path):
+        """
+        List the backed up versions of a save file
+        
+        Args:
+            file_path (str): Path to the ES3 save file
+            
+        Returns:
+            list: Backup index entries, newest first
+        """
+        return self.get_backup_store(file_path).versions(file_path)
+
+    def restore_backup(self, file_path, version_id=None, password=None, should_gzip=None):
+        """
+        Restore a save file from its backup store
+        
+        The current file is backed up first, so a restore can itself be undone.
+        
+        Args:
+            file_path (str): Path to the ES3 save file
+            version_id (str, optional): Version to restore. Defaults to the newest backup.
+            password (str, optional): Password for encryption. Defaults to class password.
+            should_gzip (bool, optional): Whether to compress the data. Defaults to class setting.
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            store = self.get_backup_store(file_path)
+            if version_id is None:
+                versions = store.versions(file_path)
+                if not versions:
+                    print(f"No backups found for: {file_path}")
+                    return False
+                version_id = versions[0]["id"]
+            
+            data = json_engine.loads(store.read(version_id))
+            print(f"Restoring backup {version_id} to: {file_path}")
+            return self.save_es3_from_json(data, file_path, password, should_gzip,
+                                           create_backup=True, debug_compare=True, debug_player_stats=False)
+        except Exception as e:
+            print(f"Error restoring backup: {str(e)}")
+            return False
+
     def _get_save_folder(self):
         """
-        Returns the default save location for Repo game files
+        Returns the default save location for Repo game files. Outside Windows this is
+        the most recently changed saves folder in a Proton or Wine prefix, see save_discovery.
         
         Returns:
-            str: Path to the save folder
+            str: Path to the save folder, or None if there is none
         """
         # Default location is in AppData\LocalLow\semiwork\Repo\saves
         if sys.platform == "win32":
             app_data = os.path.expandvars("%USERPROFILE%\\AppData\\LocalLow")
             save_folder = os.path.join(app_data, "semiwork", "Repo", "saves")
             return save_folder
-        # For other platforms, return None as the game is Windows-only
-        return None
+        # Elsewhere the game runs under Proton or Wine, look for its prefix
+        from .save_discovery import discover_save_folders
+
+        try:
+            folders = discover_save_folders()
+        except Exception as e:
+            print(f"Error looking for save folders: {str(e)}")
+            return None
+        return folders[0] if folders else None
 
     def list_save_files(self, folder_path=None):
         """
@@ -247,6 +653,8 @@ class SaveManager:
         Returns:
             list: List of tuples (display_name, save_folder_path, full_save_file_path)
         """
+        from .save_scanner import SaveScanner
+        
         if folder_path is None:
             folder_path = self.default_save_path
             
@@ -254,75 +662,167 @@ class SaveManager:
             print(f"Save folder does not exist: {folder_path}")
             return []
         
-        # Find all save folders
-        save_folders = []
-        
+        # Each <name>/<name>.Es3 is a save, sorted by name so the newest come first
+        # if they follow the date naming convention
         try:
             print(f"Looking for save files in: {folder_path}")
-            
-            # Get subdirectories in the saves folder
-            subdirs = [d for d in os.listdir(folder_path) 
-                      if os.path.isdir(os.path.join(folder_path, d))]
-            
-            print(f"Found subdirectories: {subdirs}")
-            
-            # Check each subdirectory for .Es3 files with matching names
-            for subdir in subdirs:
-                subdir_path = os.path.join(folder_path, subdir)
-                expected_file = f"{subdir}.Es3"
-                full_path = os.path.join(subdir_path, expected_file)
-                
-                print(f"Checking for {full_path}")
-                
-                # If the matching .Es3 file exists, add it to the list
-                if os.path.exists(full_path):
-                    print(f"Found save file: {full_path}")
-                    # Add (display_name, save_folder_path, full_save_file_path)
-                    save_folders.append((subdir, subdir_path, full_path))
-        
+            save_folders = SaveScanner(folder_path).scan()
         except Exception as e:
             print(f"Error listing save files: {str(e)}")
-        
-        # Sort by name (which should put newest first if they follow date naming convention)
-        save_folders.sort(reverse=True)
+            save_folders = []
         
         print(f"Found {len(save_folders)} save files")
         
         return save_folders
 
-    def create_temp_json(self, file_path, output_dir=None):
+    def get_save_index(self, cache_dir=None):
         """
-        Create a temporary JSON file from an ES3 save for backup/inspection
+        Get the persistent index of save summaries, loaded on first use
         
         Args:
-            file_path (str): Path to the ES3 file
-            output_dir (str, optional): Directory to save the JSON file. Defaults to the same directory.
+            cache_dir (str, optional): Folder of the index file, only used on the first call.
+                Defaults to app/resources/cache.
             
         Returns:
-            str: Path to the created JSON file, or None if unsuccessful
+            SaveIndex: The index
+        """
+        if self._save_index is None:
+            from .save_index import SaveIndex
+            
+            self._save_index = SaveIndex(cache_dir)
+        return self._save_index
+
+    def refresh_save_index(self, paths, jobs=None, ordered=False, password=None):
         """
-        json_data = self.load_json_from_es3(file_path)
+        Summarize the saves that are new or changed since they were indexed
         
-        if json_data is None:
-            return None
+        Stale saves are decoded in parallel and their entries stored as they arrive.
+        The index file is written when done, or when the caller stops early.
+        
+        Args:
+            paths (iterable): Save files, e.g. from list_save_files
+            jobs (int, optional): Worker processes, 1 decodes on this thread. Defaults to
+                the CPU count, or 1 when only a few saves are stale.
+            ordered (bool, optional): Yield results in input order instead of completion order. Defaults to False.
+            password (str, optional): Password for decryption. Defaults to the password that opens each save.
             
-        # Create output path
-        if output_dir is None:
-            output_dir = os.path.dirname(file_path)
+        Yields:
+            BatchResult: One result per stale save, its value is the new index entry
+        """
+        return self._refresh_index(self.get_save_index(), paths, jobs, ordered, password)
+
+    def get_term_index(self, cache_dir=None):
+        """
+        Get the persistent inverted index of Steam IDs, team names and dictionary values, loaded on first use
+        
+        Args:
+            cache_dir (str, optional): Folder of the index file, only used on the first call.
+                Defaults to app/resources/cache.
             
-        base_name = os.path.splitext(os.path.basename(file_path))[0]
-        output_file = os.path.join(output_dir, base_name + "_temp.json")
+        Returns:
+            SaveTermIndex: The index, see save_query for its queries
+        """
+        if self._term_index is None:
+            from .save_query import SaveTermIndex
+            
+            self._term_index = SaveTermIndex(cache_dir)
+        return self._term_index
+
+    def refresh_term_index(self, paths, jobs=None, ordered=False, password=None):
+        """
+        Index the terms of the saves that are new or changed since they were indexed,
+        the same way refresh_save_index does for summaries
         
-        # Save as JSON file
-        try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(json_data, f, indent=4)
-            return output_file
-        except Exception as e:
-            print(f"Error saving temporary JSON: {str(e)}")
-            return None
+        Args:
+            paths (iterable): Save files, e.g. from list_save_files
+            jobs (int, optional): Worker processes, 1 decodes on this thread. Defaults to
+                the CPU count, or 1 when only a few saves are stale.
+            ordered (bool, optional): Yield results in input order instead of completion order. Defaults to False.
+            password (str, optional): Password for decryption. Defaults to the password that opens each save.
+            
+        Yields:
+            BatchResult: One result per stale save, its value is the new index entry
+        """
+        return self._refresh_index(self.get_term_index(), paths, jobs, ordered, password)
+
+    def get_stats_index(self, cache_dir=None):
+        """
+        Get the persistent index of run stats, player upgrades and items for analytics, loaded on first use
         
-    def compare_save_data(self, file_path, new_data):
+        Args:
+            cache_dir (str, optional): Folder of the index file, only used on the first call.
+                Defaults to app/resources/cache.
+            
+        Returns:
+            SaveStatsIndex: The index
+        """
+        if self._stats_index is None:
+            from .save_analytics import SaveStatsIndex
+            
+            self._stats_index = SaveStatsIndex(cache_dir)
+        return self._stats_index
+
+    def refresh_stats_index(self, paths, jobs=None, ordered=False, password=None):
+        """
+        Read the numbers of the saves that are new or changed since they were indexed,
+        the same way refresh_save_index does for summaries
+        
+        Args:
+            paths (iterable): Save files, e.g. from list_save_files
+            jobs (int, optional): Worker processes, 1 decodes on this thread. Defaults to
+                the CPU count, or 1 when only a few saves are stale.
+            ordered (bool, optional): Yield results in input order instead of completion order. Defaults to False.
+            password (str, optional): Password for decryption. Defaults to the password that opens each save.
+            
+        Yields:
+            BatchResult: One result per stale save, its value is the new index entry
+        """
+        return self._refresh_index(self.get_stats_index(), paths, jobs, ordered, password)
+
+    def load_corpus(self, paths, jobs=None, password=None):
+        """
+        Load the numbers of many saves as column arrays for analytics
+        
+        Args:
+            paths (iterable): Save files, e.g. from list_save_files
+            jobs (int, optional): Worker processes for saves not indexed yet. Defaults to the CPU count.
+            password (str, optional): Password for decryption. Defaults to the password that opens each save.
+            
+        Returns:
+            SaveCorpus: The saves that could be read, see save_analytics
+        """
+        from .save_analytics import SaveCorpus
+        
+        paths = list(paths)
+        for result in self.refresh_stats_index(paths, jobs, password=password):
+            if not result.ok:
+                print(f"Skipping {result.path}: {result.error}")
+        return SaveCorpus.from_index(self.get_stats_index(), paths)
+
+    def _refresh_index(self, index, paths, jobs, ordered, password):
+        """Decode the stale saves of a SaveIndex in parallel and store their entries"""
+        from .batch import BatchCodec, DEFAULT_CHUNK_SIZE
+        from .save_index import _summarize_file
+        
+        stale = index.stale(paths)
+        if not stale:
+            return
+        if jobs is None and len(stale) <= 2 * DEFAULT_CHUNK_SIZE:
+            # Starting the pool would take longer than decoding a few saves
+            jobs = 1
+        
+        try:
+            with BatchCodec(jobs, password or self.password, self._batch_options(), save_manager=self) as codec:
+                tasks = ((path, password or self.password_for(path), type(index).summarize) for path in stale)
+                for result in codec.run(_summarize_file, tasks, ordered):
+                    if result.ok:
+                        self._remember_container(result.path, result.container)
+                        index.update(result.path, result.value)
+                    yield result
+        finally:
+            index.save()
+
+    def compare_save_data(self, file_path, new_data, original_data=None):
         """
         Compares the original save file data with the new data to be saved
         and prints out the differences.
@@ -330,14 +830,16 @@ class SaveManager:
         Args:
             file_path (str): Path to the original ES3 file
             new_data (dict): New JSON data to be saved
+            original_data (dict, optional): Already decoded original data. Loaded from file_path if None.
             
         Returns:
             bool: True if differences were found, False if files are identical
         """
         try:
             # Load the original data
-            print(f"Loading original file for comparison: {file_path}")
-            original_data = self.load_json_from_es3(file_path)
+            if original_data is None:
+                print(f"Loading original file for comparison: {file_path}")
+                original_data = self._load_shared_document(file_path)
             
             if original_data is None:
                 print("Failed to load original data for comparison")
@@ -413,21 +915,23 @@ class SaveManager:
         
         return differences
 
-    def compare_player_stats(self, file_path, new_data):
+    def compare_player_stats(self, file_path, new_data, original_data=None):
         """
         Specifically compares player statistics between the original save file and new data
         
         Args:
             file_path (str): Path to the original ES3 file
             new_data (dict): New JSON data to be saved
+            original_data (dict, optional): Already decoded original data. Loaded from file_path if None.
             
         Returns:
             bool: True if player-related differences were found, False otherwise
         """
         try:
             # Load the original data
-            print(f"Loading original file for player stats comparison: {file_path}")
-            original_data = self.load_json_from_es3(file_path)
+            if original_data is None:
+                print(f"Loading original file for player stats comparison: {file_path}")
+                original_data = self._load_shared_document(file_path)
             
             if original_data is None:
                 print("Failed to load original data for comparison")
@@ -602,22 +1106,411 @@ class SaveManager:
             import traceback
             traceback.print_exc()
             return False
-    def create_temp_json(self, file_path, output_dir=None):
+    def _batch_options(self):
+        """SaveManager arguments that batch workers need to behave like this manager"""
+        return {
+            "key_cache_size": self.key_cache_size,
+            "zero_copy": self.zero_copy,
+            "atomic_writes": self.atomic_writes,
+            "compact_json": self.compact_json,
+            "compress_level": self.compress_level,
+            "journal_dir": self.journal_dir,
+            "recover_journal": False,
+        }
+
+    def decrypt_many(self, paths, jobs=None, parse=False, output_dir=None, ordered=False, password=None,
+                     check_only=False):
+        """
+        Decode many save files in parallel
+        
+        Args:
+            paths (iterable): Save file paths
+            jobs (int, optional): Worker processes, 1 decodes on this thread. Defaults to the CPU count.
+            parse (bool, optional): Return parsed documents instead of payload bytes. Defaults to False.
+            output_dir (str, optional): Write each payload to <output_dir>/<name>.json instead. Defaults to None.
+            ordered (bool, optional): Yield results in input order instead of completion order. Defaults to False.
+            password (str, optional): Password for decryption. Defaults to class password.
+            check_only (bool, optional): Only check that each file decodes, returning the payload size.
+                Defaults to False.
+            
+        Yields:
+            BatchResult: One result per file, with the error message if it failed
+        """
+        from .batch import BatchCodec
+        
+        with BatchCodec(jobs, password or self.password, self._batch_options(), save_manager=self) as codec:
+            for result in codec.decrypt_many(paths, parse, output_dir, ordered, check_only):
+                if result.ok:
+                    self._remember_container(result.path, result.container)
+                yield result
+
+    def encrypt_many(self, items, jobs=None, ordered=False, password=None):
+        """
+        Encode many payloads into save files in parallel
+        
+        Args:
+            items (iterable): (output_path, data) or (output_path, data, container) tuples,
+                data being JSON bytes or a document. Existing files keep their format.
+            jobs (int, optional): Worker processes, 1 encodes on this thread. Defaults to the CPU count.
+            ordered (bool, optional): Yield results in input order instead of completion order. Defaults to False.
+            password (str, optional): Password for encryption. Defaults to class password.
+            
+        Yields:
+            BatchResult: One result per item, with the error message if it failed
+        """
+        from .batch import BatchCodec
+        
+        with BatchCodec(jobs, password or self.password, self._batch_options(), save_manager=self) as codec:
+            for result in codec.encrypt_many(items, ordered):
+                if result.ok:
+                    self._remember_container(result.path, result.container)
+                yield result
+
+    def check_saves(self, paths=None, jobs=None, ordered=False, password=None, check_backups=True):
+        """
+        Check many save files for corruption in parallel, see fsck.py for the classes
+        
+        Args:
+            paths (iterable, optional): Save files. Defaults to the saves found by list_save_files.
+            jobs (int, optional): Worker processes, 1 checks on this thread. Defaults to the CPU count.
+            ordered (bool, optional): Yield results in input order instead of completion order. Defaults to False.
+            password (str, optional): Password for decryption. Defaults to class password.
+            check_backups (bool, optional): Also check the <save>.backup next to each save. Defaults to True.
+            
+        Yields:
+            BatchResult: One result per file, its value is the report record
+        """
+        from .batch import BatchCodec
+        from . import fsck
+        
+        if paths is None:
+            paths = [save_file for _, _, save_file in self.list_save_files()]
+        
+        with BatchCodec(jobs, password or self.password, self._batch_options(), save_manager=self) as codec:
+            tasks = fsck.iter_tasks(paths, codec.password, check_backups)
+            yield from codec.run(fsck._check_file, tasks, ordered)
+
+    def export_saves(self, paths, exporter, jobs=None, ordered=False, password=None):
+        """
+        Export many saves as flat save, player and item rows, see exporter.py
+        
+        Saves are decoded and flattened in parallel and their rows written as each
+        one finishes, so memory use does not grow with the number of saves.
+        
+        Args:
+            paths (iterable): Save file paths
+            exporter (NdjsonExporter or CsvExporter): Destination of the rows, not closed here
+            jobs (int, optional): Worker processes, 1 exports on this thread. Defaults to the CPU count.
+            ordered (bool, optional): Write saves in input order instead of completion order. Defaults to False.
+            password (str, optional): Password for decryption. Defaults to class password.
+            
+        Yields:
+            BatchResult: One result per save, its value is the number of rows written
+        """
+        from .batch import BatchCodec
+        from .exporter import _export_file
+        
+        with BatchCodec(jobs, password or self.password, self._batch_options(), save_manager=self) as codec:
+            tasks = ((path, codec.password) for path in paths)
+            for result in codec.run(_export_file, tasks, ordered):
+                if result.ok:
+                    for kind, row in result.value:
+                        exporter.write(kind, row)
+                    result.value = len(result.value)
+                yield result
+
+    def import_saves(self, lines, output_dir=None, template=None, progress=None, jobs=None, ordered=False,
+                     password=None):
+        """
+        Create a save for every NDJSON record, see importer.py for the record format
+
+        Records are built and encrypted in parallel into <output_dir>/<folder>/<folder>.Es3.
+        Lines are only read as workers free up, so memory use stays bounded.
+
+        Args:
+            lines (iterable): NDJSON lines as bytes or str, e.g. a file opened in binary mode
+            output_dir (str, optional): Folder for the new save folders. Defaults to the default save path.
+            template (str, optional): Save file that records without a complete save start from.
+                Defaults to None, a new game as built by GameSave.create_new_game.
+            progress (str, optional): Progress file. Lines recorded in it by an earlier run are
+                skipped, and it is removed once every line was written. Defaults to None.
+            jobs (int, optional): Worker processes, 1 imports on this thread. Defaults to the CPU count.
+            ordered (bool, optional): Yield results in input order instead of completion order. Defaults to False.
+            password (str, optional): Password for encryption. Defaults to class password.
+
+        Yields:
+            BatchResult: The bytes written for each record, with the error message if it failed
+
+        Raises:
+            ValueError: If there is no output folder
+        """
+        from .batch import BatchCodec
+        from . import importer
+        from .save_template import reserve_save_folders
+
+        output_dir = output_dir or self.default_save_path
+        if not output_dir:
+            raise ValueError("No output folder given and no default save path on this platform")
+        os.makedirs(output_dir, exist_ok=True)
+        if template:
+            template = os.path.abspath(template)
+
+        tracker = importer.ImportProgress(progress) if progress else None
+        resuming = bool(tracker and tracker.resuming)
+        folders = reserve_save_folders(output_dir)
+        lines_by_index = {}
+        state = {"read_all": False, "failed": False}
+
+        def tasks():
+            for index, (line_number, line) in enumerate(importer.iter_lines(lines, tracker.done if tracker else ())):
+                # Reserved here, so an interrupted run's saves are found again when resuming
+                folder = tracker.folders.get(line_number) if tracker else None
+                if folder is None or not os.path.isdir(os.path.join(output_dir, folder)):
+                    folder, _ = next(folders)
+                    if tracker:
+                        tracker.reserve(line_number, folder)
+                lines_by_index[index] = line_number
+                yield line_number, line, output_dir, folder, template, codec.password, resuming
+            state["read_all"] = True
+
+        try:
+            with BatchCodec(jobs, password or self.password, self._batch_options(), save_manager=self) as codec:
+                for result in codec.run(importer._import_record, tasks(), ordered):
+                    line_number = lines_by_index.pop(result.index)
+                    if result.ok:
+                        self._remember_container(result.path, result.container)
+                        if tracker:
+                            tracker.mark(line_number)
+                    else:
+                        state["failed"] = True
+                    yield result
+        finally:
+            if tracker:
+                tracker.close(finished=state["read_all"] and not state["failed"] and not lines_by_index)
+
+    def create_new_game_saves(self, team_names, output_dir=None, players=None, date=None, jobs=None, ordered=False,
+                              password=None):
+        """
+        Create many new game saves in parallel
+        
+        Every save gets its own folder with a unique REPO_SAVE_ name, see
+        save_template.reserve_save_folders. The new game is serialized from a shared
+        template, so the cost per save is mostly encryption and disk writes.
+        
+        Args:
+            team_names (iterable): Team name of each save, consumed lazily
+            output_dir (str, optional): Folder for the save folders. Defaults to the default save path.
+            players (dict, optional): Steam ID -> player name, added to every save. Defaults to None.
+            date (str, optional): Save date as YYYY-MM-DD. Defaults to today.
+            jobs (int, optional): Worker processes, 1 creates on this thread. Defaults to the CPU count.
+            ordered (bool, optional): Yield results in input order instead of completion order. Defaults to False.
+            password (str, optional): Password for encryption. Defaults to class password.
+            
+        Yields:
+            BatchResult: The bytes written for each save, with the error message if it failed
+            
+        Raises:
+            ValueError: If there is no output folder, or more than six players
+        """
+        import datetime
+        from .batch import BatchCodec
+        from . import save_template
+        
+        output_dir = output_dir or self.default_save_path
+        if not output_dir:
+            raise ValueError("No output folder given and no default save path on this platform")
+        players = dict(players) if players else None
+        if players and len(players) > save_template.MAX_PLAYERS:
+            raise ValueError(f"A save holds at most {save_template.MAX_PLAYERS} players, got {len(players)}")
+        date = date or datetime.date.today().strftime(save_template.DATE_FORMAT)
+        
+        with BatchCodec(jobs, password or self.password, self._batch_options(), save_manager=self) as codec:
+            folders = save_template.reserve_save_folders(output_dir)
+            
+            def tasks():
+                for team_name in team_names:
+                    folder_name, folder_path = next(folders)
+                    yield (os.path.join(folder_path, folder_name + ".Es3"), team_name, date, players,
+                           codec.password)
+            
+            for result in codec.run(save_template._create_save, tasks(), ordered):
+                if result.ok:
+                    self._remember_container(result.path, result.container)
+                yield result
+
+    def get_journal(self):
+        """
+        Get the journal of multi-file transactions
+        
+        Returns:
+            SaveJournal: The journal
+        """
+        if self._journal is None:
+            from .journal import SaveJournal
+            
+            self._journal = SaveJournal(self.journal_dir, durable=self.atomic_writes)
+        return self._journal
+
+    def recover_transactions(self):
+        """
+        Finish or undo multi-file transactions interrupted by a crash
+        
+        Returns:
+            list: (transaction id, "rolled forward" or "rolled back", number of saves) for each repair
+        """
+        try:
+            recovered = self.get_journal().recover(self._index_history)
+        except Exception as e:
+            print(f"Warning: Could not recover interrupted transactions: {str(e)}")
+            return []
+        for transaction_id, action, count in recovered:
+            print(f"Interrupted transaction {transaction_id} {action} ({count} saves)")
+        return recovered
+
+    def _run_transaction(self, function, paths, make_task, is_staged, jobs, ordered, password, create_backup):
+        """
+        Stage saves in parallel and commit them all at once, or none of them
+        
+        Args:
+            function (callable): Batch work writing a save's new contents to its staging file
+            paths (list): Save files in the transaction
+            make_task (callable): Builds the task arguments from (path, staged path, password)
+            is_staged (callable): Whether a successful result staged a file to commit
+            
+        Yields:
+            BatchResult: One result per save as it is staged. self.last_transaction
+                tells whether the saves were written once the results are exhausted.
+        """
+        from .batch import BatchCodec
+        
+        transaction = self.get_journal().begin(paths, create_backup)
+        self.last_transaction = {"id": transaction.id, "committed": False, "saves": 0, "failed": 0}
+        staged = []
+        try:
+            with BatchCodec(jobs, password or self.password, self._batch_options(), save_manager=self) as codec:
+                tasks = (make_task(path, transaction.staged_path(path), codec.password) for path in paths)
+                for result in codec.run(function, tasks, ordered):
+                    if not result.ok:
+                        self.last_transaction["failed"] += 1
+                    elif is_staged(result):
+                        staged.append(result)
+                    yield result
+            
+            if self.last_transaction["failed"]:
+                print(f"Transaction {transaction.id}: {self.last_transaction['failed']} saves failed, nothing written")
+                return
+            
+            try:
+                transaction.commit([result.path for result in staged],
+                                   {result.path: result.history for result in staged if result.history})
+            except OSError as e:
+                print(f"Transaction {transaction.id} rolled back: {str(e)}")
+                return
+            self.last_transaction.update(committed=True, saves=len(staged))
+            print(f"Transaction {transaction.id}: {len(staged)} saves written")
+            
+            for result in staged:
+                self._remember_container(result.path, result.container)
+            self._index_history([(result.path, result.history) for result in staged if result.history])
+        finally:
+            # Failed staging, an error, or the caller stopped reading results
+            if transaction.open:
+                transaction.rollback()
+
+    def _index_history(self, records):
+        """Index the original payloads that workers stored as backup blobs, one index write per store"""
+        by_store = {}
+        for path, record in records:
+            store = self.get_backup_store(path)
+            by_store.setdefault(id(store), (store, []))[1].append((path, record))
+        for store, records in by_store.values():
+            try:
+                store.add_stored(records)
+            except Exception as e:
+                print(f"Warning: Could not record backup versions: {str(e)}")
+
+    def save_many(self, items, jobs=None, ordered=False, password=None, create_backup=True):
+        """
+        Save many documents as one transaction: either every save is written or none is
+        
+        Each document is encoded and verified into a staging file next to its save in
+        parallel, then the staging files are renamed into place. A crash during the
+        renames is finished on the next start, see journal.py.
+        
+        Args:
+            items (iterable): (file_path, data) tuples, data being the JSON document to save
+            jobs (int, optional): Worker processes, 1 stages on this thread. Defaults to the CPU count.
+            ordered (bool, optional): Yield results in input order instead of completion order. Defaults to False.
+            password (str, optional): Password for encryption. Defaults to class password.
+            create_backup (bool, optional): Keep each replaced save as <save>.backup and in the
+                backup history. Defaults to True.
+            
+        Yields:
+            BatchResult: The bytes staged for each save, with the error message if it failed.
+                self.last_transaction tells whether the saves were written.
+        """
+        from .journal import _stage_file
+        
+        documents = {}
+        for path, data in items:
+            if path in documents:
+                raise ValueError(f"Save listed twice in one transaction: {path}")
+            documents[path] = data
+        
+        def make_task(path, staged_path, pwd):
+            return (path, documents.pop(path), pwd, staged_path, create_backup)
+        
+        return self._run_transaction(_stage_file, list(documents), make_task, lambda result: True,
+                                     jobs, ordered, password, create_backup)
+
+    def apply_edits(self, plan, paths, commit=False, create_backup=True, jobs=None, ordered=False, password=None):
+        """
+        Apply a compiled bulk edit to many save files in parallel
+
+        Args:
+            plan (EditPlan): Edits compiled by bulk_edit.compile_spec or bulk_edit.load_spec
+            paths (iterable): Save file paths
+            commit (bool, optional): Write the changed saves as one transaction, see save_many.
+                Otherwise only report the changes. Defaults to False.
+            create_backup (bool, optional): Back up each save before overwriting it. Defaults to True.
+            jobs (int, optional): Worker processes, 1 edits on this thread. Defaults to the CPU count.
+            ordered (bool, optional): Yield results in input order instead of completion order. Defaults to False.
+            password (str, optional): Save password. Defaults to class password.
+
+        Yields:
+            BatchResult: The (path, old value, new value) changes of each file, with the error message if it failed
+        """
+        from .batch import BatchCodec
+        from .bulk_edit import _edit_file
+
+        if commit:
+            def make_task(path, staged_path, pwd):
+                return (path, plan, pwd, staged_path, create_backup)
+
+            yield from self._run_transaction(_edit_file, list(paths), make_task, lambda result: bool(result.value),
+                                             jobs, ordered, password, create_backup)
+            return
+
+        with BatchCodec(jobs, password or self.password, self._batch_options(), save_manager=self) as codec:
+            tasks = ((path, plan, codec.password, None, create_backup) for path in paths)
+            for result in codec.run(_edit_file, tasks, ordered):
+                if result.ok:
+                    self._remember_container(result.path, result.container)
+                yield result
+
+    def create_temp_json(self, file_path, output_dir=None, pretty=True):
         """
         Create a temporary JSON file from an ES3 save for backup/inspection
         
         Args:
             file_path (str): Path to the ES3 file
             output_dir (str, optional): Directory to save the JSON file. Defaults to the same directory.
+            pretty (bool, optional): Whether to indent the JSON. When False the decrypted JSON is
+                streamed straight to the output file with bounded memory. Defaults to True.
             
         Returns:
             str: Path to the created JSON file, or None if unsuccessful
         """
-        json_data = self.load_json_from_es3(file_path)
-        
-        if json_data is None:
-            return None
-            
         # Create output path
         if output_dir is None:
             output_dir = os.path.dirname(file_path)
@@ -625,6 +1518,28 @@ class SaveManager:
         base_name = os.path.splitext(os.path.basename(file_path))[0]
         output_file = os.path.join(output_dir, base_name + "_temp.json")
         
+        if not pretty:
+            try:
+                with open(file_path, 'rb') as file_in:
+                    head = file_in.read(es3_codec.SNIFF_SIZE)
+                    file_in.seek(0)
+                    container = es3_codec.sniff_container(head, os.fstat(file_in.fileno()).st_size)
+                    with open(output_file, 'wb') as file_out:
+                        if es3_codec.is_encrypted(container):
+                            es3_codec.decode_to(file_in, file_out, self.password_for(file_path),
+                                                derive_key=self._derive_key)
+                        else:
+                            file_out.write(self.decrypt_es3(file_path))
+                return output_file
+            except Exception as e:
+                print(f"Error saving temporary JSON: {str(e)}")
+                return None
+        
+        json_data = self._load_shared_document(file_path)
+        
+        if json_data is None:
+            return None
+        
         # Save as JSON file
         try:
             with open(output_file, 'w', encoding='utf-8') as f:
@@ -645,35 +1560,35 @@ class SaveManager:
             tuple: (folder_path, file_path, game_save) or (None, None, None) if unsuccessful
         """
         from .data_models import GameSave
-        import datetime
+        from .save_template import new_game_template, release_save_folder, reserve_save_folders
         
+        save_folder = None
         try:
-            # Create a new game save
-            game_save, raw_data = GameSave.create_new_game(team_name)
-            
-            # Generate folder name
-            folder_name = game_save.get_save_folder_name()
+            # Serialize the new game from the shared template
+            json_bytes = new_game_template(self.compact_json).render_game(team_name)
+            game_save = GameSave(json_engine.loads(json_bytes))
             
-            # Create the save folder
-            save_folder = os.path.join(self.default_save_path, folder_name)
-            os.makedirs(save_folder, exist_ok=True)
+            # Create the save folder under the first free REPO_SAVE_ name
+            folder_name, save_folder = next(reserve_save_folders(self.default_save_path))
             
             # Create file path
             file_path = os.path.join(save_folder, folder_name + ".Es3")
             
             # Save the raw data to the file
-            json_string = json.dumps(raw_data)
-            success = self.encrypt_es3(json_string.encode('utf-8'), file_path, self.password, self.should_gzip)
+            success = self.encrypt_es3_file(json_bytes, file_path, self.password, self.should_gzip)
             
             if success:
                 print(f"New game save created at: {file_path}")
                 return save_folder, file_path, game_save
             else:
                 print("Failed to save new game")
+                release_save_folder(save_folder)
                 return None, None, None
                 
         except Exception as e:
             print(f"Error creating new game save: {str(e)}")
             import traceback
             traceback.print_exc()
+            if save_folder:
+                release_save_folder(save_folder)
             return None, None, None
\ No newline at end of file
@@ -0,0 +1,303 @@
+"""
+Inverted index over many saves, for questions like "which saves have this
+Steam ID", "which saves bought more than 10 Item Gun Shotgun" or "which saves
+belong to this team" without decrypting every file.
+
+SaveTermIndex is a SaveIndex whose entries hold a save's team name, players
+and the non-zero values of its dictionaryOfDictionaries. Entries are stamped
+with the size and mtime of their file and refreshed only for new or changed
+saves (SaveManager.refresh_term_index). From the entries it keeps posting sets
+in memory, Steam ID, player name and team name -> saves, and per dictionary
+value the saves and values, sorted on first use so comparisons are a bisect.
+Postings are updated entry by entry as saves are re-indexed, never rebuilt.
+
+Values a save does not have count as 0, as they do in the game.
+"""
+
+import operator
+import re
+from bisect import bisect_left, bisect_right
+
+from .save_index import SaveIndex, _index_key, _wrapped_value
+
+
+TERMS_VERSION = 1
+TERMS_FILE_NAME = "save_terms.json"
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+_CONDITION = re.compile(r"^([^.]+)\.(.+?)\s*(>=|<=|==|!=|>|<|=)\s*(-?\d+(?:\.\d+)?)$")
+
+
+def index_terms(data):
+    """
+    Pick the indexed terms out of a save document
+
+    Args:
+        data (dict): Save document
+
+    Returns:
+        dict: team_name, players (Steam ID -> name) and values (dictionary name -> key -> non-zero number)
+    """
+    dictionaries = _wrapped_value(data, "dictionaryOfDictionaries") or {}
+    values = {}
+    for dict_name, entries in dictionaries.items():
+        if not isinstance(entries, dict):
+            continue
+        nonzero = {str(key): value for key, value in entries.items()
+                   if value and isinstance(value, (int, float)) and not isinstance(value, bool)}
+        if nonzero:
+            values[dict_name] = nonzero
+    names = _wrapped_value(data, "playerNames") or {}
+    return {
+        "team_name": _wrapped_value(data, "teamName"),
+        "players": {str(steam_id): str(name) for steam_id, name in names.items()},
+        "values": values,
+    }
+
+
+def parse_condition(text):
+    """
+    Parse a value condition such as "itemsPurchased.Item Gun Shotgun>10"
+
+    Args:
+        text (str): <dictionary>.<key><operator><number>, operator one of > >= < <= == != (= means ==)
+
+    Returns:
+        tuple: (dictionary name, key, operator, number)
+
+    Raises:
+        ValueError: If the text is not a condition
+    """
+    match = _CONDITION.match(text.strip())
+    if match is None:
+        raise ValueError(f"Not a condition: {text!r}, expected e.g. \"itemsPurchased.Item Gun Shotgun>10\"")
+    dict_name, key, op, number = match.groups()
+    value = float(number) if "." in number else int(number)
+    return dict_name, key, "==" if op == "=" else op, value
+
+
+def _add_posting(postings, term, key):
+    keys = postings.get(term)
+    if keys is None:
+        keys = postings[term] = set()
+    keys.add(key)
+
+
+def _remove_posting(postings, term, key):
+    keys = postings.get(term)
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del postings[term]
+
+
+class SaveTermIndex(SaveIndex):
+    """
+    Terms of save files, kept in <cache_dir>/save_terms.json, with the posting sets
+    the queries use. Query results are sets of index keys, the normalized absolute
+    paths of the saves.
+    """
+
+    file_name = TERMS_FILE_NAME
+    version = TERMS_VERSION
+    summarize = staticmethod(index_terms)
+
+    def _entries_reset(self):
+        self._all = set()
+        self._players = {}  # Steam ID -> keys
+        self._player_names = {}  # Casefolded player name -> keys
+        self._teams = {}  # Casefolded team name -> keys
+        self._values = {}  # (dictionary name, key) -> {index key: value}
+        self._sorted = {}  # (dictionary name, key) -> (sorted values, index keys in the same order)
+        for key, entry in self.entries.items():
+            self._entry_changed(key, None, entry)
+
+    def _entry_changed(self, key, old_entry, new_entry):
+        if old_entry is not None:
+            self._all.discard(key)
+            self._post(key, old_entry, _remove_posting)
+            for dict_name, entries in old_entry["values"].items():
+                for name in entries:
+                    field = (dict_name, name)
+                    values = self._values.get(field)
+                    if values is not None:
+                        values.pop(key, None)
+                        if not values:
+                            del self._values[field]
+                    self._sorted.pop(field, None)
+        if new_entry is not None:
+            self._all.add(key)
+            self._post(key, new_entry, _add_posting)
+            for dict_name, entries in new_entry["values"].items():
+                for name, value in entries.items():
+                    field = (dict_name, name)
+                    values = self._values.get(field)
+                    if values is None:
+                        values = self._values[field] = {}
+                    values[key] = value
+                    self._sorted.pop(field, None)
+
+    def _post(self, key, entry, change):
+        """Add a save to, or remove it from, the postings of its players and team"""
+        for steam_id, name in entry["players"].items():
+            change(self._players, steam_id, key)
+            change(self._player_names, name.casefold(), key)
+        if entry["team_name"] is not None:
+            change(self._teams, str(entry["team_name"]).casefold(), key)
+
+    def all_saves(self):
+        """
+        Returns:
+            set: Keys of every indexed save
+        """
+        with self._lock:
+            return set(self._all)
+
+    def with_player(self, steam_id):
+        """
+        Find the saves a player is in
+
+        Args:
+            steam_id (str): Steam ID of the player
+
+        Returns:
+            set: Keys of the saves
+        """
+        with self._lock:
+            return set(self._players.get(str(steam_id), ()))
+
+    def with_player_name(self, name):
+        """
+        Find the saves with a player of some name, ignoring case
+
+        Args:
+            name (str): Player name
+
+        Returns:
+            set: Keys of the saves
+        """
+        with self._lock:
+            return set(self._player_names.get(name.casefold(), ()))
+
+    def with_team(self, team_name):
+        """
+        Find the saves of a team, ignoring case
+
+        Args:
+            team_name (str): Team name
+
+        Returns:
+            set: Keys of the saves
+        """
+        with self._lock:
+            return set(self._teams.get(team_name.casefold(), ()))
+
+    def where(self, dict_name, key, op, value):
+        """
+        Find the saves whose dictionary value compares to a number, e.g.
+        where("itemsPurchased", "Item Gun Shotgun", ">", 10)
+
+        Args:
+            dict_name (str): Dictionary in dictionaryOfDictionaries, e.g. runStats or itemsPurchased
+            key (str): Key in the dictionary, an item name, Steam ID or stat
+            op (str): One of > >= < <= == !=
+            value (int or float): Number to compare with
+
+        Returns:
+            set: Keys of the saves
+
+        Raises:
+            ValueError: If op is not an operator
+        """
+        compare = OPERATORS.get(op)
+        if compare is None:
+            raise ValueError(f"Unknown operator {op!r}, expected one of {' '.join(OPERATORS)}")
+        field = (dict_name, key)
+        with self._lock:
+            values, keys = self._sorted_field(field)
+            low = bisect_left(values, value)
+            high = bisect_right(values, value)
+            if op == ">":
+                found = set(keys[high:])
+            elif op == ">=":
+                found = set(keys[low:])
+            elif op == "<":
+                found = set(keys[:low])
+            elif op == "<=":
+                found = set(keys[:high])
+            elif op == "==":
+                found = set(keys[low:high])
+            else:
+                found = set(keys[:low])
+                found.update(keys[high:])
+            if compare(0, value):
+                # Saves without the value have 0
+                found.update(self._all.difference(self._values.get(field, ())))
+        return found
+
+    def _sorted_field(self, field):
+        """(sorted values, keys) of a dictionary value, sorted on first use. Called with the lock held."""
+        result = self._sorted.get(field)
+        if result is None:
+            pairs = sorted((value, key) for key, value in self._values.get(field, {}).items())
+            result = self._sorted[field] = ([value for value, _ in pairs], [key for _, key in pairs])
+        return result
+
+    def query(self, players=(), player_names=(), teams=(), conditions=(), scope=None):
+        """
+        Find the saves matching every criterion given
+
+        Args:
+            players (iterable, optional): Steam IDs that must all be in the save
+            player_names (iterable, optional): Player names that must all be in the save
+            teams (iterable, optional): Team names, the save's must be one of them
+            conditions (iterable, optional): (dictionary name, key, operator, number) tuples, as parse_condition makes
+            scope (iterable, optional): Save files to search among. Defaults to every indexed save.
+
+        Returns:
+            list: Keys of the matching saves, sorted
+        """
+        conditions = list(conditions)
+        for dict_name, key, op, value in conditions:
+            if op not in OPERATORS:
+                raise ValueError(f"Unknown operator {op!r}, expected one of {' '.join(OPERATORS)}")
+
+        # Intersect the posting sets smallest first, then check the conditions on the few saves left
+        candidates = [self.with_player(steam_id) for steam_id in players]
+        candidates += [self.with_player_name(name) for name in player_names]
+        teams = list(teams)
+        if teams:
+            team_saves = set()
+            for team_name in teams:
+                team_saves |= self.with_team(team_name)
+            candidates.append(team_saves)
+        if scope is not None:
+            candidates.append({_index_key(path) for path in scope})
+        if candidates:
+            candidates.sort(key=len)
+            found = candidates[0]
+            for other in candidates[1:]:
+                found = found & other
+            if scope is not None:
+                # Saves in scope may not be indexed
+                with self._lock:
+                    found = found & self._all
+        elif conditions:
+            found = self.where(*conditions.pop(0))
+        else:
+            found = self.all_saves()
+
+        with self._lock:
+            for dict_name, key, op, value in conditions:
+                compare = OPERATORS[op]
+                values = self._values.get((dict_name, key), {})
+                found = {save for save in found if compare(values.get(save, 0), value)}
+        return sorted(found)
@@ -0,0 +1,156 @@
+"""
+Incremental scanning of a saves folder.
+
+A saves folder holds one folder per save, <name>/<name>.Es3. SaveScanner lists
+it with os.scandir, which reports which entries are folders without a stat
+call, and then stats only the save file in each one. The saves found are kept
+in memory with their size and mtime, so later changes can be applied
+incrementally: given the paths a file system watcher reported, update() only
+looks at the saves under those paths and returns what was added, removed or
+changed.
+"""
+
+import os
+
+
+class ScanDelta:
+    """
+    Saves added, removed and changed since the previous scan, each a list of
+    (display_name, save_folder_path, full_save_file_path) tuples
+    """
+
+    def __init__(self, added=None, removed=None, changed=None):
+        self.added = added or []
+        self.removed = removed or []
+        self.changed = changed or []
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def __repr__(self):
+        return f"ScanDelta(added={len(self.added)}, removed={len(self.removed)}, changed={len(self.changed)})"
+
+
+class SaveScanner:
+    """
+    In-memory model of the saves in one folder
+    """
+
+    def __init__(self, folder_path):
+        """
+        Initialize the scanner, nothing is read until scan()
+
+        Args:
+            folder_path (str): Folder holding the save folders
+        """
+        self.folder_path = os.path.abspath(folder_path)
+        self.stamps = {}  # Save name -> (size, mtime_ns) of its save file
+        self.folders = set()  # Every folder in the saves folder, with or without a save
+
+    def _save(self, name):
+        """The save tuple of a save name, as list_save_files returns it"""
+        folder = os.path.join(self.folder_path, name)
+        return name, folder, os.path.join(folder, name + ".Es3")
+
+    def _probe(self, name):
+        """(size, mtime_ns) of a save's file, or None if the folder holds no save"""
+        try:
+            stat = os.stat(os.path.join(self.folder_path, name, name + ".Es3"))
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _folder_names(self):
+        """Names of the folders in the saves folder"""
+        with os.scandir(self.folder_path) as entries:
+            return {entry.name for entry in entries if entry.is_dir()}
+
+    def saves(self):
+        """
+        List the saves in the model
+
+        Returns:
+            list: (display_name, save_folder_path, full_save_file_path) tuples, newest name first
+        """
+        return [self._save(name) for name in sorted(self.stamps, reverse=True)]
+
+    def scan(self):
+        """
+        Read the whole folder, replacing the model
+
+        Returns:
+            list: The saves, as saves() returns them
+
+        Raises:
+            OSError: If the folder cannot be read
+        """
+        self.folders = self._folder_names()
+        stamps = {}
+        for name in self.folders:
+            stamp = self._probe(name)
+            if stamp is not None:
+                stamps[name] = stamp
+        self.stamps = stamps
+        return self.saves()
+
+    def _apply(self, names, delta):
+        """Probe some saves again and record the differences in delta"""
+        for name in names:
+            stamp = self._probe(name)
+            old_stamp = self.stamps.get(name)
+            if stamp == old_stamp:
+                continue
+            if stamp is None:
+                del self.stamps[name]
+                delta.removed.append(self._save(name))
+            else:
+                self.stamps[name] = stamp
+                (delta.added if old_stamp is None else delta.changed).append(self._save(name))
+
+    def update(self, paths):
+        """
+        Apply changes reported for some paths
+
+        Args:
+            paths (iterable): Changed paths: the saves folder itself when entries were
+                added or removed, or a save folder or file inside it
+
+        Returns:
+            ScanDelta: What changed in the model
+        """
+        names = set()
+        for path in paths:
+            try:
+                relative = os.path.relpath(os.path.abspath(path), self.folder_path)
+            except ValueError:
+                continue  # On another drive
+            if relative == os.curdir:
+                # Folders appeared or disappeared, only compare the names
+                try:
+                    current = self._folder_names()
+                except OSError:
+                    current = set()
+                names.update(current.symmetric_difference(self.stamps))
+                self.folders = current
+            elif not relative.startswith(os.pardir):
+                names.add(relative.split(os.sep)[0])
+
+        delta = ScanDelta()
+        self._apply(sorted(names), delta)
+        return delta
+
+    def refresh(self):
+        """
+        Compare the whole folder with the model, for when no watcher reports changes
+
+        Returns:
+            ScanDelta: What changed in the model
+        """
+        try:
+            current = self._folder_names()
+        except OSError:
+            current = set()
+        self.folders = current
+        delta = ScanDelta()
+        self._apply(sorted(current | set(self.stamps)), delta)
+        return delta
@@ -0,0 +1,300 @@
+"""
+Fast generation of new saves.
+
+A new game is the same large document every time: long .NET type names and
+six item dictionaries of 39 items each. Only the team name, the date and the
+players differ. SaveTemplate serializes such a document once, with markers at
+the fields that vary, and splits the JSON at the markers. Rendering a save is
+then a join of the fixed pieces with the few serialized field values, and
+never builds or serializes the nested dict again.
+
+Save folders are named REPO_SAVE_<date and time to the second>, so saves
+created in the same second would collide. reserve_save_folders hands out the
+free names one second apart counting back from now, so no save is dated in the
+future, and creates each folder as it goes, so two processes generating saves
+in the same folder never get the same name.
+"""
+
+import datetime
+import os
+import time
+
+from . import json_engine
+
+
+FOLDER_FORMAT = "REPO_SAVE_%Y_%m_%d_%H_%M_%S"
+DATE_FORMAT = "%Y-%m-%d"
+DEFAULT_TEAM_NAME = "R.E.P.O."
+
+# Saves hold at most this many players
+MAX_PLAYERS = 6
+
+_DICTIONARY_TYPE = (
+    "System.Collections.Generic.Dictionary`2[[System.String, mscorlib, Version=4.0.0.0, Culture=neutral, "
+    "PublicKeyToken=b77a5c561934e089],[System.Collections.Generic.Dictionary`2[[System.String, mscorlib, "
+    "Version=4.0.0.0, Culture=neutral, PublicKeyToken=b77a5c561934e089],[System.Int32, mscorlib, "
+    "Version=4.0.0.0, Culture=neutral, PublicKeyToken=b77a5c561934e089]], mscorlib, Version=4.0.0.0, "
+    "Culture=neutral, PublicKeyToken=b77a5c561934e089]],mscorlib"
+)
+_NAMES_TYPE = (
+    "System.Collections.Generic.Dictionary`2[[System.String, mscorlib, Version=4.0.0.0, Culture=neutral, "
+    "PublicKeyToken=b77a5c561934e089],[System.String, mscorlib, Version=4.0.0.0, Culture=neutral, "
+    "PublicKeyToken=b77a5c561934e089]],mscorlib"
+)
+
+# Items every new game lists, with zeros in each item dictionary
+NEW_GAME_ITEMS = (
+    "Item Cart Medium", "Item Cart Small", "Item Drone Battery", "Item Drone Feather",
+    "Item Drone Indestructible", "Item Drone Torque", "Item Drone Zero Gravity",
+    "Item Extraction Tracker", "Item Grenade Duct Taped", "Item Grenade Explosive",
+    "Item Grenade Human", "Item Grenade Shockwave", "Item Grenade Stun", "Item Gun Handgun",
+    "Item Gun Shotgun", "Item Gun Tranq", "Item Health Pack Large", "Item Health Pack Medium",
+    "Item Health Pack Small", "Item Melee Baseball Bat", "Item Melee Frying Pan",
+    "Item Melee Inflatable Hammer", "Item Melee Sledge Hammer", "Item Melee Sword",
+    "Item Mine Explosive", "Item Mine Shockwave", "Item Mine Stun", "Item Orb Zero Gravity",
+    "Item Power Crystal", "Item Rubber Duck", "Item Upgrade Map Player Count",
+    "Item Upgrade Player Energy", "Item Upgrade Player Extra Jump", "Item Upgrade Player Grab Range",
+    "Item Upgrade Player Grab Strength", "Item Upgrade Player Health",
+    "Item Upgrade Player Sprint Speed", "Item Upgrade Player Tumble Launch", "Item Valuable Tracker"
+)
+ITEM_DICTIONARIES = ("itemsPurchased", "itemsPurchasedTotal", "itemsUpgradesPurchased", "itemBatteryUpgrades",
+                     "item", "itemStatBattery")
+
+# Per-player dictionaries in dictionaryOfDictionaries.value and the value a new player starts with,
+# as GameSave.add_player sets them
+PLAYER_DICTIONARIES = {
+    "playerHealth": 100,
+    "playerUpgradeHealth": 0,
+    "playerUpgradeStamina": 0,
+    "playerUpgradeExtraJump": 0,
+    "playerUpgradeLaunch": 0,
+    "playerUpgradeMapPlayerCount": 0,
+    "playerUpgradeSpeed": 0,
+    "playerUpgradeStrength": 0,
+    "playerUpgradeRange": 0,
+    "playerUpgradeThrow": 0,
+    "playerHasCrown": 0,
+}
+
+
+def build_new_game(team_name=DEFAULT_TEAM_NAME, date=None):
+    """
+    Build a new game document by hand, the reference the template is made from
+
+    Args:
+        team_name (str, optional): Team name. Defaults to "R.E.P.O.".
+        date (str, optional): Save date as YYYY-MM-DD. Defaults to today.
+
+    Returns:
+        dict: The save document
+    """
+    values = {
+        "runStats": {
+            "level": 1,
+            "currency": 0,
+            "lives": 0,
+            "chargingStationCharge": 0,
+            "totalHaul": 0,
+            "save level": 0
+        },
+    }
+    for dict_name in PLAYER_DICTIONARIES:
+        values[dict_name] = {}
+    for dict_name in ITEM_DICTIONARIES:
+        values[dict_name] = dict.fromkeys(NEW_GAME_ITEMS, 0)
+
+    return {
+        "dictionaryOfDictionaries": {"__type": _DICTIONARY_TYPE, "value": values},
+        "playerNames": {"__type": _NAMES_TYPE, "value": {}},
+        "timePlayed": {"__type": "float", "value": 0.0},
+        "dateAndTime": {"__type": "string", "value": date or datetime.date.today().strftime(DATE_FORMAT)},
+        "teamName": {"__type": "string", "value": team_name},
+    }
+
+
+class SaveTemplate:
+    """
+    A document serialized once, with fields filled in at render time:
+
+        template = SaveTemplate(document, {"team": ("teamName", "value")})
+        json_bytes = template.render(team="Heroes")
+    """
+
+    def __init__(self, document, fields, compact=True):
+        """
+        Serialize the document and split it at the fields
+
+        Args:
+            document (dict): The document, not changed
+            fields (dict): Field name -> tuple of keys leading to the value it replaces
+            compact (bool, optional): Compact separators, as json_engine.dumps. Defaults to True.
+
+        Raises:
+            ValueError: If a field's path is not in the document
+        """
+        self.compact = compact
+        self.defaults = {}
+        self._default_json = {}
+        marked = json_engine.loads(json_engine.dumps(document))
+        markers = {}
+        for name, path in fields.items():
+            parent = marked
+            try:
+                for key in path[:-1]:
+                    parent = parent[key]
+                self.defaults[name] = parent[path[-1]]
+            except (KeyError, TypeError):
+                raise ValueError(f"Template field {name} not found at {'.'.join(path)}")
+            self._default_json[name] = json_engine.dumps(self.defaults[name], compact)
+            marker = f"\x00template:{name}\x00"
+            parent[path[-1]] = marker
+            markers[json_engine.dumps(marker, compact)] = name
+
+        # Alternate fixed pieces and field names, in document order
+        payload = json_engine.dumps(marked, compact)
+        self._pieces = []
+        self._fields = []
+        position = 0
+        while True:
+            found = [(payload.find(marker, position), marker) for marker in markers]
+            found = [(index, marker) for index, marker in found if index >= 0]
+            if not found:
+                break
+            index, marker = min(found)
+            self._pieces.append(payload[position:index])
+            self._fields.append(markers[marker])
+            position = index + len(marker)
+        self._pieces.append(payload[position:])
+
+    def render(self, **values):
+        """
+        Serialize the document with some fields changed
+
+        Args:
+            **values: Field name -> new value, fields not given keep the document's value
+
+        Returns:
+            bytes: The same JSON as serializing the changed document
+        """
+        dumps = json_engine.dumps
+        parts = [self._pieces[0]]
+        for name, piece in zip(self._fields, self._pieces[1:]):
+            parts.append(dumps(values[name], self.compact) if name in values else self._default_json[name])
+            parts.append(piece)
+        return b"".join(parts)
+
+
+class NewGameTemplate(SaveTemplate):
+    """
+    The new game document, with the team name, date and players as fields
+    """
+
+    def __init__(self, compact=True):
+        fields = {"team_name": ("teamName", "value"), "date": ("dateAndTime", "value"),
+                  "playerNames": ("playerNames", "value")}
+        for dict_name in PLAYER_DICTIONARIES:
+            fields[dict_name] = ("dictionaryOfDictionaries", "value", dict_name)
+        super().__init__(build_new_game(), fields, compact)
+
+    def render_game(self, team_name=DEFAULT_TEAM_NAME, date=None, players=None):
+        """
+        Serialize a new game
+
+        Args:
+            team_name (str, optional): Team name. Defaults to "R.E.P.O.".
+            date (str, optional): Save date as YYYY-MM-DD. Defaults to today.
+            players (dict, optional): Steam ID -> player name, at most six. Defaults to no players.
+
+        Returns:
+            bytes: JSON of the save
+
+        Raises:
+            ValueError: If there are more than six players
+        """
+        values = {"team_name": team_name, "date": date or datetime.date.today().strftime(DATE_FORMAT)}
+        if players:
+            if len(players) > MAX_PLAYERS:
+                raise ValueError(f"A save holds at most {MAX_PLAYERS} players, got {len(players)}")
+            values["playerNames"] = dict(players)
+            for dict_name, default in PLAYER_DICTIONARIES.items():
+                values[dict_name] = dict.fromkeys(players, default)
+        return self.render(**values)
+
+
+_new_game_templates = {}
+
+
+def new_game_template(compact=True):
+    """
+    Get the new game template, built on first use
+
+    Args:
+        compact (bool, optional): Compact separators. Defaults to True.
+
+    Returns:
+        NewGameTemplate: The shared template
+    """
+    template = _new_game_templates.get(compact)
+    if template is None:
+        template = _new_game_templates[compact] = NewGameTemplate(compact)
+    return template
+
+
+def reserve_save_folders(parent, start=None):
+    """
+    Create new, empty save folders with unique REPO_SAVE_ names
+
+    Names are one second apart from start backwards, skipping every name already
+    taken, so none is later than start. Each folder is created before its name is
+    handed out, so concurrent callers never share a name.
+
+    Args:
+        parent (str): Folder holding the save folders, created if needed
+        start (float, optional): Timestamp of the first name to try. Defaults to now.
+
+    Yields:
+        tuple: (folder name, folder path)
+    """
+    os.makedirs(parent, exist_ok=True)
+    when = int(start if start is not None else time.time())
+    while True:
+        name = datetime.datetime.fromtimestamp(when).strftime(FOLDER_FORMAT)
+        path = os.path.join(parent, name)
+        when -= 1
+        try:
+            os.mkdir(path)
+        except FileExistsError:
+            continue
+        yield name, path
+
+
+def release_save_folder(path):
+    """
+    Remove a reserved save folder no save was written to
+
+    Args:
+        path (str): Folder from reserve_save_folders, kept if it is not empty
+    """
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
+
+
+def _create_save(save_manager, path, team_name, date, players, password):
+    """
+    Render a new game and write it as a save
+
+    Returns:
+        BatchResult: The number of bytes written
+    """
+    from .batch import BatchResult
+
+    try:
+        json_bytes = new_game_template(save_manager.compact_json).render_game(team_name, date, players)
+        if not save_manager.encrypt_es3_file(json_bytes, path, password):
+            raise IOError(f"Could not write {path}")
+        return BatchResult(path, os.path.getsize(path), container=save_manager.get_container_format(path))
+    except Exception as e:
+        release_save_folder(os.path.dirname(path))
+        return BatchResult(path, error=f"{type(e).__name__}: {str(e)}")
@@ -0,0 +1,259 @@
+import os
+import time
+from contextlib import contextmanager
+
+from . import atomic_io
+from . import json_engine
+
+
+class SaveTransaction:
+    """
+    Saves JSON data over an ES3 file in a single pass:
+    - The original file is read from disk and decoded at most once, and those
+      bytes serve both the diff and the backup
+    - The new file is verified by decoding the encrypted buffer in memory
+      before anything on disk is touched
+    - With atomic writes the new file replaces the old one by rename, and the
+      backup is a hard link to the old file rather than a copy of its bytes
+    - The original payload is added to the save's versioned backup store
+    - The file is written back in the container format it was found in
+      (plain JSON, gzip, encrypted or encrypted+gzip)
+    - Time spent in each phase is recorded in self.timings
+    """
+
+    PHASES = ("read", "decode", "diff", "encode", "verify", "history", "backup", "write")
+
+    def __init__(self, save_manager, file_path, password=None, should_gzip=None):
+        """
+        Initialize the save transaction
+
+        Args:
+            save_manager (SaveManager): The save manager providing the codec and caches
+            file_path (str): Path of the ES3 file to write
+            password (str, optional): Password for encryption. Defaults to the password that opens the file.
+            should_gzip (bool, optional): Whether to compress the data. Defaults to the original file's format.
+        """
+        self.save_manager = save_manager
+        self.file_path = file_path
+        self.password = password or save_manager.password_for(file_path)
+        self.should_gzip = should_gzip
+        self.container = None
+
+        self.timings = {}
+        self.original_bytes = None
+        self.original_stat = None
+        self._original_entry = None
+        self._original_data = None
+        self.history = None
+
+    @contextmanager
+    def _phase(self, name):
+        """Accumulate the time spent in a phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def read_original(self):
+        """
+        Read the original file's raw bytes, once
+
+        Returns:
+            bytes: The original file contents, or None if the file does not exist yet
+        """
+        if self.original_bytes is None and os.path.exists(self.file_path):
+            with self._phase("read"):
+                with open(self.file_path, 'rb') as file_obj:
+                    self.original_stat = os.fstat(file_obj.fileno())
+                    self.original_bytes = file_obj.read()
+        return self.original_bytes
+
+    def original_plaintext(self):
+        """
+        Decrypt the original file, once, reusing the document cache
+
+        Returns:
+            bytes: The original JSON payload, or None if unavailable
+        """
+        if self._original_entry is None and self.read_original() is not None:
+            with self._phase("decode"):
+                try:
+                    self._original_entry = self.save_manager.document_cache.get_for_bytes(
+                        self.file_path, self.password, self.original_bytes, self.original_stat,
+                        lambda file_bytes: self.save_manager._decode_es3_buffer(file_bytes, self.password, self.file_path))
+                except Exception as e:
+                    print(f"Failed to decode original file: {str(e)}")
+        return self._original_entry.plaintext if self._original_entry is not None else None
+
+    def original_data(self):
+        """
+        Parse the original file, once, reusing the document cache
+
+        Returns:
+            dict: Shared, read-only parsed original data, or None if unavailable
+        """
+        if self._original_data is None and self.original_plaintext() is not None:
+            with self._phase("decode"):
+                self._original_data = self.save_manager.document_cache.parse(self._original_entry)
+        return self._original_data
+
+    def commit(self, data, create_backup=True, debug_compare=True, debug_player_stats=True):
+        """
+        Encode, verify and write the data, backing up the original first
+
+        Args:
+            data (dict): JSON data to save
+            create_backup (bool, optional): Whether to back up the original file. Defaults to True.
+            debug_compare (bool, optional): Whether to print differences and verify the result. Defaults to True.
+            debug_player_stats (bool, optional): Whether to print player stats changes. Defaults to True.
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        # Show what changed compared to the original file
+        if debug_player_stats or debug_compare:
+            original_data = self.original_data()
+            if original_data is not None:
+                with self._phase("diff"):
+                    if debug_player_stats:
+                        self.save_manager.compare_player_stats(self.file_path, data, original_data=original_data)
+                    else:
+                        self.save_manager.compare_save_data(self.file_path, data, original_data=original_data)
+
+        encoded = self._encode(data, debug_compare)
+        if encoded is None:
+            return False
+        json_bytes, encoded = encoded
+
+        # Keep the original in the versioned history, deduplicated and compressed
+        if create_backup and self.original_plaintext() is not None:
+            with self._phase("history"):
+                self._record_history()
+
+        backup_path = self.file_path + ".backup"
+        has_original = os.path.exists(self.file_path)
+
+        if self.save_manager.atomic_writes:
+            # Swap the new file in by rename, keeping the old inode as the backup
+            print(f"Replacing original file: {self.file_path}")
+            with self._phase("write"):
+                backup_method = atomic_io.atomic_write(
+                    self.file_path, [encoded], backup_path if create_backup and has_original else None)
+            if backup_method:
+                print(f"Backup created ({backup_method}): {backup_path}")
+        else:
+            # Back up the original bytes that were already read
+            if create_backup and self.read_original() is not None:
+                with self._phase("backup"):
+                    self._write_backup()
+
+            # Overwrite the original file
+            print(f"Overwriting original file: {self.file_path}")
+            with self._phase("write"):
+                with open(self.file_path, 'wb') as file_out:
+                    file_out.write(encoded)
+
+        # Later loads of this file can skip decoding entirely
+        self.save_manager._remember_container(self.file_path, self.container)
+        self.save_manager.document_cache.put(
+            self.file_path, self.password, encoded, os.stat(self.file_path), json_bytes)
+
+        print(f"Successfully saved to: {self.file_path} ({self.container})")
+        print(f"Save timings: {self.format_timings()}")
+        return True
+
+    def _encode(self, data, verify):
+        """
+        Encode the data in the original file's container format and optionally verify it
+
+        Returns:
+            tuple: (JSON bytes, encoded file bytes), or None if verification failed
+        """
+        # Encode into memory, in the same container format as the original
+        with self._phase("encode"):
+            self.container = self.save_manager.resolve_container(
+                self.file_path, self.read_original(), self.password, self.should_gzip)
+            json_bytes = json_engine.dumps(data, self.save_manager.compact_json)
+            encoded = self.save_manager.encrypt_es3_file(json_bytes, None, self.password, container=self.container)
+
+        # Verify the round trip on the in-memory buffer before touching the disk
+        if verify:
+            print("Verifying encoded data...")
+            with self._phase("verify"):
+                decoded = self.save_manager._decode_es3_buffer(encoded, self.password)
+                verified = json_engine.loads(decoded) == data
+            if not verified:
+                print("❌ Verification failed: Encoded data does not match expected data, file not written")
+                return None
+            print("✅ Verification successful: Saved data matches expected data")
+        return json_bytes, encoded
+
+    def stage(self, data, staged_path, create_backup=True, verify=True):
+        """
+        Encode and verify the data, writing it to a staging file instead of the
+        save, for a multi-file transaction to rename into place later
+
+        The original payload is stored as a backup blob but not indexed: several
+        processes may stage at once, so the caller indexes self.history with
+        BackupStore.add_stored after the commit.
+
+        Args:
+            data (dict): JSON data to save
+            staged_path (str): Staging file next to the save
+            create_backup (bool, optional): Whether to store the original payload. Defaults to True.
+            verify (bool, optional): Whether to verify the encoded data. Defaults to True.
+
+        Returns:
+            bool: True if the staging file was written, False if verification failed
+        """
+        self.history = None
+        encoded = self._encode(data, verify)
+        if encoded is None:
+            return False
+        _, encoded = encoded
+
+        if create_backup and self.original_plaintext() is not None:
+            with self._phase("history"):
+                store = self.save_manager.get_backup_store(self.file_path)
+                self.history = store.store_payload(self.original_plaintext(), self.original_stat.st_mtime)
+
+        with self._phase("write"):
+            with open(staged_path, 'wb') as file_out:
+                file_out.write(encoded)
+                file_out.flush()
+                os.fsync(file_out.fileno())
+        return True
+
+    def _record_history(self):
+        """Add the original payload to the backup store"""
+        try:
+            store = self.save_manager.get_backup_store(self.file_path)
+            entry = store.add(self.file_path, self.original_plaintext(), self.original_stat.st_mtime)
+            print(f"Backup version recorded: {entry['id']} ({entry['stored_size']:,} bytes stored)")
+        except Exception as e:
+            print(f"Warning: Could not record backup version: {str(e)}")
+
+    def _write_backup(self):
+        """Write the original bytes to <file>.backup, keeping the original timestamps"""
+        import shutil
+
+        backup_path = self.file_path + ".backup"
+        try:
+            with open(backup_path, 'wb') as backup_file:
+                backup_file.write(self.original_bytes)
+            shutil.copystat(self.file_path, backup_path)
+            print(f"Backup created: {backup_path}")
+        except Exception as e:
+            print(f"Warning: Could not create backup: {str(e)}")
+
+    def format_timings(self):
+        """
+        Format the per-phase timings
+
+        Returns:
+            str: Timings such as "read 0.1 ms, encode 2.3 ms, total 2.4 ms"
+        """
+        parts = [f"{phase} {self.timings[phase] * 1000:.1f} ms" for phase in self.PHASES if phase in self.timings]
+        parts.append(f"total {sum(self.timings.values()) * 1000:.1f} ms")
+        return ", ".join(parts)
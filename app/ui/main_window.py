@@ -5,7 +5,7 @@ from PySide6.QtWidgets import (
     QStackedWidget, QLabel, QPushButton, QMessageBox, QFileDialog,
     QSizePolicy, QSpacerItem
 )
-from PySide6.QtCore import Qt, QSize, QPoint, Signal, Slot, QTimer, QPropertyAnimation, QEasingCurve
+from PySide6.QtCore import Qt, QSize, QPoint, Signal, Slot, QTimer, QThread, QPropertyAnimation, QEasingCurve
 from PySide6.QtGui import QIcon, QFont, QPixmap
 
 from .pages import HomePage, PlayerPage, ItemsPage, GameStatsPage
@@ -23,6 +23,43 @@ TITLE_BAR_HEIGHT = 50              # Height of title bar
 TITLE_BUTTON_SIZE = 45             # Size of buttons in title bar
 SIDEBAR_BUTTON_HEIGHT = 50         # Height of sidebar buttons
 
+class SaveIndexThread(QThread):
+    """
+    Thread summarizing new or changed saves for the save browser
+    """
+    
+    # Signal emitted for every save summarized
+    summary_ready = Signal(str, object)  # full save file path, index entry or None
+    
+    def __init__(self, save_manager, paths):
+        """
+        Initialize the thread
+        
+        Args:
+            save_manager (SaveManager): Save manager owning the index
+            paths (list): Saves without a current summary
+        """
+        super().__init__()
+        self.save_manager = save_manager
+        self.paths = paths
+    
+    def run(self):
+        """Decode the saves in parallel, stopping early if interrupted"""
+        results = self.save_manager.refresh_save_index(self.paths)
+        try:
+            for result in results:
+                if self.isInterruptionRequested():
+                    break
+                if not result.ok:
+                    print(f"SaveIndexThread: Could not read {result.path}: {result.error}")
+                self.summary_ready.emit(result.path, result.value if result.ok else None)
+        except Exception as e:
+            print(f"SaveIndexThread: Error indexing saves: {str(e)}")
+        finally:
+            # Writes the index and shuts down the worker pool
+            results.close()
+
+
 class MainWindow(QMainWindow):
     """
     Main application window for Repo Save Modifier
@@ -50,6 +87,10 @@ class MainWindow(QMainWindow):
         # Flag to track if a save is loaded
         self.is_save_loaded = False
         
+        # Background reader of save summaries and watcher of the saves folder for the home page
+        self.index_thread = None
+        self.save_watcher = None
+        
         # Get app base directory for resources
         self.app_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
         self.icons_dir = os.path.join(self.app_dir, 'resources', 'icons')
@@ -954,6 +995,8 @@ class MainWindow(QMainWindow):
                 return
         
         # Cleanup threads
+        self.stop_save_watcher()
+        self.stop_save_index_thread()
         if hasattr(self, 'steam_api'):
             self.steam_api.cleanup()
         
@@ -966,12 +1009,31 @@ class MainWindow(QMainWindow):
             save_folder = self.save_manager.default_save_path
             print(f"Refreshing save list from: {save_folder}")
             
-            # List save files
-            save_files = self.save_manager.list_save_files(save_folder)
+            # The watcher keeps the list current, a refresh only applies what it has collected
+            if self.save_watcher is not None and save_folder and \
+                    self.save_watcher.folder_path == os.path.abspath(save_folder):
+                self.save_watcher.flush()
+                return
+            
+            self.stop_save_watcher()
+            if save_folder and os.path.isdir(save_folder):
+                from .save_watcher import SaveFolderWatcher
+                
+                self.save_watcher = SaveFolderWatcher(save_folder, self)
+                self.save_watcher.saves_changed.connect(self.on_saves_changed)
+                save_files = self.save_watcher.start()
+            else:
+                save_files = self.save_manager.list_save_files(save_folder)
             print(f"Found {len(save_files)} save files")
             
-            # Update the home page with the list
-            self.home_page.populate_save_list(save_files)
+            # Show what the index already knows straight away
+            save_index = self.save_manager.get_save_index()
+            summaries = {full_path: save_index.lookup(full_path) for _, _, full_path in save_files}
+            self.home_page.populate_save_list(save_files, summaries)
+            
+            # Read the new and changed saves in the background
+            self.stop_save_index_thread()
+            self.index_saves([full_path for full_path, summary in summaries.items() if summary is None])
             
         except Exception as e:
             print(f"Exception during refresh: {str(e)}")
@@ -979,4 +1041,49 @@ class MainWindow(QMainWindow):
                 self, 
                 "Error", 
                 f"Failed to refresh save files list: {str(e)}"
-            )
\ No newline at end of file
+            )
+    
+    def on_saves_changed(self, delta):
+        """
+        Apply saves added, removed or changed on disk to the home page
+        
+        Args:
+            delta (ScanDelta): Changes reported by the save watcher
+        """
+        save_index = self.save_manager.get_save_index()
+        summaries = {full_path: save_index.lookup(full_path) for _, _, full_path in delta.added + delta.changed}
+        self.home_page.apply_save_delta(delta, summaries)
+        self.index_saves([full_path for full_path, summary in summaries.items() if summary is None])
+    
+    def index_saves(self, paths):
+        """
+        Read the summaries of some saves in the background, along with any the
+        running thread has not reached yet
+        
+        Args:
+            paths (list): Saves without a current summary
+        """
+        if self.index_thread is not None:
+            pending = self.index_thread.paths
+            self.stop_save_index_thread()
+            save_index = self.save_manager.get_save_index()
+            paths = [path for path in dict.fromkeys(pending + paths)
+                     if os.path.exists(path) and save_index.lookup(path) is None]
+        if paths:
+            self.index_thread = SaveIndexThread(self.save_manager, paths)
+            self.index_thread.summary_ready.connect(self.home_page.update_save_summary)
+            self.index_thread.start()
+    
+    def stop_save_index_thread(self):
+        """Stop reading save summaries, keeping those read so far"""
+        if self.index_thread is not None:
+            self.index_thread.requestInterruption()
+            self.index_thread.wait()
+            self.index_thread = None
+    
+    def stop_save_watcher(self):
+        """Stop watching the saves folder"""
+        if self.save_watcher is not None:
+            self.save_watcher.stop()
+            self.save_watcher.deleteLater()
+            self.save_watcher = None
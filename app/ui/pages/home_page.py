@@ -16,6 +16,15 @@ except ImportError:
 
 from ..widgets import ModernButton
 
+def _format_time_played(seconds):
+    """Format a save's time played, e.g. 2h 05m"""
+    try:
+        minutes = int(seconds) // 60
+    except (TypeError, ValueError):
+        return "time unknown"
+    return f"{minutes // 60}h {minutes % 60:02d}m"
+
+
 class HomeCard(QFrame):
     """Card widget for the home page with a more compact design"""
     
@@ -116,6 +125,7 @@ class HomePage(QWidget):
         
         # Save file list
         self.save_files = []
+        self.save_items = {}  # Full save file path -> list item
     
     def _get_default_save_path(self):
         """Get the default save path for Repo game files"""
@@ -125,6 +135,16 @@ class HomePage(QWidget):
             save_folder = os.path.join(app_data, "semiwork", "Repo", "saves")
             if os.path.exists(save_folder):
                 return save_folder
+        else:  # Proton or Wine
+            from ...core.save_discovery import discover_save_folders
+
+            try:
+                folders = discover_save_folders()
+            except Exception as e:
+                print(f"Error looking for save folders: {str(e)}")
+                folders = []
+            if folders:
+                return folders[0]
         return ""
     
     def setup_ui(self):
@@ -329,27 +349,118 @@ class HomePage(QWidget):
         return logo_layout
 
 
-    def populate_save_list(self, save_files):
+    def populate_save_list(self, save_files, summaries=None):
         """
         Populate the list with save files
         
         Args:
             save_files (list): List of tuples (display_name, save_folder_path, full_save_file_path)
+            summaries (dict, optional): Full save file path -> index entry, for saves whose
+                summary is already known. The others show as loading until update_save_summary.
+                Defaults to None.
         """
         self.save_files = save_files
+        self.save_items = {}
+        summaries = summaries or {}
+        self.save_list.setUpdatesEnabled(False)
         self.save_list.clear()
         
         if not save_files:
             item = QListWidgetItem("No save files found")
             item.setFlags(item.flags() & ~Qt.ItemIsSelectable)
             self.save_list.addItem(item)
+            self.save_list.setUpdatesEnabled(True)
             return
         
+        icon = QIcon(os.path.join(self.icons_dir, "save_file.svg"))
         for display_name, _, full_path in save_files:
             # Create list item with display name
-            item = QListWidgetItem(QIcon(os.path.join(self.icons_dir, "save_file.svg")), display_name)
+            item = QListWidgetItem(icon, display_name)
             item.setData(Qt.UserRole, full_path)  # Store full path to ES3 file
+            item.setData(Qt.UserRole + 1, display_name)
+            self._show_summary(item, summaries.get(full_path), loading=True)
+            self.save_list.addItem(item)
+            self.save_items[full_path] = item
+        self.save_list.setUpdatesEnabled(True)
+    
+    def apply_save_delta(self, delta, summaries=None):
+        """
+        Update the list with the saves added, removed or changed since it was populated
+        
+        Args:
+            delta (ScanDelta): Changes from SaveFolderWatcher
+            summaries (dict, optional): Full save file path -> index entry for added or
+                changed saves whose summary is known. Defaults to None.
+        """
+        summaries = summaries or {}
+        self.save_list.setUpdatesEnabled(False)
+        
+        for save in delta.removed:
+            item = self.save_items.pop(save[2], None)
+            if item is not None:
+                self.save_list.takeItem(self.save_list.row(item))
+            if save in self.save_files:
+                self.save_files.remove(save)
+        
+        if delta.added and not self.save_items:
+            self.save_list.clear()  # Drop the "No save files found" row
+        icon = QIcon(os.path.join(self.icons_dir, "save_file.svg"))
+        for save in delta.added:
+            display_name, _, full_path = save
+            if full_path in self.save_items:
+                continue
+            # Keep the newest-name-first order of list_save_files
+            row = next((row for row, other in enumerate(self.save_files) if other[0] < display_name),
+                       len(self.save_files))
+            self.save_files.insert(row, save)
+            item = QListWidgetItem(icon, display_name)
+            item.setData(Qt.UserRole, full_path)
+            item.setData(Qt.UserRole + 1, display_name)
+            self._show_summary(item, summaries.get(full_path), loading=True)
+            self.save_list.insertItem(row, item)
+            self.save_items[full_path] = item
+        
+        for _, _, full_path in delta.changed:
+            item = self.save_items.get(full_path)
+            if item is not None:
+                self._show_summary(item, summaries.get(full_path), loading=True)
+        
+        if not self.save_items and self.save_list.count() == 0:
+            item = QListWidgetItem("No save files found")
+            item.setFlags(item.flags() & ~Qt.ItemIsSelectable)
             self.save_list.addItem(item)
+        self.save_list.setUpdatesEnabled(True)
+    
+    def update_save_summary(self, full_path, summary):
+        """
+        Show the summary of a save read in the background
+        
+        Args:
+            full_path (str): Full save file path, as passed to populate_save_list
+            summary (dict): Index entry, or None if the save could not be read
+        """
+        item = self.save_items.get(full_path)
+        if item is not None:
+            self._show_summary(item, summary)
+    
+    def _show_summary(self, item, summary, loading=False):
+        """Set the text and tooltip of a save's row"""
+        display_name = item.data(Qt.UserRole + 1)
+        if summary is None:
+            item.setText(f"{display_name}   (reading...)" if loading else display_name)
+            item.setToolTip(item.data(Qt.UserRole))
+            return
+        
+        players = summary.get("players") or []
+        details = [summary.get("team_name") or "No team name",
+                   f"Level {summary.get('level')}",
+                   f"${summary.get('currency')}K",
+                   f"{len(players)} player{'' if len(players) == 1 else 's'}",
+                   _format_time_played(summary.get("time_played"))]
+        item.setText(f"{display_name}   {' · '.join(details)}")
+        item.setToolTip("\n".join([item.data(Qt.UserRole),
+                                   f"Players: {', '.join(players) or 'none'}",
+                                   f"Date: {summary.get('date') or 'unknown'}"]))
     
     def browse_files(self):
         """Open file dialog to browse for save files"""
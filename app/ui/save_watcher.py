@@ -0,0 +1,116 @@
+"""
+Live view of a saves folder for the home page.
+"""
+
+import os
+
+from PySide6.QtCore import QObject, QFileSystemWatcher, QTimer, Signal
+
+from ..core.save_scanner import SaveScanner
+
+
+# Changes are collected for this long before the model is updated, games
+# and editors touch a save several times while writing it
+DEBOUNCE_MS = 150
+
+
+class SaveFolderWatcher(QObject):
+    """
+    Keeps a SaveScanner in step with a saves folder using QFileSystemWatcher
+    (inotify on Linux), and emits only what changed
+    """
+    
+    # Signal emitted with a ScanDelta whenever saves are added, removed or changed
+    saves_changed = Signal(object)
+    
+    def __init__(self, folder_path, parent=None):
+        """
+        Initialize the watcher, nothing is read until start()
+        
+        Args:
+            folder_path (str): Folder holding the save folders
+            parent (QObject, optional): Parent object. Defaults to None.
+        """
+        super().__init__(parent)
+        self.scanner = SaveScanner(folder_path)
+        self.folder_path = self.scanner.folder_path
+        self._pending = set()
+        
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self._on_path_changed)
+        self.watcher.fileChanged.connect(self._on_path_changed)
+        
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(DEBOUNCE_MS)
+        self._timer.timeout.connect(self.flush)
+    
+    def start(self):
+        """
+        Scan the folder and start watching it
+        
+        Returns:
+            list: The saves, as SaveManager.list_save_files returns them
+        """
+        saves = self.scanner.scan()
+        self._watch()
+        return saves
+    
+    def stop(self):
+        """Stop watching"""
+        self._timer.stop()
+        self._pending.clear()
+        for paths in (self.watcher.files(), self.watcher.directories()):
+            if paths:
+                self.watcher.removePaths(paths)
+    
+    def _watch(self):
+        """Watch the saves folder, every folder in it and every save file"""
+        wanted = {self.folder_path}
+        wanted.update(os.path.join(self.folder_path, name) for name in self.scanner.folders)
+        wanted.update(full_path for _, _, full_path in self.scanner.saves())
+        
+        # Replaced files drop out of the watcher, so compare with what it still watches
+        watched = set(self.watcher.files()) | set(self.watcher.directories())
+        stale = list(watched - wanted)
+        if stale:
+            self.watcher.removePaths(stale)
+        missing = [path for path in wanted - watched if os.path.exists(path)]
+        if missing:
+            self.watcher.addPaths(missing)
+    
+    def _on_path_changed(self, path):
+        """Collect a change, the model is updated once things settle"""
+        self._pending.add(path)
+        self._timer.start()
+    
+    def flush(self):
+        """
+        Apply the changes collected so far, emitting saves_changed if any save changed
+        
+        Returns:
+            ScanDelta: What changed
+        """
+        self._timer.stop()
+        paths, self._pending = self._pending, set()
+        delta = self.scanner.update(paths)
+        if paths:
+            self._watch()
+        if delta:
+            self.saves_changed.emit(delta)
+        return delta
+    
+    def rescan(self):
+        """
+        Compare the whole folder with the model, in case the watcher missed something
+        
+        Returns:
+            ScanDelta: What changed
+        """
+        self._timer.stop()
+        self._pending.clear()
+        delta = self.scanner.refresh()
+        self._watch()
+        if delta:
+            self.saves_changed.emit(delta)
+        return delta
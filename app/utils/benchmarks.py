@@ -0,0 +1,495 @@
+"""
+Benchmarks for the ES3 save pipeline.
+
+Run with: python -m app.utils.benchmarks [save.Es3] [--iterations N] [--json | --imports | --crypto | --new-saves | --query | --analytics]
+"""
+
+import argparse
+import gc
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+# Import-time budget for the headless save API and modules it must never load
+IMPORT_BUDGET_MS = 50
+FORBIDDEN_IMPORTS = ("PySide6", "requests", "urllib3")
+
+
+def _gc_collections():
+    """Total number of garbage collections run so far"""
+    return sum(stat["collections"] for stat in gc.get_stats())
+
+
+def measure(func, iterations=20):
+    """
+    Time a function and record its memory and allocation behaviour
+
+    Args:
+        func (callable): Function to run, called without arguments
+        iterations (int, optional): Number of calls. Defaults to 20.
+
+    Returns:
+        dict: seconds per call, peak traced bytes and garbage collections triggered
+    """
+    # Warm up caches and lazy imports outside the measurement
+    func()
+
+    gc.collect()
+    collections_before = _gc_collections()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = (time.perf_counter() - start) / iterations
+    collections = _gc_collections() - collections_before
+
+    # Memory is traced in a separate pass, tracing slows everything down
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": elapsed,
+        "peak_bytes": peak,
+        "gc_collections": collections
+    }
+
+
+def _make_sample_save(save_manager, folder, players=6, extra_items=2000):
+    """
+    Write a synthetic save with a large item dictionary
+
+    Args:
+        save_manager (SaveManager): Save manager used to encrypt the file
+        folder (str): Directory to write into
+        players (int, optional): Number of players. Defaults to 6.
+        extra_items (int, optional): Number of modded items to add. Defaults to 2000.
+
+    Returns:
+        str: Path to the sample save
+    """
+    from ..core.data_models import GameSave
+
+    _, raw_data = GameSave.create_new_game("Benchmark Team")
+    game_save = GameSave(raw_data)
+    for index in range(players):
+        game_save.add_player(f"7656119800000{index:04d}", f"Player {index}")
+
+    dict_values = raw_data["dictionaryOfDictionaries"]["value"]
+    for index in range(extra_items):
+        item_name = f"Item Modded {index:05d}"
+        for dict_name in ("itemsPurchased", "itemsPurchasedTotal", "itemsUpgradesPurchased",
+                          "itemBatteryUpgrades", "item", "itemStatBattery"):
+            dict_values[dict_name][item_name] = index % 7
+
+    path = os.path.join(folder, "benchmark.Es3")
+    save_manager.encrypt_es3_file(json.dumps(raw_data).encode('utf-8'), path)
+    return path
+
+
+def _legacy_decode(path, password):
+    """The original decode path: read, slice, decrypt, unpad, decode and parse"""
+    from ..core import crypto_backend
+
+    backend = crypto_backend.get_backend()
+    with open(path, 'rb') as file_obj:
+        file_bytes = file_obj.read()
+    init_vector = file_bytes[:16]
+    cipher_text = file_bytes[16:]
+    key = backend.derive_key(password, init_vector)
+    plaintext = crypto_backend.pkcs7_unpad(backend.decrypt(key, init_vector, cipher_text))
+    return json.loads(plaintext.decode('utf-8'))
+
+
+def _legacy_encode(json_bytes, path, password):
+    """The original encode path: pad, encrypt, prepend IV and write"""
+    from ..core import crypto_backend
+
+    backend = crypto_backend.get_backend()
+    init_vector = os.urandom(16)
+    key = backend.derive_key(password, init_vector)
+    encrypted = backend.encrypt(key, init_vector, crypto_backend.pkcs7_pad(json_bytes))
+    with open(path, 'wb') as file_out:
+        file_out.write(init_vector + encrypted)
+
+
+def benchmark_codec(path=None, iterations=20):
+    """
+    Compare the original, streaming and zero-copy decode and encode paths
+
+    Args:
+        path (str, optional): ES3 save to benchmark with. A large synthetic save is used if None.
+        iterations (int, optional): Calls per measurement. Defaults to 20.
+
+    Returns:
+        dict: Report with the file used and measurements keyed by "<mode> <operation>"
+    """
+    from ..core.save_manager import SaveManager
+    from ..core import es3_codec
+
+    streaming = SaveManager(key_cache_size=0)
+    zero_copy = SaveManager(key_cache_size=0, zero_copy=True)
+    password = streaming.password
+
+    work_dir = tempfile.mkdtemp(prefix="repo_bench_")
+    try:
+        if path is None:
+            path = _make_sample_save(streaming, work_dir)
+        data = _legacy_decode(path, password)
+        json_bytes = json.dumps(data).encode('utf-8')
+        output_path = os.path.join(work_dir, "output.Es3")
+
+        def decode_with(manager):
+            with open(path, 'rb') as file_obj:
+                return json.loads(manager._decode_es3_file(file_obj, password))
+
+        results = {
+            "legacy decode": measure(lambda: _legacy_decode(path, password), iterations),
+            "streaming decode": measure(lambda: decode_with(streaming), iterations),
+            "zero-copy decode": measure(lambda: decode_with(zero_copy), iterations),
+            # Serialization is the same for every mode, so encoding starts from the JSON bytes
+            "legacy encode": measure(lambda: _legacy_encode(json_bytes, output_path, password), iterations),
+            "streaming encode": measure(lambda: streaming.encrypt_es3_file(json_bytes, output_path), iterations),
+            "zero-copy encode": measure(lambda: zero_copy.encrypt_es3_file(json_bytes, output_path), iterations),
+        }
+
+        # Sanity check that both modes produce files the other can read
+        zero_copy.encrypt_es3_file(json_bytes, output_path)
+        with open(output_path, 'rb') as file_obj:
+            assert json.loads(es3_codec.decode_bytes(file_obj, password)) == data
+
+        return {"file": path, "file_size": os.path.getsize(path), "results": results}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_json(path=None, iterations=20):
+    """
+    Compare parse and serialize times of the installed JSON engines on a save's payload
+
+    Args:
+        path (str, optional): ES3 save to benchmark with. A large synthetic save is used if None.
+        iterations (int, optional): Calls per measurement. Defaults to 20.
+
+    Returns:
+        dict: Report with the file used and measurements keyed by "<engine> <operation>"
+    """
+    from ..core.save_manager import SaveManager
+    from ..core import json_engine
+
+    save_manager = SaveManager(key_cache_size=0)
+    work_dir = tempfile.mkdtemp(prefix="repo_bench_")
+    try:
+        if path is None:
+            path = _make_sample_save(save_manager, work_dir)
+        plaintext = save_manager.decrypt_es3(path)
+        data = json.loads(plaintext)
+
+        # The original code: stdlib parse of a decoded str, default separators
+        results = {
+            "legacy parse": measure(lambda: json.loads(plaintext.decode('utf-8')), iterations),
+            "legacy serialize": measure(lambda: json.dumps(data).encode('utf-8'), iterations),
+        }
+        for name in json_engine.available_engines():
+            engine = json_engine.JsonEngine(name)
+            results[f"{name} parse"] = measure(lambda: engine.loads(plaintext), iterations)
+            results[f"{name} serialize"] = measure(lambda: engine.dumps(data), iterations)
+
+        report = {"file": path, "file_size": os.path.getsize(path), "results": results}
+        report["payload_bytes"] = {
+            "default": len(json.dumps(data).encode('utf-8')),
+            "compact": len(json_engine.dumps(data)),
+        }
+        return report
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_new_saves(iterations=200):
+    """
+    Compare building new games by hand with rendering them from the template,
+    and the cost of writing one
+
+    Args:
+        iterations (int, optional): Calls per measurement. Defaults to 200.
+
+    Returns:
+        dict: Report with measurements keyed by operation
+    """
+    from ..core.save_manager import SaveManager
+    from ..core import json_engine
+    from ..core import save_template
+
+    save_manager = SaveManager(key_cache_size=0)
+    template = save_template.new_game_template()
+    players = {f"7656119800000{index:04d}": f"Player {index}" for index in range(save_template.MAX_PLAYERS)}
+    json_bytes = template.render_game("Benchmark Team", players=players)
+
+    work_dir = tempfile.mkdtemp(prefix="repo_bench_")
+    try:
+        folders = save_template.reserve_save_folders(work_dir)
+
+        def write_save():
+            name, folder = next(folders)
+            save_manager.encrypt_es3_file(template.render_game("Benchmark Team"), os.path.join(folder, name + ".Es3"))
+
+        results = {
+            "hand-built": measure(lambda: json_engine.dumps(save_template.build_new_game("Benchmark Team")),
+                                  iterations),
+            "template": measure(lambda: template.render_game("Benchmark Team"), iterations),
+            "template 6 players": measure(lambda: template.render_game("Benchmark Team", players=players),
+                                          iterations),
+            "render+write save": measure(write_save, iterations),
+        }
+        return {"file": "new game, 6 players", "file_size": len(json_bytes), "results": results}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_query(saves=20000, iterations=200):
+    """
+    Compare queries on the save term index with scanning every entry
+
+    Args:
+        saves (int, optional): Synthetic saves in the index. Defaults to 20000.
+        iterations (int, optional): Calls per measurement. Defaults to 200.
+
+    Returns:
+        dict: Report with measurements keyed by operation
+    """
+    import random
+    from ..core import json_engine
+    from ..core.save_query import SaveTermIndex
+
+    rng = random.Random(0)
+    work_dir = tempfile.mkdtemp(prefix="repo_bench_")
+    try:
+        index = SaveTermIndex(work_dir)
+        for number in range(saves):
+            players = {f"7656119800000{rng.randrange(1000):04d}": f"Player {number}" for _ in range(rng.randint(1, 6))}
+            values = {
+                "runStats": {"level": rng.randint(1, 30), "currency": rng.randint(0, 500)},
+                "itemsPurchased": {"Item Gun Shotgun": rng.randint(0, 20)},
+                "playerUpgradeSpeed": {steam_id: rng.randint(0, 5) for steam_id in players},
+            }
+            entry = {"team_name": f"Team {rng.randrange(500)}", "players": players, "values": values,
+                     "size": 0, "mtime_ns": 0}
+            index.update(os.path.join(work_dir, f"save{number}.Es3"), entry)
+        steam_id = "76561198000000042"
+
+        def scan():
+            return {key for key, entry in index.entries.items()
+                    if entry["values"].get("itemsPurchased", {}).get("Item Gun Shotgun", 0) > 18}
+
+        results = {
+            "scan entries": measure(scan, iterations),
+            "where >18": measure(lambda: index.where("itemsPurchased", "Item Gun Shotgun", ">", 18), iterations),
+            "with_player": measure(lambda: index.with_player(steam_id), iterations),
+            "with_team": measure(lambda: index.with_team("team 7"), iterations),
+            "query combined": measure(lambda: index.query([steam_id], conditions=[("runStats", "level", ">", 10)]),
+                                      iterations),
+        }
+        size = len(json_engine.dumps({"entries": index.entries}))
+        return {"file": f"term index, {saves:,} saves", "file_size": size, "results": results}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_analytics(saves=50000, iterations=3):
+    """
+    Time laying out a corpus of synthetic saves as columns and reducing them
+
+    Args:
+        saves (int, optional): Synthetic saves in the corpus. Defaults to 50000.
+        iterations (int, optional): Calls per measurement. Defaults to 3.
+
+    Returns:
+        dict: Report with measurements keyed by operation
+    """
+    import random
+    from ..core import json_engine
+    from ..core import save_analytics
+
+    rng = random.Random(0)
+    entries = []
+    for number in range(saves):
+        players = {f"7656119800000{rng.randrange(1000):04d}": [100.0, 100.0] + [float(rng.randint(0, 5))
+                   for _ in save_analytics.UPGRADE_COLUMNS] for _ in range(rng.randint(1, 6))}
+        items = {f"Item {rng.randrange(40)}": float(rng.randint(1, 5)) for _ in range(rng.randint(0, 8))}
+        run_stats = [float(rng.randint(1, 30)), float(rng.randint(0, 500)), float(rng.randint(0, 3)),
+                     float(rng.randint(0, 90000)), 0.0, 0.0]
+        entries.append((f"save{number}.Es3", {"team_name": f"Team {rng.randrange(500)}", "run_stats": run_stats,
+                                              "players": players, "items": items}))
+
+    corpus = save_analytics.SaveCorpus(entries)
+    results = {
+        "build columns": measure(lambda: save_analytics.SaveCorpus(entries), iterations),
+        "report": measure(corpus.report, iterations),
+        "group by team": measure(lambda: corpus.group_by_team("currency"), iterations),
+    }
+    backend = "numpy" if save_analytics.get_numpy() is not None else "array"
+    size = len(json_engine.dumps({"entries": dict(entries)}))
+    return {"file": f"stats index, {saves:,} saves, {backend} columns", "file_size": size, "results": results}
+
+
+def measure_imports(statement):
+    """
+    Run a statement in a fresh interpreter with -X importtime
+
+    Args:
+        statement (str): Python code to run, e.g. "import app.core"
+
+    Returns:
+        dict: Total import time in ms and the cumulative ms of every module imported,
+            not counting what the interpreter imports at startup
+    """
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            cwd=project_root, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{statement!r} failed:\n{result.stderr}")
+
+    # Modules imported before the statement runs (site, encodings, ...) are not counted
+    startup = set()
+    if statement != "pass":
+        startup = set(measure_imports("pass")["modules"])
+
+    modules = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit() or name.strip() in startup:
+            continue  # Header line or interpreter startup
+        modules[name.strip()] = int(cumulative) / 1000
+        # Top-level imports are not indented, their cumulative times add up to the total
+        if not name[1:].startswith(" "):
+            total_us += int(cumulative)
+    return {"total_ms": total_us / 1000, "modules": modules}
+
+
+def check_crypto_backends():
+    """
+    Run the differential corpus against every installed key derivation and AES combination
+
+    Returns:
+        list: Descriptions of every problem found, empty if all backends are byte-identical
+    """
+    from ..core import crypto_backend
+
+    available = crypto_backend.available_backends()
+    problems = []
+    for kdf_name in available["kdf"]:
+        for aes_name in available["aes"]:
+            backend = crypto_backend.CryptoBackend(kdf_name, aes_name)
+            mismatches = crypto_backend.verify_backend(backend)
+            print(f"{backend.name}: {'ok' if not mismatches else f'{len(mismatches)} mismatches'}")
+            problems.extend(f"{backend.name} {mismatch}" for mismatch in mismatches)
+    return problems
+
+
+def check_import_budget(budget_ms=IMPORT_BUDGET_MS, attempts=3):
+    """
+    Check that the app.core package stays cheap to import
+
+    - "import app.core" must not import any of its submodules
+    - Importing SaveManager and GameSave must not load Qt or requests,
+      and must stay within the time budget (best of several attempts)
+
+    Args:
+        budget_ms (float, optional): Time budget in milliseconds. Defaults to 50.
+        attempts (int, optional): Fresh interpreters to try. Defaults to 3.
+
+    Returns:
+        list: Descriptions of every violation, empty if the budget is met
+    """
+    problems = []
+
+    bare = measure_imports("import app.core")
+    eager = sorted(name for name in bare["modules"] if name.startswith("app.core."))
+    if eager:
+        problems.append(f"import app.core eagerly imports {', '.join(eager)}")
+
+    runs = [measure_imports("from app.core import SaveManager, GameSave") for _ in range(max(1, attempts))]
+    forbidden = sorted({name for run in runs for name in run["modules"]
+                        if name.split(".")[0] in FORBIDDEN_IMPORTS})
+    if forbidden:
+        problems.append(f"SaveManager and GameSave pull in {', '.join(forbidden)}")
+
+    best = min(run["total_ms"] for run in runs)
+    if best > budget_ms:
+        slowest = sorted(runs[0]["modules"].items(), key=lambda item: item[1], reverse=True)[:5]
+        details = ", ".join(f"{name} {ms:.1f} ms" for name, ms in slowest)
+        problems.append(f"Importing SaveManager and GameSave took {best:.1f} ms, budget is {budget_ms} ms ({details})")
+    else:
+        print(f"Importing SaveManager and GameSave: {best:.1f} ms (budget {budget_ms} ms)")
+
+    return problems
+
+
+def print_results(report):
+    """
+    Print a benchmark report as a table
+
+    Args:
+        report (dict): Report returned by one of the benchmark functions
+    """
+    print(f"File: {report['file']} ({report['file_size']:,} bytes)")
+    print(f"{'mode':<22}{'ms/call':>10}{'peak KiB':>12}{'gc runs':>10}")
+    for name, result in report["results"].items():
+        print(f"{name:<22}{result['seconds'] * 1000:>10.2f}{result['peak_bytes'] / 1024:>12.0f}"
+              f"{result['gc_collections']:>10}")
+    if "payload_bytes" in report:
+        sizes = report["payload_bytes"]
+        print(f"Payload: {sizes['default']:,} bytes with default separators, {sizes['compact']:,} bytes compact")
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark the ES3 save pipeline")
+    parser.add_argument("path", nargs="?", help="ES3 save to benchmark with (default: synthetic save)")
+    parser.add_argument("--iterations", type=int, default=20, help="calls per measurement")
+    parser.add_argument("--json", action="store_true", help="benchmark the JSON engines instead of the codec")
+    parser.add_argument("--imports", action="store_true", help="check the app.core import-time budget")
+    parser.add_argument("--crypto", action="store_true",
+                        help="check every installed crypto backend against the reference on the differential corpus")
+    parser.add_argument("--new-saves", action="store_true", help="benchmark generating new game saves")
+    parser.add_argument("--query", action="store_true", help="benchmark save term index queries")
+    parser.add_argument("--analytics", action="store_true", help="benchmark corpus analytics")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS, help="import-time budget")
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        problems = check_import_budget(args.budget_ms)
+        for problem in problems:
+            print(f"FAIL: {problem}")
+        return 1 if problems else 0
+    if args.crypto:
+        problems = check_crypto_backends()
+        for problem in problems:
+            print(f"FAIL: {problem}")
+        return 1 if problems else 0
+    if args.analytics:
+        print_results(benchmark_analytics(iterations=min(args.iterations, 3)))
+    elif args.query:
+        print_results(benchmark_query(iterations=max(args.iterations, 200)))
+    elif args.new_saves:
+        print_results(benchmark_new_saves(max(args.iterations, 200)))
+    elif args.json:
+        print_results(benchmark_json(args.path, args.iterations))
+    else:
+        print_results(benchmark_codec(args.path, args.iterations))
+
+
+if __name__ == "__main__":
+    sys.exit(main())